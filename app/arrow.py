@@ -0,0 +1,118 @@
+from typing import TYPE_CHECKING, Any, Callable, Dict, Iterable, Optional, Tuple
+
+import numpy as np
+from fastapi import HTTPException
+
+from app.columnar import EventColumns
+
+if TYPE_CHECKING:
+    import pyarrow as pa
+
+ARROW_STREAM_MEDIA_TYPES = {"application/vnd.apache.arrow.stream"}
+ARROW_FILE_MEDIA_TYPES = {"application/vnd.apache.arrow.file"}
+PARQUET_MEDIA_TYPES = {"application/vnd.apache.parquet", "application/x-parquet"}
+COLUMNAR_MEDIA_TYPES = ARROW_STREAM_MEDIA_TYPES | ARROW_FILE_MEDIA_TYPES | PARQUET_MEDIA_TYPES
+
+# Table columns with these names fill the event fields; every other column is an attribute
+TIMESTAMP_COLUMN = "timestamp"
+EVENT_TYPE_COLUMN = "event_type"
+
+
+def read_table(body: bytes, media_type: str) -> "pa.Table":
+    try:
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+    except ImportError:
+        raise HTTPException(status_code=415, detail="Arrow and Parquet bodies require the pyarrow package")
+
+    try:
+        buffer = pa.py_buffer(body)
+        if media_type in PARQUET_MEDIA_TYPES:
+            return pq.read_table(pa.BufferReader(buffer))
+        if media_type in ARROW_FILE_MEDIA_TYPES:
+            return pa.ipc.open_file(buffer).read_all()
+        return pa.ipc.open_stream(buffer).read_all()
+    except pa.ArrowException as e:
+        raise HTTPException(status_code=400, detail=f"Invalid {media_type} body: {e}")
+
+
+def _to_numpy(column: Any) -> Tuple[np.ndarray, Optional[np.ndarray]]:
+    import pyarrow as pa
+
+    array = column.combine_chunks() if isinstance(column, pa.ChunkedArray) else column
+    if pa.types.is_dictionary(array.type):
+        array = array.dictionary_decode()
+
+    if pa.types.is_integer(array.type) or pa.types.is_floating(array.type) or pa.types.is_boolean(array.type):
+        if array.null_count:
+            # The fill must have the column's type: 0 does not convert to a boolean
+            fill = pa.scalar(False) if pa.types.is_boolean(array.type) else pa.scalar(0, array.type)
+            return array.fill_null(fill).to_numpy(zero_copy_only=False), array.is_valid().to_numpy(zero_copy_only=False)
+        # Numeric buffers without nulls are viewed in place rather than copied
+        return array.to_numpy(zero_copy_only=False), None
+
+    if pa.types.is_timestamp(array.type) or pa.types.is_date(array.type):
+        # Handlers read timestamps as ISO 8601 strings, to the second
+        moments = _seconds(array)
+        strings = np.datetime_as_string(moments, unit="s").astype(object)
+        strings[np.isnat(moments)] = None
+        return strings, None
+
+    return array.to_numpy(zero_copy_only=False), None
+
+
+def _seconds(array: Any) -> np.ndarray:
+    import pyarrow as pa
+
+    # Sub-second parts (pandas writes nanoseconds) are truncated, not refused as lossy
+    moments: np.ndarray = array.cast(pa.timestamp("s"), safe=False).to_numpy(zero_copy_only=False)
+    return moments
+
+
+def _timestamp_column(column: Any) -> np.ndarray:
+    import pyarrow as pa
+
+    array = column.combine_chunks() if isinstance(column, pa.ChunkedArray) else column
+    if pa.types.is_timestamp(array.type) or pa.types.is_date(array.type):
+        # Native timestamps stay datetime64 (NaT for nulls) and skip string parsing
+        return _seconds(array)
+    return _to_numpy(array)[0].astype(object)
+
+
+def columns_from_table(table: "pa.Table", attributes: Optional[Iterable[str]] = None) -> EventColumns:
+    """Decode the event fields and ``attributes`` (by default every other column) of a table.
+
+    Columns a request does not read are never decoded, so cannot fail it.
+    """
+    import pyarrow as pa
+
+    names = table.column_names if attributes is None else [
+        name for name in dict.fromkeys(attributes) if name in table.column_names
+    ]
+    columns: Dict[str, np.ndarray] = {}
+    masks: Dict[str, np.ndarray] = {}
+
+    def decode(name: str, convert: Callable[[Any], Any]) -> Any:
+        try:
+            return convert(table.column(name))
+        except pa.ArrowException as e:
+            raise HTTPException(status_code=400, detail=f"Column {name!r} cannot be read: {e}")
+
+    for name in names:
+        if name in (TIMESTAMP_COLUMN, EVENT_TYPE_COLUMN):
+            continue
+        values, mask = decode(name, _to_numpy)
+        columns[name] = values
+        if mask is not None:
+            masks[name] = mask
+
+    rows = table.num_rows
+    if TIMESTAMP_COLUMN in table.column_names:
+        timestamps = decode(TIMESTAMP_COLUMN, _timestamp_column)
+    else:
+        timestamps = np.full(rows, None, dtype=object)
+    if EVENT_TYPE_COLUMN in table.column_names:
+        event_types = decode(EVENT_TYPE_COLUMN, _to_numpy)[0].astype(object)
+    else:
+        event_types = np.full(rows, "", dtype=object)
+    return EventColumns(timestamps, event_types, columns, masks)
@@ -0,0 +1,125 @@
+import hashlib
+import threading
+import time
+from collections import OrderedDict
+from typing import Dict, Iterable, NamedTuple, Optional, Tuple
+
+
+def request_fingerprint(path: str, query: Iterable[Tuple[str, str]], media_type: str, body: bytes) -> str:
+    """Hash of everything a dataset request's result depends on, computed before parsing."""
+    digest = hashlib.blake2b(digest_size=16)
+    for part in (path, "&".join(f"{key}={value}" for key, value in sorted(query)), media_type):
+        digest.update(part.encode())
+        digest.update(b"\0")
+    digest.update(body)
+    return digest.hexdigest()
+
+
+def body_etag(body: bytes) -> str:
+    return f'"{hashlib.blake2b(body, digest_size=16).hexdigest()}"'
+
+
+# Validators of compressed responses carry the content coding as a suffix (see app.compression)
+_ENCODING_SUFFIXES = ('-gzip"', '-zstd"')
+
+
+def _identity_etag(candidate: str) -> str:
+    candidate = candidate.removeprefix("W/")
+    for suffix in _ENCODING_SUFFIXES:
+        if candidate.endswith(suffix):
+            return candidate[:-len(suffix)] + '"'
+    return candidate
+
+
+def etag_matches(if_none_match: Optional[str], etag: str) -> bool:
+    """Whether an ``If-None-Match`` header covers ``etag`` (weak comparison, per RFC 9110).
+
+    Any content-coded variant of ``etag`` matches as well.
+    """
+    if not if_none_match:
+        return False
+    candidates = [candidate.strip() for candidate in if_none_match.split(",")]
+    return "*" in candidates or etag in [_identity_etag(candidate) for candidate in candidates]
+
+
+class CachedResponse(NamedTuple):
+    body: bytes
+    media_type: str
+    stored_at: float
+
+    @property
+    def age(self) -> float:
+        return time.monotonic() - self.stored_at
+
+
+class ResultCache:
+    """In-process LRU cache of rendered responses with a TTL and a memory budget."""
+
+    def __init__(self, max_bytes: int, ttl: float) -> None:
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._entries: "OrderedDict[str, CachedResponse]" = OrderedDict()
+        self._nbytes = 0
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    @property
+    def enabled(self) -> bool:
+        return self.max_bytes > 0 and self.ttl > 0
+
+    @property
+    def nbytes(self) -> int:
+        return self._nbytes
+
+    def get(self, key: str) -> Optional[CachedResponse]:
+        """Return a fresh cached response and mark it as recently used, counting the hit or miss."""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry.age > self.ttl:
+                self._remove(key)
+                entry = None
+            if entry is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry
+
+    def put(self, key: str, body: bytes, media_type: str) -> None:
+        if not self.enabled or len(body) > self.max_bytes:
+            return
+        with self._lock:
+            if key in self._entries:
+                self._remove(key)
+            self._entries[key] = CachedResponse(body, media_type, time.monotonic())
+            self._nbytes += len(body)
+            while self._nbytes > self.max_bytes:
+                self._remove(next(iter(self._entries)))
+                self.evictions += 1
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+            self._nbytes = 0
+
+    def stats(self) -> Dict[str, float]:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "entries": len(self._entries),
+                "bytes": self._nbytes,
+                "max_bytes": self.max_bytes,
+                "ttl_seconds": self.ttl,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "hit_ratio": self.hits / lookups if lookups else 0.0,
+            }
+
+    def _remove(self, key: str) -> None:
+        self._nbytes -= len(self._entries.pop(key).body)
@@ -0,0 +1,355 @@
+import sys
+from typing import Any, Callable, Dict, Hashable, Iterable, List, Optional, Tuple, TypeVar
+
+import numpy as np
+from fastapi.exceptions import RequestValidationError
+
+from app import metrics, parallel
+from app.timeseries import parse_dates
+
+T = TypeVar("T")
+
+
+def _invalid(index: int, field: str, kind: str, msg: str, value: Any) -> RequestValidationError:
+    # Mirror the error shape Pydantic would have produced for List[FilteredEventData]
+    loc: Tuple[Any, ...] = ("body", "data", index) if not field else ("body", "data", index, field)
+    return RequestValidationError([{"type": kind, "loc": loc, "msg": msg, "input": value}])
+
+
+def _present(raw: np.ndarray) -> np.ndarray:
+    # Elementwise "is not None" over an object column
+    present: np.ndarray = np.not_equal(raw, None)  # type: ignore[call-overload]
+    return present
+
+
+def _approximate_nbytes(column: np.ndarray, sample_size: int = 1000) -> int:
+    if column.dtype != object or not len(column):
+        return int(column.nbytes)
+    # Object columns also own the Python objects they point to; estimate from a sample,
+    # counting objects shared between rows (interned strings, small ints) once
+    sample = column[:: max(1, len(column) // sample_size)]
+    distinct = {id(value): value for value in sample}
+    per_item = sum(sys.getsizeof(value) for value in distinct.values()) / len(sample)
+    return int(column.nbytes + per_item * len(column))
+
+
+def _code_dtype(size: int) -> np.dtype:
+    for dtype in (np.uint8, np.uint16, np.uint32):
+        if size <= np.iinfo(dtype).max + 1:
+            return np.dtype(dtype)
+    return np.dtype(np.int64)
+
+
+def _compact_column(
+    raw: np.ndarray, max_distinct: float = 0.5
+) -> Tuple[np.ndarray, Optional[np.ndarray], Optional[np.ndarray]]:
+    """Encode an object column as ``(values, mask, dictionary)``.
+
+    Columns holding only ints, only floats or only booleans become typed arrays; other
+    columns become integer codes into a ``dictionary`` of their distinct values, when
+    those are at most a ``max_distinct`` fraction of the values. Columns mixing ints and
+    floats are always dictionary-encoded, so they keep labelling groups as sent ("1",
+    not "1.0"). ``mask`` marks present rows when some are missing. Other columns, and
+    unhashable values, are returned unchanged.
+    """
+    present = _present(raw)
+    mask = None if present.all() else present
+    values = raw[present]
+    types = set(map(type, values))
+    if types == {int}:
+        try:
+            integers = values.astype(np.int64)
+        except OverflowError:
+            integers = None
+        if integers is not None:
+            # The narrowest integer type holding every value
+            low, high = int(integers.min()), int(integers.max())
+            narrowest: np.dtype = np.dtype(np.int64)
+            for candidate in (np.int32, np.int16, np.int8):
+                if np.iinfo(candidate).min <= low and high <= np.iinfo(candidate).max:
+                    narrowest = np.dtype(candidate)
+            typed = np.zeros(len(raw), dtype=narrowest)
+            typed[present] = integers
+            return typed, mask, None
+    for kinds, dtype in (({float}, np.float64), ({bool}, np.bool_)):
+        if types == kinds:
+            typed = np.zeros(len(raw), dtype=dtype)
+            typed[present] = values.astype(dtype)
+            return typed, mask, None
+
+    # JSON numbers mix ints and floats (100, 99.5); numeric() reads them as floats, one
+    # conversion per distinct value, however many of them differ
+    mixed_numbers = types == {int, float}
+    factorized = factorize(values, len(types) > 1)
+    if factorized is None or (not mixed_numbers and len(factorized[1]) > len(values) * max_distinct):
+        return raw, None, None
+    codes, dictionary = factorized
+    encoded = np.zeros(len(raw), dtype=codes.dtype)
+    encoded[present] = codes
+    return encoded, mask, dictionary
+
+
+def factorize(values: np.ndarray, mixed_types: bool = False) -> Optional[Tuple[np.ndarray, np.ndarray]]:
+    """``(codes, distinct)`` with ``distinct[codes]`` equal to the object array ``values``,
+    distinct values numbered in order of first appearance; None if some are unhashable."""
+    # With several types, key values by type too so 1, 1.0, True and "1" stay apart
+    keys: Iterable[Any] = list(zip(map(type, values), values)) if mixed_types else values
+    try:
+        first_seen = dict.fromkeys(keys)
+    except TypeError:
+        return None
+    numbering = dict(zip(first_seen, range(len(first_seen))))
+    codes = np.fromiter(map(numbering.__getitem__, keys), dtype=_code_dtype(len(numbering)), count=len(values))
+    distinct = np.empty(len(numbering), dtype=object)
+    distinct[:] = [key[1] for key in numbering] if mixed_types else list(numbering)
+    return codes, distinct
+
+
+class EventColumns:
+    """Column-oriented view of a list of filtered events.
+
+    Only the attributes named when the columns are built are extracted. Values parsed
+    from JSON are kept as object arrays and converted to typed arrays the first time a
+    handler asks for them, so conversion errors surface inside the handler as 400s.
+    Columns that arrive already typed (e.g. from Arrow) are used as they are, with
+    ``masks`` marking their missing entries. Attributes in ``dictionaries`` hold
+    integer codes into that array of distinct values (see :meth:`compact`).
+    """
+
+    def __init__(
+        self,
+        timestamp: np.ndarray,
+        event_type: np.ndarray,
+        attributes: Dict[str, np.ndarray],
+        masks: Optional[Dict[str, np.ndarray]] = None,
+        dictionaries: Optional[Dict[str, np.ndarray]] = None,
+    ) -> None:
+        self.timestamp_raw = timestamp
+        self.event_type = event_type
+        self.attributes = attributes
+        self.masks = masks or {}
+        self.dictionaries = dictionaries or {}
+        self._numeric: Dict[str, Tuple[np.ndarray, np.ndarray]] = {}
+        self._keys: Dict[str, Tuple[np.ndarray, np.ndarray]] = {}
+        self._dates: Optional[Tuple[np.ndarray, np.ndarray]] = None
+        self._shared: Optional[Dict[Hashable, Any]] = None
+
+    def __len__(self) -> int:
+        return len(self.event_type)
+
+    @classmethod
+    @metrics.timed("extract")
+    def from_events(
+        cls, events: Any, attributes: Optional[Iterable[str]] = None, start: int = 0
+    ) -> "EventColumns":
+        """Build columns from raw event dicts; ``start`` offsets error locations for batches."""
+        if not isinstance(events, list):
+            raise RequestValidationError(
+                [{"type": "list_type", "loc": ("body", "data"), "msg": "Input should be a valid list", "input": events}]
+            )
+
+        attribute_maps: List[Dict[str, Any]] = []
+        timestamps: List[Any] = []
+        event_types: List[str] = []
+        for index, event in enumerate(events, start):
+            if not isinstance(event, dict):
+                raise _invalid(index, "", "model_type", "Input should be a valid dictionary or object", event)
+            time_object = event.get("time_object")
+            event_type = event.get("event_type")
+            attribute = event.get("attribute")
+            if not isinstance(time_object, dict):
+                raise _invalid(index, "time_object", "dict_type", "Input should be a valid dictionary", time_object)
+            if not isinstance(event_type, str):
+                raise _invalid(index, "event_type", "string_type", "Input should be a valid string", event_type)
+            if not isinstance(attribute, dict):
+                raise _invalid(index, "attribute", "dict_type", "Input should be a valid dictionary", attribute)
+            timestamps.append(time_object.get("timestamp"))
+            event_types.append(event_type)
+            attribute_maps.append(attribute)
+
+        if attributes is None:
+            # Keep every attribute seen in the data, e.g. for datasets held across requests
+            names: Dict[str, None] = {}
+            for attribute in attribute_maps:
+                names.update(dict.fromkeys(attribute))
+            attributes = names
+
+        columns: Dict[str, np.ndarray] = {}
+        for name in dict.fromkeys(attributes):
+            column = np.empty(len(attribute_maps), dtype=object)
+            column[:] = [attribute.get(name) for attribute in attribute_maps]
+            columns[name] = column
+
+        timestamp_column = np.empty(len(timestamps), dtype=object)
+        timestamp_column[:] = timestamps
+        return cls(timestamp_column, np.array(event_types, dtype=object), columns)
+
+    @classmethod
+    def concatenate(cls, parts: List["EventColumns"]) -> "EventColumns":
+        """Rows of several batches built by :meth:`from_events`, in order; attributes
+        missing from a batch are missing in its rows."""
+        names = dict.fromkeys(name for part in parts for name in part.attributes)
+        return cls(
+            np.concatenate([part.timestamp_raw for part in parts]),
+            np.concatenate([part.event_type for part in parts]),
+            {name: np.concatenate([part.raw(name) for part in parts]) for name in names},
+        )
+
+    def sliced(self, start: int, stop: int) -> "EventColumns":
+        """The rows ``start:stop``, sharing these columns' memory."""
+        rows = slice(start, stop)
+        return EventColumns(
+            self.timestamp_raw[rows],
+            self.event_type[rows],
+            {name: column[rows] for name, column in self.attributes.items()},
+            {name: mask[rows] for name, mask in self.masks.items()},
+            self.dictionaries,
+        )
+
+    def sharing(self) -> "EventColumns":
+        """A view of these columns that keeps derived intermediates for reuse.
+
+        Group codes, sorted values and the like built through :meth:`shared` are
+        computed once per view, for several operations over one dataset, and are
+        dropped with the view instead of growing a stored dataset.
+        """
+        view = EventColumns(self.timestamp_raw, self.event_type, self.attributes, self.masks, self.dictionaries)
+        view._numeric, view._keys, view._dates = self._numeric, self._keys, self._dates
+        view._shared = {}
+        return view
+
+    def compact(self, max_distinct: float = 0.5) -> "EventColumns":
+        """A copy of these columns in a compact form, for datasets held across requests.
+
+        Numeric attributes become typed arrays and repeated values (suburbs, event
+        types) integer codes into a dictionary, with masks for missing entries, where
+        JSON-parsed columns keep a Python object per row. Other attributes are
+        dictionary-encoded when at most a ``max_distinct`` fraction of their values
+        differ. Timestamps are stored as the ``datetime64[D]`` dates the handlers
+        read, unless some fail to parse, in which case they are kept as sent so the
+        error surfaces per request.
+        """
+        attributes: Dict[str, np.ndarray] = {}
+        masks = dict(self.masks)
+        dictionaries = dict(self.dictionaries)
+        for name, raw in self.attributes.items():
+            if raw.dtype != object:
+                attributes[name] = raw
+                continue
+            attributes[name], mask, dictionary = _compact_column(raw, max_distinct)
+            if mask is not None:
+                masks[name] = mask
+            if dictionary is not None:
+                dictionaries[name] = dictionary
+
+        timestamps = self.timestamp_raw
+        if timestamps.dtype == object:
+            try:
+                timestamps = self.dates()[0]
+            except ValueError:
+                pass
+        # Rows share one string object per event type
+        factorized = factorize(self.event_type)
+        event_type = self.event_type if factorized is None else factorized[1][factorized[0]]
+        compacted = EventColumns(timestamps, event_type, attributes, masks, dictionaries)
+        compacted._dates = self._dates
+        return compacted
+
+    @property
+    def is_sharing(self) -> bool:
+        return self._shared is not None
+
+    def shared(self, key: Hashable, build: Callable[[], T]) -> T:
+        """``build()``, cached under ``key`` on a :meth:`sharing` view; computed every time otherwise."""
+        if self._shared is None:
+            return build()
+        if key not in self._shared:
+            self._shared[key] = build()
+        value: T = self._shared[key]
+        return value
+
+    @property
+    def nbytes(self) -> int:
+        """Approximate memory held by the columns, including cached typed conversions."""
+        raw_columns = [
+            self.timestamp_raw, self.event_type, *self.attributes.values(), *self.masks.values(),
+            *self.dictionaries.values(),
+        ]
+        total = sum(_approximate_nbytes(column) for column in raw_columns)
+        for name, (values, present) in [*self._numeric.items(), *self._keys.items()]:
+            if values is not self.attributes.get(name):
+                total += values.nbytes + present.nbytes
+        if self._dates is not None and self._dates[0] is not self.timestamp_raw:
+            total += self._dates[0].nbytes
+        return total
+
+    def raw(self, name: str) -> np.ndarray:
+        column = self.attributes.get(name)
+        if column is None:
+            return np.full(len(self), None, dtype=object)
+        return column
+
+    def present(self, name: str) -> np.ndarray:
+        raw = self.raw(name)
+        if raw.dtype == object:
+            return _present(raw)
+        mask = self.masks.get(name)
+        return np.ones(len(raw), dtype=bool) if mask is None else mask
+
+    @metrics.timed("extract")
+    def numeric(self, name: str) -> Tuple[np.ndarray, np.ndarray]:
+        """Return ``(values, present)`` for an attribute as float64, 0.0 where missing."""
+        if name not in self._numeric:
+            raw = self.raw(name)
+            present = self.present(name)
+            if name in self.dictionaries:
+                # Convert each distinct value once
+                values = np.zeros(len(raw), dtype=float)
+                values[present] = self.dictionaries[name].astype(float)[raw[present]]
+            elif raw.dtype.kind in "biuf":
+                # Already typed; float64 columns are used without copying
+                values = raw.astype(float, copy=False)
+            else:
+                values = np.zeros(len(raw), dtype=float)
+                values[present] = raw[present].astype(float)
+            self._numeric[name] = (values, present)
+        return self._numeric[name]
+
+    @metrics.timed("extract")
+    def keys(self, name: str) -> Tuple[np.ndarray, np.ndarray]:
+        """Return ``(labels, present)`` for an attribute as a string array."""
+        if name not in self._keys:
+            raw = self.raw(name)
+            present = self.present(name)
+            if name in self.dictionaries:
+                # Missing rows get "" like object columns
+                dictionary = self.dictionaries[name]
+                labels = np.append(dictionary.astype(str), "")[np.where(present, raw, len(dictionary))]
+            elif raw.dtype != object:
+                labels = raw.astype(str)
+            else:
+                labels = np.full(len(raw), "", dtype=object)
+                labels[present] = raw[present].astype(str)
+                labels = labels.astype(str)
+            self._keys[name] = (labels, present)
+        return self._keys[name]
+
+    def timestamps(self) -> Tuple[np.ndarray, np.ndarray]:
+        """Return ``(timestamps, present)``; empty or missing timestamps are not present."""
+        if self.timestamp_raw.dtype.kind == "M":
+            return self.timestamp_raw, ~np.isnat(self.timestamp_raw)
+        return self.timestamp_raw, self.timestamp_raw.astype(bool)
+
+    @metrics.timed("extract")
+    def dates(self) -> Tuple[np.ndarray, np.ndarray]:
+        """Return ``(dates, present)`` with timestamps parsed to ``datetime64[D]``, NaT where missing."""
+        if self._dates is None:
+            timestamps, present = self.timestamps()
+            dates = np.full(len(timestamps), np.datetime64("NaT"), dtype="datetime64[D]")
+            timestamps = timestamps if present.all() else timestamps[present]
+            chunks = parallel.map_chunks(
+                lambda rows: parse_dates(timestamps[rows]), len(timestamps), parallel.workers_for(len(timestamps))
+            )
+            dates[present] = np.concatenate(chunks)
+            self._dates = (dates, present)
+        return self._dates
@@ -0,0 +1,246 @@
+"""HTTP content coding: compressed request bodies and negotiated response compression.
+
+gzip is always available; zstd is offered when the zstandard package is installed.
+"""
+import gzip
+import zlib
+from types import ModuleType
+from typing import Any, Callable, List, Optional
+
+from fastapi import HTTPException
+from starlette.datastructures import Headers, MutableHeaders
+from starlette.responses import JSONResponse
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+from app import config, metrics
+
+Decoder = Callable[[bytes, bool], bytes]
+
+
+def _zstandard() -> Optional[ModuleType]:
+    try:
+        import zstandard
+    except ImportError:
+        return None
+    return zstandard
+
+
+def supported_encodings() -> List[str]:
+    """Content codings in order of preference."""
+    return ["zstd", "gzip"] if _zstandard() is not None else ["gzip"]
+
+
+def negotiate(accept_encoding: str) -> Optional[str]:
+    """The preferred supported coding acceptable per an ``Accept-Encoding`` header, if any."""
+    weights = {}
+    for item in accept_encoding.lower().split(","):
+        coding, _, parameters = item.partition(";")
+        weight = 1.0
+        name, _, value = parameters.partition("=")
+        if name.strip() == "q":
+            try:
+                weight = float(value)
+            except ValueError:
+                weight = 0.0
+        if coding.strip():
+            weights[coding.strip()] = weight
+
+    best, best_weight = None, 0.0
+    for coding in supported_encodings():
+        weight = weights.get(coding, weights.get("*", 0.0))
+        if weight > best_weight:
+            best, best_weight = coding, weight
+    return best
+
+
+def compress(body: bytes, encoding: str) -> bytes:
+    if encoding == "gzip":
+        return gzip.compress(body, compresslevel=config.GZIP_LEVEL, mtime=0)
+    zstandard = _zstandard()
+    assert zstandard is not None
+    compressed: bytes = zstandard.ZstdCompressor(level=config.ZSTD_LEVEL).compress(body)
+    return compressed
+
+
+class BodyTooLarge(ValueError):
+    pass
+
+
+class _Output:
+    """Decompressed bytes of one request, refused past ``max_bytes`` (0 for no limit)."""
+
+    def __init__(self, max_bytes: int) -> None:
+        self.max_bytes = max_bytes
+        self.size = 0
+        self.chunks: List[bytes] = []
+
+    @property
+    def room(self) -> int:
+        # One byte past the limit is enough to tell that a body exceeds it
+        return self.max_bytes - self.size + 1 if self.max_bytes else 0
+
+    def write(self, data: bytes) -> int:
+        self.size += len(data)
+        if self.max_bytes and self.size > self.max_bytes:
+            raise BodyTooLarge(f"Decompressed request body exceeds {self.max_bytes} bytes")
+        self.chunks.append(data)
+        return len(data)
+
+    def take(self) -> bytes:
+        data, self.chunks = b"".join(self.chunks), []
+        return data
+
+
+def _zlib_decoder(wbits: int, max_bytes: int) -> Decoder:
+    stream = zlib.decompressobj(wbits=wbits)
+    output = _Output(max_bytes)
+
+    def decode(chunk: bytes, last: bool) -> bytes:
+        # Bounded, so a small body cannot inflate far past the limit before it is refused
+        output.write(stream.decompress(chunk, output.room))
+        if stream.unconsumed_tail:
+            raise BodyTooLarge(f"Decompressed request body exceeds {max_bytes} bytes")
+        if last and not stream.eof:
+            raise ValueError("compressed stream ended early")
+        return output.take()
+
+    return decode
+
+
+# A zstd block holds at most 128 KiB and an RLE block encodes one in 4 bytes
+_ZSTD_MAX_RATIO = 1 << 15
+
+
+def _zstd_decoder(stream: Any, max_bytes: int) -> Decoder:
+    output = _Output(max_bytes)
+
+    def decode(chunk: bytes, last: bool) -> bytes:
+        # Fed in slices that cannot inflate far past the limit, as the zstd object has no max_length
+        step = max(64, output.room // _ZSTD_MAX_RATIO) if max_bytes else max(len(chunk), 1)
+        for start in range(0, len(chunk), step):
+            if stream.eof:
+                # Data after the frame is ignored, like after a gzip member
+                break
+            output.write(stream.decompress(chunk[start:start + step]))
+        if last and not stream.eof:
+            raise ValueError("compressed stream ended early")
+        return output.take()
+
+    return decode
+
+
+def decoder(encoding: str, max_bytes: int = 0) -> Optional[Decoder]:
+    """Incremental decompressor for a request ``Content-Encoding``; None when unsupported.
+
+    It raises :class:`BodyTooLarge` once the body decompresses past ``max_bytes``.
+    """
+    if encoding in ("gzip", "x-gzip"):
+        return _zlib_decoder(16 + zlib.MAX_WBITS, max_bytes)
+    if encoding == "deflate":
+        return _zlib_decoder(zlib.MAX_WBITS, max_bytes)
+    zstandard = _zstandard()
+    if encoding == "zstd" and zstandard is not None:
+        return _zstd_decoder(zstandard.ZstdDecompressor().decompressobj(), max_bytes)
+    return None
+
+
+def encoded_etag(etag: str, encoding: str) -> str:
+    # A compressed body is a different representation, so its strong validator differs too
+    return f'{etag[:-1]}-{encoding}"' if etag.endswith('"') else etag
+
+
+class CompressionMiddleware:
+    """Decode compressed request bodies and compress large responses.
+
+    Request bodies with a ``Content-Encoding`` of gzip, deflate or zstd are
+    decompressed as they are read, so NDJSON bodies still stream; other codings get
+    a 415. Complete responses of at least ``minimum_size`` bytes are compressed with
+    the coding preferred by ``Accept-Encoding``, and their ``ETag`` gets the coding
+    as a suffix. Streamed responses pass through unchanged.
+    """
+
+    def __init__(self, app: ASGIApp, minimum_size: int = 1024) -> None:
+        self.app = app
+        self.minimum_size = minimum_size
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        headers = Headers(scope=scope)
+        content_encoding = headers.get("content-encoding", "identity").strip().lower()
+        if content_encoding not in ("", "identity"):
+            decode = decoder(content_encoding, config.MAX_DECOMPRESSED_BYTES)
+            if decode is None:
+                response = JSONResponse(
+                    {"detail": f"Unsupported Content-Encoding: {content_encoding}"}, status_code=415
+                )
+                await response(scope, receive, send)
+                return
+            receive = _decoded(receive, decode)
+            # Updated in place so outer middleware still sees what routing adds to the scope
+            scope["headers"] = [
+                (name, value) for name, value in scope["headers"]
+                if name not in (b"content-encoding", b"content-length")
+            ]
+
+        responder = _Responder(
+            send, negotiate(headers.get("accept-encoding", "")), headers.get("if-none-match", ""), self.minimum_size
+        )
+        await self.app(scope, receive, responder.send)
+
+
+def _decoded(receive: Receive, decode: Decoder) -> Receive:
+    async def receive_decoded() -> Message:
+        message = await receive()
+        if message["type"] == "http.request":
+            last = not message.get("more_body", False)
+            try:
+                body = decode(message.get("body", b""), last)
+            except BodyTooLarge as e:
+                raise HTTPException(status_code=413, detail=str(e))
+            except Exception as e:
+                raise HTTPException(status_code=400, detail=f"Invalid compressed request body: {e}")
+            message = {**message, "body": body}
+        return message
+
+    return receive_decoded
+
+
+class _Responder:
+    def __init__(self, send: Send, encoding: Optional[str], if_none_match: str, minimum_size: int) -> None:
+        self._send = send
+        self.encoding = encoding
+        self.if_none_match = if_none_match
+        self.minimum_size = minimum_size
+        self.start: Optional[Message] = None
+
+    async def send(self, message: Message) -> None:
+        if message["type"] == "http.response.start":
+            self.start = message
+            return
+        if message["type"] != "http.response.body" or self.start is None:
+            await self._send(message)
+            return
+
+        start, self.start = self.start, None
+        headers = MutableHeaders(scope=start)
+        body = message.get("body", b"")
+        if self.encoding is not None and start["status"] == 304 and "etag" in headers:
+            # Revalidating a compressed representation: echo the validator the client holds
+            encoded = encoded_etag(headers["etag"], self.encoding)
+            if encoded in self.if_none_match:
+                headers["etag"] = encoded
+        elif not message.get("more_body", False) and len(body) >= self.minimum_size and "content-encoding" not in headers:
+            headers.add_vary_header("Accept-Encoding")
+            if self.encoding is not None:
+                with metrics.stage("compress"):
+                    body = compress(body, self.encoding)
+                headers["content-encoding"] = self.encoding
+                headers["content-length"] = str(len(body))
+                if "etag" in headers:
+                    headers["etag"] = encoded_etag(headers["etag"], self.encoding)
+                message = {**message, "body": body}
+        await self._send(start)
+        await self._send(message)
@@ -0,0 +1,64 @@
+import os
+
+# Memory budget for datasets uploaded through POST /datasets, in bytes
+DATASET_CACHE_BYTES = int(os.environ.get("ANALYTICS_DATASET_CACHE_BYTES", 512 * 1024 * 1024))
+
+# Events parsed per batch when reducing NDJSON request bodies
+STREAM_BATCH_SIZE = int(os.environ.get("ANALYTICS_STREAM_BATCH_SIZE", 10000))
+
+# Default relative error bound for approximate (sketch-based) quantiles
+SKETCH_RELATIVE_ACCURACY = float(os.environ.get("ANALYTICS_SKETCH_RELATIVE_ACCURACY", 0.01))
+
+# Worker processes for large stored-dataset and columnar requests; 0 (the default) runs
+# every request in the server process
+OFFLOAD_WORKERS = int(os.environ.get("ANALYTICS_OFFLOAD_WORKERS", 0))
+
+# Requests over at least this many events run in a worker process
+OFFLOAD_MIN_ROWS = int(os.environ.get("ANALYTICS_OFFLOAD_MIN_ROWS", 100000))
+
+# Offloaded requests allowed to wait for a free worker, and how long (seconds) others wait for a slot
+OFFLOAD_QUEUE_DEPTH = int(os.environ.get("ANALYTICS_OFFLOAD_QUEUE_DEPTH", 16))
+OFFLOAD_QUEUE_TIMEOUT = float(os.environ.get("ANALYTICS_OFFLOAD_QUEUE_TIMEOUT", 5.0))
+
+# Threads that large group-bys and reductions are split across, and the row count where that starts
+PARALLEL_WORKERS = int(os.environ.get("ANALYTICS_PARALLEL_WORKERS", os.cpu_count() or 1))
+PARALLEL_MIN_ROWS = int(os.environ.get("ANALYTICS_PARALLEL_MIN_ROWS", 1000000))
+
+# Rendered responses kept for identical requests: memory budget in bytes (0 disables) and lifetime in seconds
+RESULT_CACHE_BYTES = int(os.environ.get("ANALYTICS_RESULT_CACHE_BYTES", 64 * 1024 * 1024))
+RESULT_CACHE_TTL = float(os.environ.get("ANALYTICS_RESULT_CACHE_TTL", 60.0))
+
+# Responses at least this large are compressed when the client accepts gzip or zstd, at these levels
+COMPRESSION_MIN_BYTES = int(os.environ.get("ANALYTICS_COMPRESSION_MIN_BYTES", 1024))
+GZIP_LEVEL = int(os.environ.get("ANALYTICS_GZIP_LEVEL", 1))
+ZSTD_LEVEL = int(os.environ.get("ANALYTICS_ZSTD_LEVEL", 1))
+
+# Largest body a compressed request may decompress to, in bytes (0 for no limit); larger ones get a 413
+MAX_DECOMPRESSED_BYTES = int(os.environ.get("ANALYTICS_MAX_DECOMPRESSED_BYTES", 512 * 1024 * 1024))
+
+# Request profiling: the fraction of requests profiled at random (0 turns sampling off), whether an
+# X-Profile request header may ask for a profile (off by default), the mode (cprofile or sample) and
+# the profiles kept
+PROFILE_SAMPLE_RATE = float(os.environ.get("ANALYTICS_PROFILE_SAMPLE_RATE", 0.0))
+PROFILE_ALLOW_HEADER = os.environ.get("ANALYTICS_PROFILE_ALLOW_HEADER", "0") not in ("0", "false", "no")
+PROFILE_MODE = os.environ.get("ANALYTICS_PROFILE_MODE", "cprofile")
+PROFILE_RING_SIZE = int(os.environ.get("ANALYTICS_PROFILE_RING_SIZE", 32))
+
+# Bearer token for the /admin endpoints, which are disabled while it is unset. When set,
+# X-Profile is also only honoured on requests carrying it.
+ADMIN_TOKEN = os.environ.get("ANALYTICS_ADMIN_TOKEN", "")
+
+# Aggregation sessions: how many are kept, and how long (seconds) an unused one lives
+SESSION_MAX_COUNT = int(os.environ.get("ANALYTICS_SESSION_MAX_COUNT", 1000))
+SESSION_TTL = float(os.environ.get("ANALYTICS_SESSION_TTL", 24 * 60 * 60))
+
+# Largest time grid (groups x buckets) a /rolling request may compute over
+ROLLING_MAX_CELLS = int(os.environ.get("ANALYTICS_ROLLING_MAX_CELLS", 10_000_000))
+
+# Fitted /predict models kept for reuse by model_id (0 disables the cache)
+MODEL_CACHE_SIZE = int(os.environ.get("ANALYTICS_MODEL_CACHE_SIZE", 256))
+
+# Directory holding datasets uploaded with storage=disk (unset turns them off), and the
+# events per memory-mapped segment, which bounds the memory a query over them uses
+DATASET_DIR = os.environ.get("ANALYTICS_DATASET_DIR", "")
+DISK_SEGMENT_ROWS = int(os.environ.get("ANALYTICS_DISK_SEGMENT_ROWS", 500_000))
@@ -0,0 +1,72 @@
+import hashlib
+import json
+import threading
+from collections import OrderedDict
+from typing import Any, Dict, Optional
+
+from app.columnar import EventColumns
+
+
+def content_hash(events: Any) -> str:
+    """Stable identifier for an event list, independent of key order and whitespace."""
+    canonical = json.dumps(events, sort_keys=True, separators=(",", ":"), default=str)
+    return hashlib.blake2b(canonical.encode(), digest_size=16).hexdigest()
+
+
+class DatasetTooLarge(ValueError):
+    pass
+
+
+class DatasetStore:
+    """In-process LRU cache of parsed datasets with a memory budget."""
+
+    def __init__(self, max_bytes: int) -> None:
+        self.max_bytes = max_bytes
+        self._datasets: "OrderedDict[str, EventColumns]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def __contains__(self, dataset_id: str) -> bool:
+        with self._lock:
+            return dataset_id in self._datasets
+
+    def __len__(self) -> int:
+        return len(self._datasets)
+
+    @property
+    def nbytes(self) -> int:
+        with self._lock:
+            return sum(columns.nbytes for columns in self._datasets.values())
+
+    def get(self, dataset_id: str) -> EventColumns:
+        """Return a stored dataset and mark it as recently used; raises KeyError."""
+        with self._lock:
+            columns = self._datasets[dataset_id]
+            self._datasets.move_to_end(dataset_id)
+            return columns
+
+    def put(self, dataset_id: str, columns: EventColumns) -> None:
+        size = columns.nbytes
+        if size > self.max_bytes:
+            raise DatasetTooLarge(
+                f"Dataset needs about {size} bytes, more than the {self.max_bytes} byte cache budget"
+            )
+        with self._lock:
+            self._datasets[dataset_id] = columns
+            self._datasets.move_to_end(dataset_id)
+            self._evict()
+
+    def delete(self, dataset_id: str) -> Optional[EventColumns]:
+        with self._lock:
+            return self._datasets.pop(dataset_id, None)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._datasets.clear()
+
+    def _evict(self) -> None:
+        # Sizes grow as handlers cache typed columns, so re-measure on every insert
+        sizes: Dict[str, int] = {key: columns.nbytes for key, columns in self._datasets.items()}
+        total = sum(sizes.values())
+        while total > self.max_bytes and len(self._datasets) > 1:
+            evicted, _ = self._datasets.popitem(last=False)
+            total -= sizes[evicted]
@@ -0,0 +1,321 @@
+"""Datasets stored on disk as memory-mapped columns, for histories larger than memory.
+
+A disk dataset is a directory of segments of up to ``ANALYTICS_DISK_SEGMENT_ROWS``
+events. A segment holds one ``.npy`` file per attribute, one for the timestamps (as
+dates) and one for the event types, in the compact form of :meth:`EventColumns.compact`:
+numbers as typed values, repeated values as integer codes into a dictionary file,
+mostly distinct strings as a string array, plus a mask file where values are missing. Queries map one segment at a time and reduce it,
+so the memory they use is bounded by a segment, whatever the size of the dataset.
+"""
+import hashlib
+import json
+import os
+import re
+import shutil
+import time
+import uuid
+import weakref
+from typing import Any, Callable, Dict, Iterable, Iterator, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+from app.columnar import EventColumns, factorize
+from app.streaming import Accumulator
+
+DATASET_MANIFEST = "dataset.json"
+SEGMENT_MANIFEST = "manifest.json"
+INCOMING_PREFIX = ".incoming-"
+
+# Dataset ids are content hashes; anything else never names a directory
+_DATASET_ID = re.compile(r"[0-9a-f]{32}")
+
+# Values the exact order statistics hold in memory once a rank's range is this narrow, and
+# the histogram bins each pass over the data narrows it by
+ORDER_CANDIDATES = 1_000_000
+ORDER_BINS = 4096
+
+
+def _write_segment(directory: str, columns: EventColumns) -> Dict[str, Any]:
+    # Numbers typed, repeated values dictionary-encoded, so each column is one flat array
+    compact = columns.compact()
+    if compact.timestamp_raw.dtype.kind != "M":
+        raise ValueError("Timestamps must be ISO 8601 dates to store a dataset on disk")
+    factorized = factorize(compact.event_type)
+    if factorized is None:
+        raise ValueError("Event types must be strings to store a dataset on disk")
+    event_codes, event_types = factorized
+    os.makedirs(directory)
+    np.save(os.path.join(directory, "timestamp.npy"), compact.timestamp_raw)
+    np.save(os.path.join(directory, "event_type.npy"), event_codes)
+    manifest: Dict[str, Any] = {"rows": len(compact), "event_types": event_types.tolist(), "attributes": []}
+    for index, (name, values) in enumerate(compact.attributes.items()):
+        entry: Dict[str, Any] = {"name": name, "file": f"{index}.npy", "mask": None, "dictionary": None}
+        mask = compact.masks.get(name)
+        if values.dtype == object:
+            # Mostly distinct strings are stored as they are, in a fixed-width string array
+            present = compact.present(name)
+            if not all(isinstance(value, str) for value in values[present]):
+                raise ValueError(
+                    f"Attribute {name!r} holds lists, objects or mostly distinct values of mixed types, "
+                    "which disk datasets cannot store"
+                )
+            values = np.where(present, values, "").astype(str)
+            mask = None if present.all() else present
+        np.save(os.path.join(directory, entry["file"]), values)
+        if mask is not None:
+            entry["mask"] = f"{index}.mask.npy"
+            np.save(os.path.join(directory, entry["mask"]), mask)
+        dictionary = compact.dictionaries.get(name)
+        if dictionary is not None:
+            if all(isinstance(value, str) for value in dictionary):
+                entry["dictionary"] = f"{index}.dictionary.npy"
+                np.save(os.path.join(directory, entry["dictionary"]), dictionary.astype(str))
+            else:
+                # Values of several types (1 and "1") keep their types in the manifest
+                entry["dictionary"] = dictionary.tolist()
+        manifest["attributes"].append(entry)
+    with open(os.path.join(directory, SEGMENT_MANIFEST), "w") as file:
+        json.dump(manifest, file)
+    return manifest
+
+
+def _read_segment(directory: str) -> EventColumns:
+    with open(os.path.join(directory, SEGMENT_MANIFEST)) as file:
+        manifest = json.load(file)
+
+    def mapped(name: str) -> np.ndarray:
+        array: np.ndarray = np.load(os.path.join(directory, name), mmap_mode="r")
+        return array
+
+    attributes: Dict[str, np.ndarray] = {}
+    masks: Dict[str, np.ndarray] = {}
+    dictionaries: Dict[str, np.ndarray] = {}
+    for entry in manifest["attributes"]:
+        attributes[entry["name"]] = mapped(entry["file"])
+        if entry["mask"] is not None:
+            masks[entry["name"]] = mapped(entry["mask"])
+        if isinstance(entry["dictionary"], str):
+            dictionaries[entry["name"]] = mapped(entry["dictionary"])
+        elif entry["dictionary"] is not None:
+            dictionary = np.empty(len(entry["dictionary"]), dtype=object)
+            dictionary[:] = entry["dictionary"]
+            dictionaries[entry["name"]] = dictionary
+    # Event types stay as codes into the manifest's list; no handler reads them per row
+    return EventColumns(mapped("timestamp.npy"), mapped("event_type.npy"), attributes, masks, dictionaries)
+
+
+class DiskDatasetWriter(Accumulator):
+    """Writes a dataset batch by batch into a new directory of segments.
+
+    Batches are buffered up to a segment's worth of events and then written, so a
+    streamed upload never holds more than one segment. :meth:`commit` moves the
+    finished dataset into place; until then it is invisible to queries.
+    """
+
+    def __init__(self, store: "DiskDatasetStore") -> None:
+        self.attributes = None  # type: ignore[assignment]  # every attribute of the events
+        self.store = store
+        self.directory = os.path.join(store.directory, f"{INCOMING_PREFIX}{uuid.uuid4().hex}")
+        os.makedirs(self.directory)
+        # Whatever ends the upload early (a malformed event, a dropped connection), the
+        # partial directory goes with the writer; after commit it has been moved away
+        weakref.finalize(self, shutil.rmtree, self.directory, ignore_errors=True)
+        self.rows = 0
+        self.segments = 0
+        self.digest = hashlib.blake2b(digest_size=16)
+        self._pending: List[EventColumns] = []
+        self._pending_rows = 0
+
+    def update(self, columns: EventColumns) -> None:
+        try:
+            self._pending.append(columns)
+            self._pending_rows += len(columns)
+            if self._pending_rows >= self.store.segment_rows:
+                self._flush(final=False)
+        except Exception:
+            self.discard()
+            raise
+
+    def write(self, columns: EventColumns) -> None:
+        """Write columns already in memory, a segment at a time."""
+        try:
+            for start in range(0, len(columns), self.store.segment_rows):
+                self._write(columns.sliced(start, start + self.store.segment_rows))
+        except Exception:
+            self.discard()
+            raise
+
+    def _flush(self, final: bool = True) -> None:
+        """Write the pending batches as whole segments, and the remainder too when ``final``."""
+        if not self._pending:
+            return
+        columns = self._pending[0] if len(self._pending) == 1 else EventColumns.concatenate(self._pending)
+        size = self.store.segment_rows
+        whole = len(columns) if final else len(columns) - len(columns) % size
+        for start in range(0, whole, size):
+            self._write(columns.sliced(start, min(start + size, whole)))
+        remainder = columns.sliced(whole, len(columns))
+        self._pending, self._pending_rows = ([remainder] if len(remainder) else []), len(remainder)
+
+    def _write(self, columns: EventColumns) -> None:
+        if not len(columns):
+            return
+        directory = os.path.join(self.directory, f"{self.segments:06d}")
+        manifest = _write_segment(directory, columns)
+        # The id of a streamed upload hashes what was written
+        self.digest.update(json.dumps(manifest, sort_keys=True).encode())
+        for name in sorted(os.listdir(directory)):
+            with open(os.path.join(directory, name), "rb") as file:
+                for block in iter(lambda: file.read(1 << 20), b""):
+                    self.digest.update(block)
+        self.segments += 1
+        self.rows += len(columns)
+
+    def commit(self, dataset_id: Optional[str] = None) -> str:
+        """Finish the dataset under ``dataset_id`` (by default a hash of its content)."""
+        try:
+            self._flush()
+        except Exception:
+            self.discard()
+            raise
+        dataset_id = dataset_id or self.digest.hexdigest()
+        with open(os.path.join(self.directory, DATASET_MANIFEST), "w") as file:
+            json.dump({"rows": self.rows, "segments": self.segments}, file)
+        try:
+            os.rename(self.directory, self.store.path(dataset_id))
+        except OSError:
+            # An identical dataset was stored first
+            self.discard()
+        return dataset_id
+
+    def discard(self) -> None:
+        shutil.rmtree(self.directory, ignore_errors=True)
+
+    def result(self) -> Dict[str, Any]:
+        dataset_id = self.commit()
+        return {"dataset_id": dataset_id, "rows": self.store.rows(dataset_id), "storage": "disk"}
+
+
+class DiskDatasetStore:
+    """Datasets kept as memory-mapped columnar files under ``directory``, one subdirectory each."""
+
+    def __init__(self, directory: str, segment_rows: int) -> None:
+        self.directory = directory
+        self.segment_rows = max(1, segment_rows)
+        os.makedirs(directory, exist_ok=True)
+
+    def path(self, dataset_id: str) -> str:
+        if not _DATASET_ID.fullmatch(dataset_id):
+            raise KeyError(dataset_id)
+        return os.path.join(self.directory, dataset_id)
+
+    def __contains__(self, dataset_id: str) -> bool:
+        try:
+            return os.path.isfile(os.path.join(self.path(dataset_id), DATASET_MANIFEST))
+        except KeyError:
+            return False
+
+    def _manifest(self, dataset_id: str) -> Dict[str, Any]:
+        try:
+            with open(os.path.join(self.path(dataset_id), DATASET_MANIFEST)) as file:
+                manifest: Dict[str, Any] = json.load(file)
+                return manifest
+        except FileNotFoundError:
+            raise KeyError(dataset_id)
+
+    def rows(self, dataset_id: str) -> int:
+        """Events in a stored dataset; raises KeyError."""
+        return int(self._manifest(dataset_id)["rows"])
+
+    def segments(self, dataset_id: str) -> Iterator[EventColumns]:
+        """The dataset's segments in order, each memory-mapped when reached; raises KeyError."""
+        count = self._manifest(dataset_id)["segments"]
+        directory = self.path(dataset_id)
+        return (_read_segment(os.path.join(directory, f"{index:06d}")) for index in range(count))
+
+    def writer(self) -> DiskDatasetWriter:
+        return DiskDatasetWriter(self)
+
+    def write(self, dataset_id: str, columns: EventColumns) -> None:
+        writer = self.writer()
+        writer.write(columns)
+        writer.commit(dataset_id)
+
+    def delete(self, dataset_id: str) -> bool:
+        if dataset_id not in self:
+            return False
+        # Rename first so readers never see a half-deleted dataset
+        doomed = os.path.join(self.directory, f"{INCOMING_PREFIX}{uuid.uuid4().hex}")
+        os.rename(self.path(dataset_id), doomed)
+        shutil.rmtree(doomed, ignore_errors=True)
+        return True
+
+    def remove_incomplete(self, max_age: float = 24 * 60 * 60) -> None:
+        """Delete uploads abandoned (e.g. by a crash) more than ``max_age`` seconds ago."""
+        for name in os.listdir(self.directory):
+            path = os.path.join(self.directory, name)
+            if name.startswith(INCOMING_PREFIX) and time.time() - os.path.getmtime(path) > max_age:
+                shutil.rmtree(path, ignore_errors=True)
+
+
+def order_statistics(
+    chunks: Callable[[], Iterable[np.ndarray]], ranks: Sequence[int], max_candidates: int = ORDER_CANDIDATES
+) -> List[float]:
+    """The values at 0-based ``ranks`` in the sorted order of all values ``chunks()`` yields.
+
+    Every rank starts out ranging over all values. Each round reads the chunks twice:
+    once for the count and extremes of the values in each rank's range, then either to
+    collect them, when at most ``max_candidates``, or to narrow the range to one bin of
+    a histogram. Memory stays bounded by a chunk plus the candidates.
+    """
+    # Per rank: the range [low, high] (or [low, high) when not closed) and the values below it
+    ranges: Dict[int, Tuple[float, float, bool, int]] = {rank: (-np.inf, np.inf, True, 0) for rank in set(ranks)}
+    found: Dict[int, float] = {}
+
+    def inside(chunk: np.ndarray, low: float, high: float, closed: bool) -> np.ndarray:
+        selected: np.ndarray = chunk[(chunk >= low) & ((chunk <= high) if closed else (chunk < high))]
+        return selected
+
+    while ranges:
+        extent = {rank: [0, np.inf, -np.inf] for rank in ranges}
+        for chunk in chunks():
+            for rank, bounds in ranges.items():
+                selected = inside(chunk, *bounds[:3])
+                if len(selected):
+                    extent[rank][0] += len(selected)
+                    extent[rank][1] = min(extent[rank][1], float(selected.min()))
+                    extent[rank][2] = max(extent[rank][2], float(selected.max()))
+
+        collect = {rank for rank in ranges if extent[rank][0] <= max_candidates}
+        for rank in list(ranges):
+            if extent[rank][1] == extent[rank][2] and rank not in collect:
+                found[rank] = extent[rank][1]
+                del ranges[rank]
+        candidates: Dict[int, List[np.ndarray]] = {rank: [] for rank in collect}
+        edges = {
+            rank: np.linspace(extent[rank][1], extent[rank][2], ORDER_BINS + 1) for rank in ranges if rank not in collect
+        }
+        histograms = {rank: np.zeros(ORDER_BINS, dtype=np.int64) for rank in edges}
+        for chunk in chunks():
+            for rank, bounds in ranges.items():
+                selected = inside(chunk, *bounds[:3])
+                if rank in collect:
+                    candidates[rank].append(selected)
+                else:
+                    bins = np.minimum(np.searchsorted(edges[rank], selected, side="right") - 1, ORDER_BINS - 1)
+                    histograms[rank] += np.bincount(bins, minlength=ORDER_BINS)
+
+        for rank in list(ranges):
+            below = ranges[rank][3]
+            if rank in collect:
+                values = np.concatenate(candidates[rank])
+                found[rank] = float(np.partition(values, rank - below)[rank - below])
+                del ranges[rank]
+                continue
+            # The bin holding the rank; bins are half-open except the last
+            cumulative = np.cumsum(histograms[rank])
+            index = int(np.searchsorted(cumulative, rank - below, side="right"))
+            before = int(cumulative[index - 1]) if index else 0
+            last = index == ORDER_BINS - 1
+            ranges[rank] = (float(edges[rank][index]), float(edges[rank][index + 1]), last, below + before)
+    return [found[rank] for rank in ranks]
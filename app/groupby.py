@@ -0,0 +1,194 @@
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+
+from app import parallel
+from app.columnar import EventColumns
+
+
+class GroupBy:
+    """Vectorized group-by over a label column.
+
+    Labels are factorized once into integer codes; every reduction is then a
+    ``np.bincount`` or a segment reduction over the values sorted by code.
+
+    With ``workers`` above one (by default from ``ANALYTICS_PARALLEL_WORKERS`` once
+    there are ``ANALYTICS_PARALLEL_MIN_ROWS`` rows) factorizing, counts, sums and
+    extremes are computed as per-chunk partials on several threads and merged,
+    and quantiles are computed for disjoint sets of groups concurrently.
+    """
+
+    def __init__(self, labels: np.ndarray, workers: Optional[int] = None) -> None:
+        workers = parallel.workers_for(len(labels)) if workers is None else workers
+        if workers > 1:
+            groups, codes = _factorize_chunks(labels, workers)
+        else:
+            groups, codes = np.unique(labels, return_inverse=True)
+        self._set_codes(groups, codes.reshape(-1), workers)
+
+    def _set_codes(self, groups: np.ndarray, codes: np.ndarray, workers: int = 1) -> None:
+        self.groups: np.ndarray = groups
+        self.codes: np.ndarray = codes
+        self.workers = workers
+        self.counts: np.ndarray = parallel.bincount(self.codes, minlength=len(self.groups), workers=workers)
+
+    @classmethod
+    def single(cls, size: int) -> "GroupBy":
+        """A grouping that puts every row into one group, for ungrouped statistics."""
+        grouping = cls.__new__(cls)
+        grouping._set_codes(np.array([""]), np.zeros(size, dtype=np.intp), parallel.workers_for(size))
+        return grouping
+
+    @classmethod
+    def from_columns(
+        cls, columns: EventColumns, group_by_attribute: str, value_attribute: str
+    ) -> Tuple["GroupBy", np.ndarray]:
+        """Group the events carrying both attributes; returns the engine and their values."""
+
+        def build() -> Tuple["GroupBy", np.ndarray]:
+            values, has_value = columns.numeric(value_attribute)
+            rows = columns.present(group_by_attribute) & has_value
+            return cls.from_attribute(columns, group_by_attribute, rows), values[rows]
+
+        return columns.shared(("group_by", group_by_attribute, value_attribute), build)
+
+    @classmethod
+    def from_attribute(cls, columns: EventColumns, attribute: str, rows: np.ndarray) -> "GroupBy":
+        """Group the ``rows`` (a boolean mask of events carrying ``attribute``) by its labels.
+
+        Dictionary-encoded attributes are grouped through their codes, factorizing the
+        distinct labels rather than every row's.
+        """
+        dictionary = columns.dictionaries.get(attribute)
+        if dictionary is None:
+            return cls(columns.keys(attribute)[0][rows])
+
+        # Distinct values may share a label (1 and "1"), so factorize the labels
+        groups, relabel = np.unique(dictionary.astype(str), return_inverse=True)
+        codes = relabel.reshape(-1)[columns.raw(attribute)[rows]]
+        used = np.bincount(codes, minlength=len(groups)) > 0
+        if not used.all():
+            groups, codes = groups[used], (np.cumsum(used) - 1)[codes]
+        grouping = cls.__new__(cls)
+        grouping._set_codes(groups, codes, parallel.workers_for(len(codes)))
+        return grouping
+
+    def __len__(self) -> int:
+        return len(self.groups)
+
+    @property
+    def starts(self) -> np.ndarray:
+        starts: np.ndarray = np.concatenate(([0], np.cumsum(self.counts)[:-1]))
+        return starts
+
+    def sum(self, values: np.ndarray) -> np.ndarray:
+        return parallel.bincount(self.codes, values, len(self.groups), self.workers)
+
+    def mean(self, values: np.ndarray) -> np.ndarray:
+        means: np.ndarray = self.sum(values) / self.counts
+        return means
+
+    def min(self, values: np.ndarray) -> np.ndarray:
+        return self._extremes(np.minimum, values, np.inf)
+
+    def max(self, values: np.ndarray) -> np.ndarray:
+        return self._extremes(np.maximum, values, -np.inf)
+
+    def _extremes(self, ufunc: np.ufunc, values: np.ndarray, identity: float) -> np.ndarray:
+        # Unbuffered ufunc.at beats sorting by group; with workers, per-chunk extremes are folded together
+        def partial(rows: slice) -> np.ndarray:
+            extremes = np.full(len(self.groups), identity)
+            ufunc.at(extremes, self.codes[rows], values[rows])
+            return extremes
+
+        result: np.ndarray = ufunc.reduce(parallel.map_chunks(partial, len(values), self.workers))
+        return result
+
+    def sorted_values(self, values: np.ndarray, value_order: Optional[np.ndarray] = None) -> np.ndarray:
+        """Values ordered by group, then by value within each group.
+
+        ``value_order`` is an existing ``argsort`` of ``values``; when given, only the
+        integer codes are re-sorted (stably) instead of sorting the values again.
+        """
+        if value_order is None:
+            index = np.lexsort((values, self.codes))
+        else:
+            index = value_order[np.argsort(self.codes[value_order], kind="stable")]
+        ordered: np.ndarray = values[index]
+        return ordered
+
+    def quantile(self, values: np.ndarray, q: float, ordered: Optional[np.ndarray] = None) -> np.ndarray:
+        """Per-group quantile with linear interpolation, matching ``np.percentile``."""
+        if ordered is None and self.workers > 1 and len(self) > 1:
+            return self._partitioned_quantile(values, q)
+        if ordered is None:
+            ordered = self.sorted_values(values)
+        position = q * (self.counts - 1)
+        lower = np.floor(position).astype(np.int64)
+        upper = np.minimum(lower + 1, self.counts - 1)
+        fraction = position - lower
+        starts = self.starts
+        low_values = ordered[starts + lower]
+        high_values = ordered[starts + upper]
+        result: np.ndarray = low_values + (high_values - low_values) * fraction
+        return result
+
+    def _partitioned_quantile(self, values: np.ndarray, q: float) -> np.ndarray:
+        # Every thread sorts and reads the groups whose code is congruent to its index
+        parts = min(self.workers, len(self))
+        result = np.empty(len(self))
+
+        def part(index: int) -> None:
+            rows = np.flatnonzero(self.codes % parts == index)
+            subset = GroupBy.__new__(GroupBy)
+            subset._set_codes(self.groups[index::parts], self.codes[rows] // parts)
+            result[index::parts] = subset.quantile(values[rows], q)
+
+        parallel.map_parallel(part, range(parts), parts)
+        return result
+
+    def median(self, values: np.ndarray, ordered: Optional[np.ndarray] = None) -> np.ndarray:
+        return self.quantile(values, 0.5, ordered)
+
+    def as_dict(self, statistic: np.ndarray) -> Dict[str, float]:
+        return dict(zip(self.groups.tolist(), statistic.tolist()))
+
+
+class GroupCodes:
+    """Stable integer codes for labels arriving batch by batch; new labels get the next code."""
+
+    def __init__(self) -> None:
+        self.groups: List[str] = []
+        self._codes: Dict[str, int] = {}
+
+    def __len__(self) -> int:
+        return len(self.groups)
+
+    def encode(self, labels: np.ndarray) -> np.ndarray:
+        # Factorize the batch, then map its few distinct labels onto the running codes
+        batch_groups, inverse = np.unique(labels, return_inverse=True)
+        mapping = np.empty(len(batch_groups), dtype=np.intp)
+        for index, group in enumerate(batch_groups.tolist()):
+            code = self._codes.get(group)
+            if code is None:
+                code = self._codes[group] = len(self.groups)
+                self.groups.append(group)
+            mapping[index] = code
+        codes: np.ndarray = mapping[inverse.reshape(-1)]
+        return codes
+
+
+def _factorize_chunks(labels: np.ndarray, workers: int) -> Tuple[np.ndarray, np.ndarray]:
+    # Factorize each chunk on its own, then map the chunk codes onto the merged groups
+    chunks = parallel.chunk_slices(len(labels), workers)
+    partials = parallel.map_parallel(lambda rows: np.unique(labels[rows], return_inverse=True), chunks, workers)
+    groups, merged = np.unique(np.concatenate([chunk_groups for chunk_groups, _ in partials]), return_inverse=True)
+    offsets = np.cumsum([0] + [len(chunk_groups) for chunk_groups, _ in partials])
+
+    codes = np.empty(len(labels), dtype=np.intp)
+
+    def remap(index: int) -> None:
+        codes[chunks[index]] = merged[offsets[index]:offsets[index + 1]][partials[index][1].reshape(-1)]
+
+    parallel.map_parallel(remap, range(len(chunks)), workers)
+    return groups, codes
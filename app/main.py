@@ -1,19 +1,76 @@
-from fastapi import FastAPI, HTTPException
-from pydantic import BaseModel
-from sklearn.linear_model import LinearRegression  # Ensure sklearn is installed
+import functools
+from fastapi import Depends, FastAPI, Header, HTTPException, Query, Response
+from pydantic import BaseModel, Field, SkipValidation, ValidationError, model_validator
 import numpy as np
-from typing import List, Dict, Any, Optional
-import statistics
-from collections import defaultdict
-from datetime import date
+from typing import List, Dict, Any, Callable, Iterator, Literal, Optional, Tuple, Type, Union
 from fastapi.middleware.cors import CORSMiddleware
 
+from app import config, metrics, parallel, profiling
+from app.cache import ResultCache
+from app.columnar import EventColumns
+from app.compression import CompressionMiddleware
+from app.datasets import DatasetStore, DatasetTooLarge, content_hash
+from app.disk import DiskDatasetStore, DiskDatasetWriter, order_statistics
+from app.groupby import GroupBy
+from app.model_store import FittedModel, ModelStore, model_id, prediction_points
+from app.offload import ProcessOffload
+from app.regression import GroupedLinearFit, LinearFit, MultiLinearFit
+from app.responses import FastJSONResponse
+from app.sessions import AggregationSession, SessionStore
+from app.rolling import bucket_labels, rolling_statistics, time_buckets, validate_rolling_statistics
+from app.routing import EventSource, analytics_route
+from app.sketch import QuantileSketch
+from app.streaming import (
+    Accumulator,
+    CountByTimeAccumulator,
+    ExtremeAccumulator,
+    FutureValuesAccumulator,
+    GroupMeanAccumulator,
+    PredictAccumulator,
+    grouped_future_values,
+)
+from app.summary import MIN_OUTLIER_VALUES, SUMMARY_STATISTICS, summarize, validate_statistics
+from app.timeseries import count_timestamps, timestamp_years
+
 
 app = FastAPI(
     title="Analytics API",
     description="API for calculating analytics based on datasets",
     version="1.0.0",
+    default_response_class=FastJSONResponse,
+)
+
+# Requests over large datasets run in worker processes so they never stall the server
+offload = ProcessOffload(
+    lambda data: plan_offload(data),
+    workers=config.OFFLOAD_WORKERS,
+    queue_depth=config.OFFLOAD_QUEUE_DEPTH,
+    queue_timeout=config.OFFLOAD_QUEUE_TIMEOUT,
 )
+app.router.on_shutdown.append(offload.shutdown)
+
+# Responses to identical dataset requests, reused for RESULT_CACHE_TTL seconds
+result_cache = ResultCache(max_bytes=config.RESULT_CACHE_BYTES, ttl=config.RESULT_CACHE_TTL)
+
+# Fitted /predict models, keyed by a hash of their training data and attributes
+model_store = ModelStore(max_models=config.MODEL_CACHE_SIZE)
+
+# Besides JSON, routes taking a dataset accept Arrow IPC, Parquet and NDJSON bodies.
+# NDJSON bodies on these routes are reduced batch by batch in constant memory.
+app.router.route_class = analytics_route({
+    # Predicting from a model_id reads no events, so runs the regular handler
+    "/predict": lambda data: PredictAccumulator(data.features, data.y_attribute, data.x_values, model_store)
+    if data.model_id is None else None,
+    "/average-by-attribute": lambda data: GroupMeanAccumulator(data.group_by_attribute, data.value_attribute),
+    "/highest-value": lambda data: ExtremeAccumulator(data.attribute_name, "highest_value", highest=True),
+    "/lowest-value": lambda data: ExtremeAccumulator(data.attribute_name, "lowest_value", highest=False),
+    "/predict-future-values": lambda data: FutureValuesAccumulator(
+        data.value_attribute, data.time_points, data.group_by_attribute
+    ),
+    "/count-by-time": lambda data: CountByTimeAccumulator(data.time_format),
+    # Disk uploads are written segment by segment as they stream
+    "/datasets": lambda data: disk_writer(data),
+}, offload, result_cache, lambda params: references_held(params))
 
 
 class FilteredEventData(BaseModel):
@@ -22,90 +79,336 @@ class FilteredEventData(BaseModel):
     attribute: Dict[str, Any]
 
 
+# Events are documented as FilteredEventData but arrive as plain dicts; EventColumns
+# validates their shape and extracts only the attributes a handler asks for.
+EventList = SkipValidation[List[FilteredEventData]]
+
+
 app.add_middleware(
     CORSMiddleware,
     allow_origins=["*"],  # Allows all origins
     allow_credentials=True,
     allow_methods=["*"],  # Allows all methods
     allow_headers=["*"],  # Allows all headers
+    expose_headers=["ETag", "X-Cache", "Age", "Server-Timing", "X-Profile-Id"],  # Lets browser clients revalidate with If-None-Match
 )
 
+# Requests sending X-Profile (when allowed, or sampled at PROFILE_SAMPLE_RATE) are profiled; see /admin/profiles
+app.add_middleware(profiling.ProfilingMiddleware)
+
+# gzip or zstd for large responses, and compressed request bodies
+app.add_middleware(CompressionMiddleware, minimum_size=config.COMPRESSION_MIN_BYTES)
+
+# Outermost, so request metrics and Server-Timing cover decompression and compression too
+app.add_middleware(metrics.MetricsMiddleware)
+
+
+# Parsed datasets uploaded through POST /datasets, keyed by content hash
+dataset_store = DatasetStore(max_bytes=config.DATASET_CACHE_BYTES)
+
+# Datasets uploaded with storage=disk, memory-mapped a segment at a time when queried
+disk_store = DiskDatasetStore(config.DATASET_DIR, config.DISK_SEGMENT_ROWS) if config.DATASET_DIR else None
+if disk_store is not None:
+    app.router.on_startup.append(disk_store.remove_incomplete)
 
-class PredictionRequest(BaseModel):
-    data: List[FilteredEventData]  # List of filtered event data
-    x_attribute: str  # Name of the feature (x) attribute
-    y_attribute: str  # Name of the target (y) attribute
-    x_values: List[float]  # List of x values to predict
 
+class DatasetUpload(EventSource):
+    cacheable = False
 
-class RequestBody(BaseModel):
+    data: EventList
+    storage: Literal["memory", "disk"] = "memory"  # Hold the dataset in memory, or on disk under ANALYTICS_DATASET_DIR
+
+
+class DatasetRequest(EventSource):
+    data: Optional[EventList] = None  # List of filtered event data
+    dataset_id: Optional[str] = None  # Or the id of a dataset uploaded via POST /datasets
+
+    @model_validator(mode="after")
+    def check_dataset_source(self) -> "DatasetRequest":
+        if (self.data is None) == (self.dataset_id is None):
+            raise ValueError("Provide exactly one of 'data' or 'dataset_id'")
+        return self
+
+
+class PredictionRequest(DatasetRequest):
+    x_attribute: Optional[str] = None  # Name of the feature (x) attribute
+    x_attributes: Optional[List[str]] = Field(None, min_length=1)  # Or several features, for a multivariate fit
+    y_attribute: Optional[str] = None  # Name of the target (y) attribute
+    x_values: List[Union[float, List[float]]]  # x values to predict; with x_attributes, a list of feature values each
+    model_id: Optional[str] = None  # Or a model fitted by an earlier request, instead of a dataset and attributes
+
+    @model_validator(mode="after")
+    def check_dataset_source(self) -> "PredictionRequest":
+        if self.model_id is not None:
+            # Routes and /batch pass columnar, NDJSON and batch events beside an empty data
+            if self.data or self.dataset_id is not None:
+                raise ValueError("Provide either 'model_id' or a dataset, not both")
+            return self
+        if (self.data is None) == (self.dataset_id is None):
+            raise ValueError("Provide exactly one of 'data' or 'dataset_id'")
+        if (self.x_attribute is None) == (self.x_attributes is None):
+            raise ValueError("Provide exactly one of 'x_attribute' or 'x_attributes'")
+        if self.y_attribute is None:
+            raise ValueError("'y_attribute' is required")
+        prediction_points(self.x_values, None if self.x_attributes is None else len(self.x_attributes))
+        return self
+
+    @property
+    def features(self) -> Union[str, List[str]]:
+        # The single feature, or the list of features, the model is fitted on
+        return self.x_attributes if self.x_attributes is not None else str(self.x_attribute)
+
+
+class RequestBody(DatasetRequest):
     attribute_name: str
-    data: List[FilteredEventData]
 
 
-class AggregateByAttributeRequest(BaseModel):
+class ApproximateQuantiles(BaseModel):
+    approximate: bool = False  # Estimate quantiles with a sketch instead of sorting
+    relative_accuracy: float = Field(config.SKETCH_RELATIVE_ACCURACY, gt=0, lt=1)
+
+    def quantile_sketch(self, values: np.ndarray, grouping: Optional[GroupBy] = None) -> QuantileSketch:
+        n_groups = 1 if grouping is None else len(grouping)
+
+        def build(rows: slice) -> QuantileSketch:
+            codes = None if grouping is None else grouping.codes[rows]
+            return QuantileSketch(self.relative_accuracy, n_groups).update(values[rows], codes, n_groups)
+
+        # Large inputs are sketched in chunks on several threads and the sketches merged
+        sketches = parallel.map_chunks(build, len(values), parallel.workers_for(len(values)))
+        return functools.reduce(QuantileSketch.merge, sketches)
+
+
+class MedianValueRequest(RequestBody, ApproximateQuantiles):
+    pass
+
+
+class AggregateByAttributeRequest(DatasetRequest):
     group_by_attribute: str
     value_attribute: str
-    data: List[FilteredEventData]
 
 
-class FutureValuesRequest(BaseModel):
+class MedianByAttributeRequest(AggregateByAttributeRequest, ApproximateQuantiles):
+    pass
+
+
+class FutureValuesRequest(DatasetRequest):
     time_points: List[int]
     value_attribute: str
-    data: List[FilteredEventData]
+    group_by_attribute: Optional[str] = None  # Fit and predict every group separately
 
 
-class OutliersRequest(BaseModel):
+class OutliersRequest(DatasetRequest, ApproximateQuantiles):
     value_attribute: str
-    data: List[FilteredEventData]
 
 
-class MinMaxByAttributeRequest(BaseModel):
+class MinMaxByAttributeRequest(DatasetRequest):
     group_by_attribute: str
     value_attribute: str
-    data: List[FilteredEventData]
 
 
-class CountByTimeRequest(BaseModel):
+class CountByTimeRequest(DatasetRequest):
     time_format: str = "year"  # year, month, day
-    data: List[FilteredEventData]
 
 
-@app.post("/predict")
-def predict(data: PredictionRequest) -> Dict[str, List[float]]:
+class SummaryRequest(DatasetRequest, ApproximateQuantiles):
+    value_attribute: str
+    statistics: List[str] = list(SUMMARY_STATISTICS)  # Any of SUMMARY_STATISTICS
+    group_by_attributes: List[str] = []  # Optional breakdowns, one per attribute
+
+
+class BatchOperation(BaseModel):
+    operation: str  # Name of an analytics endpoint, e.g. "median-by-attribute"
+    parameters: Dict[str, Any] = {}  # That endpoint's request fields, without data or dataset_id
+
+
+class BatchRequest(DatasetRequest):
+    operations: List[BatchOperation] = Field(min_length=1)  # Run in order over the one dataset
+
+
+class RollingRequest(DatasetRequest):
+    value_attribute: str
+    time_bucket: str = "day"  # day, week, month, year
+    window: int = Field(7, ge=1)  # Buckets per window, ending at and including each bucket
+    statistics: List[str] = ["mean"]  # Any of count, sum, mean, min, max, median, or a percentile such as p90
+    min_periods: int = Field(1, ge=1)  # Windows with fewer values are null
+    group_by_attribute: Optional[str] = None  # Also compute every statistic per group
+
+
+def load_columns(data: DatasetRequest, attributes: Optional[List[str]]) -> EventColumns:
+    if data.dataset_id is not None and not data.has_columns:
+        try:
+            columns = dataset_store.get(data.dataset_id)
+        except KeyError:
+            if disk_store is not None and data.dataset_id in disk_store:
+                raise HTTPException(
+                    status_code=400,
+                    detail=f"Dataset {data.dataset_id} is stored on disk, which only {', '.join(DISK_ENDPOINTS)} support",
+                )
+            raise HTTPException(status_code=404, detail=f"Dataset not found: {data.dataset_id}")
+    else:
+        columns = data.columns(attributes)
+    metrics.record_rows(len(columns))
+    return columns
+
+
+# Endpoints that reduce disk datasets a segment at a time
+DISK_ENDPOINTS = ("/average-by-attribute", "/count-by-time", "/outliers", "/predict", "/predict-future-values")
+
+
+def disk_segments(data: DatasetRequest) -> Optional[Callable[[], Iterator[EventColumns]]]:
+    """Opens the segments of the disk dataset ``data`` names; None when it names none.
+
+    Each call maps the segments afresh, for handlers that read the data more than once.
+    """
+    dataset_id = data.dataset_id
+    if disk_store is None or dataset_id is None or data.has_columns or dataset_id in dataset_store:
+        return None
+    if dataset_id not in disk_store:
+        return None
+    store = disk_store
+    return lambda: store.segments(dataset_id)
+
+
+def reduce_segments(segments: Callable[[], Iterator[EventColumns]], accumulator: Accumulator) -> Dict[str, Any]:
+    rows = 0
     try:
-        # Extract x and y values from filtered event data based on provided attribute names
-        x_data_raw: List[Optional[Any]] = [event.attribute.get(data.x_attribute) for event in data.data]
-        y_data_raw: List[Optional[Any]] = [event.attribute.get(data.y_attribute) for event in data.data]
+        for columns in segments():
+            rows += len(columns)
+            accumulator.update(columns)
+        metrics.record_rows(rows)
+        result: Dict[str, Any] = accumulator.result()
+        return result
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=400, detail=str(e))
 
-        # Filter out None values
-        x_data_filtered = [x for x in x_data_raw if x is not None]
-        y_data_filtered = [y for y in y_data_raw if y is not None]
 
-        if not x_data_filtered or not y_data_filtered:
-            raise HTTPException(status_code=400, detail="Input data cannot be empty.")
+def disk_writer(data: DatasetUpload) -> Optional[DiskDatasetWriter]:
+    return require_disk_store().writer() if data.storage == "disk" else None
 
-        if len(x_data_filtered) != len(y_data_filtered):
-            raise HTTPException(status_code=400, detail="Mismatched x and y data lengths.")
 
-        # Convert data to numpy arrays
-        x_data: np.ndarray = np.array(x_data_filtered, dtype=float).reshape(-1, 1)
-        y_data: np.ndarray = np.array(y_data_filtered, dtype=float)
+def require_disk_store() -> DiskDatasetStore:
+    if disk_store is None:
+        raise HTTPException(status_code=400, detail="Disk datasets are turned off: set ANALYTICS_DATASET_DIR")
+    return disk_store
 
-        if np.isnan(x_data).any() or np.isnan(y_data).any():
-            raise HTTPException(status_code=400, detail="Input data contains NaN or invalid values.")
 
-        # Initialize and fit the model
-        model = LinearRegression()
-        model.fit(x_data, y_data)
+def plan_offload(data: EventSource) -> Optional[Tuple[DatasetRequest, EventColumns]]:
+    # Only dataset requests over OFFLOAD_MIN_ROWS events are worth shipping to a worker
+    # Fitted models are cached in this process, so /predict always fits here
+    if not isinstance(data, DatasetRequest) or isinstance(data, PredictionRequest):
+        return None
+    # Inline JSON events would have to be extracted into columns here, holding the GIL for
+    # longer than the worker saves; only stored datasets and columnar bodies are shipped
+    if not data.has_columns and data.dataset_id is None:
+        return None
+    if data.dataset_id is not None and data.dataset_id not in dataset_store:
+        return None
+    columns = load_columns(data, None)
+    if len(columns) < config.OFFLOAD_MIN_ROWS:
+        return None
+
+    # The worker gets the columns through shared memory, not the raw events
+    request = data.model_copy(update={"data": None})
+    request._columns = request._table = None
+    return request, columns
 
-        # Prepare x_values for prediction (reshaping to match the model's expected input)
-        x_values: np.ndarray = np.array(data.x_values, dtype=float).reshape(-1, 1)
 
-        # Make predictions
-        prediction = model.predict(x_values)
+def _present_values(columns: EventColumns, attribute: str) -> np.ndarray:
+    def build() -> np.ndarray:
+        values, present = columns.numeric(attribute)
+        present_values: np.ndarray = values[present]
+        return present_values
 
-        return {"prediction": prediction.tolist()}
+    return columns.shared(("present", attribute), build)
+
+
+def _percentiles(columns: EventColumns, attribute: str, values: np.ndarray, qs: List[float]) -> List[float]:
+    """``np.percentile`` of an attribute's present values; a batch reads them off one shared sort."""
+    if not columns.is_sharing:
+        return [float(value) for value in np.percentile(values, qs)]
+    ordered = columns.shared(("sorted", attribute), lambda: np.sort(values))
+    single = GroupBy.single(len(ordered))
+    return [float(single.quantile(ordered, q / 100, ordered)[0]) for q in qs]
+
+
+def _group_ordered_values(columns: EventColumns, grouping: GroupBy, values: np.ndarray, key: Tuple[str, ...]) -> Optional[np.ndarray]:
+    """Values sorted by group then value, shared within a batch; None outside one."""
+    if not columns.is_sharing:
+        return None
+    return columns.shared(("group_ordered", *key), lambda: grouping.sorted_values(values))
+
+
+@app.post("/predict")
+def predict(data: PredictionRequest) -> Dict[str, Any]:
+    if data.model_id is not None:
+        model = model_store.get(data.model_id)
+        if model is None:
+            raise HTTPException(status_code=404, detail=f"Model not found: {data.model_id}")
+    else:
+        model = fitted_model(data)
+    try:
+        prediction = model.predict(prediction_points(data.x_values, model.width))
+        return {"prediction": prediction, "fit": model.statistics(), "model_id": model.id}
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=f"Invalid input data: {str(e)}")
+
+
+def fitted_model(data: PredictionRequest) -> FittedModel:
+    """Fit ``data``'s model, or find it in the model cache."""
+    features, y_attribute = data.features, str(data.y_attribute)
+    x_attributes = [features] if isinstance(features, str) else features
+    # A stored dataset is identified by its id, so a cached fit skips reading its columns
+    if data.dataset_id is not None and not data.has_columns:
+        cached = model_store.get(model_id(data.dataset_id, features, y_attribute))
+        if cached is not None:
+            return cached
+    segments = disk_segments(data)
+    if segments is not None and data.dataset_id is not None:
+        accumulator = PredictAccumulator(features, y_attribute, [])
+        reduce_segments(segments, accumulator)
+        model = accumulator.fitted()
+        model.id = model_id(data.dataset_id, features, y_attribute)
+        model_store.put(model)
+        return model
+
+    columns = load_columns(data, [*x_attributes, y_attribute])
+    try:
+        # Extract x and y columns based on provided attribute names
+        x_columns = [columns.numeric(attribute) for attribute in x_attributes]
+        y_all, y_present = columns.numeric(y_attribute)
+
+        if not y_present.any() or not all(x_present.any() for _, x_present in x_columns):
+            raise HTTPException(status_code=400, detail="Input data cannot be empty.")
+
+        # Pair x and y within each event; every event carrying one must carry all
+        rows = y_present.copy()
+        for _, x_present in x_columns:
+            rows &= x_present
+        paired = np.count_nonzero(rows)
+        if any(np.count_nonzero(present) != paired for present in (y_present, *(x_present for _, x_present in x_columns))):
+            raise HTTPException(status_code=400, detail="Mismatched x and y data lengths.")
+        x_data = [x_all[rows] for x_all, _ in x_columns]
+        y_data: np.ndarray = y_all[rows]
+
+        if np.isnan(y_data).any() or any(np.isnan(x).any() for x in x_data):
+            raise HTTPException(status_code=400, detail="Input data contains NaN or invalid values.")
+
+        key = model_id(data.dataset_id if data.dataset_id is not None else [*x_data, y_data], features, y_attribute)
+        cached = model_store.get(key)
+        if cached is not None:
+            return cached
+
+        # Fit the least squares from its sufficient statistics
+        if isinstance(features, str):
+            fit: Union[LinearFit, MultiLinearFit] = LinearFit.from_arrays(x_data[0], y_data)
+        else:
+            fit = MultiLinearFit.from_arrays(np.column_stack(x_data), y_data)
+        model = FittedModel(key, features, y_attribute, fit)
+        model_store.put(model)
+        return model
     except ValueError as e:
         raise HTTPException(status_code=400, detail=f"Invalid input data: {str(e)}")
     except Exception as e:
@@ -114,54 +417,43 @@ def predict(data: PredictionRequest) -> Dict[str, List[float]]:
 
 @app.post("/average-by-attribute")
 def average_by_attribute(data: AggregateByAttributeRequest) -> Dict[str, Dict[str, float]]:
+    segments = disk_segments(data)
+    if segments is not None:
+        return reduce_segments(segments, GroupMeanAccumulator(data.group_by_attribute, data.value_attribute))
+    columns = load_columns(data, [data.group_by_attribute, data.value_attribute])
     try:
-        grouped_values: Dict[str, List[float]] = {}
+        grouping, values = GroupBy.from_columns(columns, data.group_by_attribute, data.value_attribute)
 
-        for event in data.data:
-            group_key = event.attribute.get(data.group_by_attribute)
-            value = event.attribute.get(data.value_attribute)
-            if group_key is not None and value is not None:
-                if group_key not in grouped_values:
-                    grouped_values[group_key] = []
-                grouped_values[group_key].append(float(value))
-
-        if not grouped_values:
+        if not len(grouping):
             raise HTTPException(
                 status_code=400,
                 detail=f"No valid data found for attributes: {data.group_by_attribute}, {data.value_attribute}",
             )
 
-        average_values = {
-            group: statistics.mean(values) for group, values in grouped_values.items()
-        }
+        average_values = grouping.as_dict(grouping.mean(values))
         return {"average_values": average_values}
     except Exception as e:
         raise HTTPException(status_code=400, detail=str(e))
 
 
 @app.post("/median-by-attribute")
-def median_by_attribute(data: AggregateByAttributeRequest) -> Dict[str, Dict[str, float]]:
+def median_by_attribute(data: MedianByAttributeRequest) -> Dict[str, Dict[str, float]]:
+    columns = load_columns(data, [data.group_by_attribute, data.value_attribute])
     try:
-        grouped_values: Dict[str, List[float]] = {}
+        grouping, values = GroupBy.from_columns(columns, data.group_by_attribute, data.value_attribute)
 
-        for event in data.data:
-            group_key = event.attribute.get(data.group_by_attribute)
-            value = event.attribute.get(data.value_attribute)
-            if group_key is not None and value is not None:
-                if group_key not in grouped_values:
-                    grouped_values[group_key] = []
-                grouped_values[group_key].append(float(value))
-
-        if not grouped_values:
+        if not len(grouping):
             raise HTTPException(
                 status_code=400,
                 detail=f"No valid data found for attributes: {data.group_by_attribute}, {data.value_attribute}",
             )
 
-        median_values = {
-            group: statistics.median(values)
-            for group, values in grouped_values.items()
-        }
+        if data.approximate:
+            medians = data.quantile_sketch(values, grouping).quantile(0.5)
+        else:
+            key = (data.group_by_attribute, data.value_attribute)
+            medians = grouping.median(values, _group_ordered_values(columns, grouping, values, key))
+        median_values = grouping.as_dict(medians)
         return {"median_values": median_values}
     except Exception as e:
         raise HTTPException(status_code=400, detail=str(e))
@@ -169,20 +461,19 @@ def median_by_attribute(data: AggregateByAttributeRequest) -> Dict[str, Dict[str
 
 @app.post("/highest-value")
 def highest_value(data: RequestBody) -> Dict[str, float]:
+    columns = load_columns(data, [data.attribute_name])
     try:
         # Extract the values of the specified attribute
-        attribute_values: List[float] = [
-            float(value) for value in (event.attribute.get(data.attribute_name) for event in data.data) if value is not None
-        ]
+        attribute_values = _present_values(columns, data.attribute_name)
 
-        if not attribute_values:
+        if not attribute_values.size:
             raise HTTPException(
                 status_code=400,
                 detail="No valid values found for the specified attribute.",
             )
 
         # Find the highest value
-        highest = max(attribute_values)
+        highest = float(attribute_values.max())
 
         return {"highest_value": highest}
 
@@ -192,20 +483,19 @@ def highest_value(data: RequestBody) -> Dict[str, float]:
 
 @app.post("/lowest-value")
 def lowest_value(data: RequestBody) -> Dict[str, float]:
+    columns = load_columns(data, [data.attribute_name])
     try:
         # Extract the values of the specified attribute
-        attribute_values: List[float] = [
-            float(value) for value in (event.attribute.get(data.attribute_name) for event in data.data) if value is not None
-        ]
+        attribute_values = _present_values(columns, data.attribute_name)
 
-        if not attribute_values:
+        if not attribute_values.size:
             raise HTTPException(
                 status_code=400,
                 detail="No valid values found for the specified attribute.",
             )
 
         # Find the lowest value
-        lowest = min(attribute_values)
+        lowest = float(attribute_values.min())
 
         return {"lowest_value": lowest}
 
@@ -214,21 +504,23 @@ def lowest_value(data: RequestBody) -> Dict[str, float]:
 
 
 @app.post("/median-value")
-def median_value(data: RequestBody) -> Dict[str, float]:
+def median_value(data: MedianValueRequest) -> Dict[str, float]:
+    columns = load_columns(data, [data.attribute_name])
     try:
         # Extract the values of the specified attribute
-        attribute_values: List[float] = [
-            float(value) for value in (event.attribute.get(data.attribute_name) for event in data.data) if value is not None
-        ]
+        attribute_values = _present_values(columns, data.attribute_name)
 
-        if not attribute_values:
+        if not attribute_values.size:
             raise HTTPException(
                 status_code=400,
                 detail="No valid values found for the specified attribute.",
             )
 
         # Find the median value
-        median = statistics.median(attribute_values)
+        if data.approximate:
+            median = float(data.quantile_sketch(attribute_values).quantile(0.5)[0])
+        else:
+            median = _percentiles(columns, data.attribute_name, attribute_values, [50])[0]
 
         return {"median_value": median}
 
@@ -237,68 +529,78 @@ def median_value(data: RequestBody) -> Dict[str, float]:
 
 
 @app.post("/predict-future-values")
-def predict_future_values(data: FutureValuesRequest) -> Dict[str, Dict[int, float]]:
+def predict_future_values(data: FutureValuesRequest) -> Dict[str, Any]:
+    segments = disk_segments(data)
+    if segments is not None:
+        if not data.time_points:
+            return {"predicted_values": {}}
+        accumulator = FutureValuesAccumulator(data.value_attribute, data.time_points, data.group_by_attribute)
+        return reduce_segments(segments, accumulator)
+    attributes = [data.value_attribute] + ([data.group_by_attribute] if data.group_by_attribute else [])
+    columns = load_columns(data, attributes)
     try:
         # If time_points is empty, return empty predictions
         if not data.time_points:
             return {"predicted_values": {}}
 
-        # Extract x (time point) and y (value)
-        x_data: List[int] = []
-        y_data: List[float] = []
-
-        for event in data.data:
-            timestamp = event.time_object.get("timestamp")
-            value = event.attribute.get(data.value_attribute)
-            if timestamp and value is not None:
-                time_point = int(timestamp[:4])  # Extract year part
-                x_data.append(time_point)
-                y_data.append(float(value))
+        # Extract x (time point) and y (value) from events carrying both
+        dates, has_timestamp = columns.dates()
+        values, has_value = columns.numeric(data.value_attribute)
+        rows = has_timestamp & has_value
+
+        if data.group_by_attribute:
+            # Every group's line from one set of segment sums over the group codes
+            rows &= columns.present(data.group_by_attribute)
+            grouping = GroupBy.from_attribute(columns, data.group_by_attribute, rows)
+            fits = GroupedLinearFit.from_arrays(
+                grouping.codes, timestamp_years(dates[rows]), values[rows], len(grouping)
+            )
+            return grouped_future_values(fits, grouping.groups.tolist(), data.time_points)
 
-        if len(x_data) < 2:
+        if np.count_nonzero(rows) < 2:
             raise HTTPException(
                 status_code=400, detail="Not enough data for prediction: At least 2 data points required"
             )
 
-        # Convert data to numpy arrays
-        x_data_np = np.array(x_data, dtype=float).reshape(-1, 1)
-        y_data_np = np.array(y_data, dtype=float)
-
-        # Fit linear regression model
-        model = LinearRegression()
-        model.fit(x_data_np, y_data_np)
+        # Fit value against the year part of each timestamp
+        fit = LinearFit.from_arrays(timestamp_years(dates[rows]), values[rows])
 
         # Predict for future time points
-        future_points_np = np.array(data.time_points, dtype=float).reshape(-1, 1)
-        predictions = model.predict(future_points_np)
+        predictions = fit.predict(np.array(data.time_points, dtype=float))
 
         return {
             "predicted_values": dict(
                 zip([int(point) for point in data.time_points], predictions.tolist())
-            )
+            ),
+            "fit": fit.statistics(),
         }
 
     except Exception as e:
         raise HTTPException(status_code=400, detail=str(e))
 
 
-@app.post("/outliers")
-def outliers(data: OutliersRequest) -> Dict[str, List[float]]:
+@app.post("/outliers", response_model=Dict[str, List[float]])
+def outliers(data: OutliersRequest) -> Dict[str, np.ndarray]:
+    segments = disk_segments(data)
+    if segments is not None:
+        return disk_outliers(data, segments)
+    columns = load_columns(data, [data.value_attribute])
     try:
         # Extract values from the input data
-        values: List[float] = [
-            float(value) for value in (event.attribute.get(data.value_attribute) for event in data.data) if value is not None
-        ]
+        values = _present_values(columns, data.value_attribute)
 
         # Ensure there are enough data points to calculate outliers
-        if len(values) < 4:
+        if len(values) < MIN_OUTLIER_VALUES:
             raise HTTPException(
                 status_code=400, detail="Not enough data to calculate outliers: At least 4 data points required"
             )
 
         # Calculate the interquartile range (IQR)
-        q1 = np.percentile(values, 25)
-        q3 = np.percentile(values, 75)
+        if data.approximate:
+            sketch = data.quantile_sketch(values)
+            q1, q3 = sketch.quantile(0.25)[0], sketch.quantile(0.75)[0]
+        else:
+            q1, q3 = _percentiles(columns, data.value_attribute, values, [25, 75])
         iqr = q3 - q1
 
         # Calculate bounds for outliers
@@ -306,9 +608,11 @@ def outliers(data: OutliersRequest) -> Dict[str, List[float]]:
         upper_bound = q3 + 1.5 * iqr
 
         # Identify outliers
-        outlier_values = [
-            value for value in values if value < lower_bound or value > upper_bound
-        ]
+        outlier_values = np.concatenate(parallel.map_chunks(
+            lambda rows: values[rows][(values[rows] < lower_bound) | (values[rows] > upper_bound)],
+            len(values),
+            parallel.workers_for(len(values)),
+        ))
 
         return {"outliers": outlier_values}
 
@@ -320,29 +624,61 @@ def outliers(data: OutliersRequest) -> Dict[str, List[float]]:
         raise HTTPException(status_code=400, detail=str(e))
 
 
+def disk_outliers(data: OutliersRequest, segments: Callable[[], Iterator[EventColumns]]) -> Dict[str, np.ndarray]:
+    """Outliers of a disk dataset, reading it a segment at a time."""
+
+    def chunks() -> Iterator[np.ndarray]:
+        for columns in segments():
+            yield _present_values(columns, data.value_attribute)
+
+    try:
+        count = sum(len(chunk) for chunk in chunks())
+        if count < MIN_OUTLIER_VALUES:
+            raise HTTPException(
+                status_code=400, detail="Not enough data to calculate outliers: At least 4 data points required"
+            )
+
+        if data.approximate:
+            sketch = QuantileSketch(data.relative_accuracy)
+            for chunk in chunks():
+                sketch.update(chunk)
+            q1, q3 = sketch.quantile(0.25)[0], sketch.quantile(0.75)[0]
+        else:
+            # np.percentile's linear interpolation between the two order statistics around each rank
+            positions = [q * (count - 1) for q in (0.25, 0.75)]
+            ranks = [rank for position in positions for rank in (int(position), min(int(position) + 1, count - 1))]
+            values = order_statistics(chunks, ranks)
+            q1, q3 = (
+                values[2 * index] + (values[2 * index + 1] - values[2 * index]) * (position - int(position))
+                for index, position in enumerate(positions)
+            )
+        iqr = q3 - q1
+        lower_bound = q1 - 1.5 * iqr
+        upper_bound = q3 + 1.5 * iqr
+
+        outlier_values = [chunk[(chunk < lower_bound) | (chunk > upper_bound)] for chunk in chunks()]
+        return {"outliers": np.concatenate(outlier_values)}
+
+    except HTTPException:
+        raise
+    except ValueError as e:
+        raise HTTPException(
+            status_code=400, detail="Error in calculating percentiles: " + str(e)
+        )
+    except Exception as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+
 @app.post("/count-by-time")
 def count_by_time(data: CountByTimeRequest) -> Dict[str, Dict[str, int]]:
+    segments = disk_segments(data)
+    if segments is not None:
+        return reduce_segments(segments, CountByTimeAccumulator(data.time_format))
+    columns = load_columns(data, [])
     try:
-        counts_by_time: Dict[str, int] = defaultdict(int)
-
-        for event in data.data:
-            timestamp = event.time_object.get("timestamp")
-            if timestamp:
-                if data.time_format == "year":
-                    time_key = str(date.fromisoformat(timestamp.split("T")[0]).year)
-                elif data.time_format == "month":
-                    dt = date.fromisoformat(timestamp.split("T")[0])
-                    time_key = f"{dt.year}-{dt.month:02d}"
-                elif data.time_format == "day":
-                    time_key = timestamp.split("T")[0]
-                else:
-                    raise HTTPException(
-                        status_code=400,
-                        detail="Invalid time_format: Must be 'year', 'month', or 'day'"
-                    )
-                counts_by_time[time_key] += 1
-
-        return {"counts_by_time": dict(counts_by_time)}
+        counts_by_time = count_timestamps(columns, data.time_format)
+
+        return {"counts_by_time": counts_by_time}
 
     except Exception as e:
         raise HTTPException(status_code=400, detail=str(e))
@@ -350,31 +686,21 @@ def count_by_time(data: CountByTimeRequest) -> Dict[str, Dict[str, int]]:
 
 @app.post("/min-max-by-attribute")
 def min_max_by_attribute(data: MinMaxByAttributeRequest) -> Dict[str, str]:
+    columns = load_columns(data, [data.group_by_attribute, data.value_attribute])
     try:
-        grouped_values: Dict[str, List[float]] = {}
-
-        for event in data.data:
-            group_key = event.attribute.get(data.group_by_attribute)
-            value = event.attribute.get(data.value_attribute)
-            if group_key is not None and value is not None:
-                if group_key not in grouped_values:
-                    grouped_values[group_key] = []
-                grouped_values[group_key].append(float(value))
+        grouping, values = GroupBy.from_columns(columns, data.group_by_attribute, data.value_attribute)
 
-        if not grouped_values:
+        if not len(grouping):
             raise HTTPException(
                 status_code=400,
                 detail=f"No valid data found for attributes: {data.group_by_attribute}, {data.value_attribute}"
             )
 
-        avg_values = {
-            group: sum(values) / len(values)
-            for group, values in grouped_values.items()
-        }
+        avg_values = grouping.mean(values)
 
-        # Use a lambda function to extract values for comparison
-        max_key = max(avg_values, key=lambda k: avg_values[k])
-        min_key = min(avg_values, key=lambda k: avg_values[k])
+        # Pick the groups with the highest and lowest averages
+        max_key = str(grouping.groups[np.argmax(avg_values)])
+        min_key = str(grouping.groups[np.argmin(avg_values)])
 
         return {
             "maximum_attribute": max_key,
@@ -385,6 +711,337 @@ def min_max_by_attribute(data: MinMaxByAttributeRequest) -> Dict[str, str]:
         raise HTTPException(status_code=400, detail=str(e))
 
 
+@app.post("/summary")
+def summary(data: SummaryRequest) -> Dict[str, Any]:
+    columns = load_columns(data, [data.value_attribute, *data.group_by_attributes])
+    try:
+        validate_statistics(data.statistics)
+
+        has_value = columns.numeric(data.value_attribute)[1]
+        values = _present_values(columns, data.value_attribute)
+
+        if not values.size:
+            raise HTTPException(
+                status_code=400,
+                detail="No valid values found for the specified attribute.",
+            )
+
+        if "outliers" in data.statistics and len(values) < MIN_OUTLIER_VALUES:
+            raise HTTPException(
+                status_code=400, detail="Not enough data to calculate outliers: At least 4 data points required"
+            )
+
+        if data.approximate:
+            # Sketches replace sorting entirely
+            overall_sketch = data.quantile_sketch(values)
+            overall = summarize(GroupBy.single(len(values)), values, data.statistics, sketch=overall_sketch)[0]
+        else:
+            # Sort the value column once; every breakdown below reuses this order
+            value_order = columns.shared(
+                ("value_order", data.value_attribute), lambda: np.argsort(values, kind="stable")
+            )
+            overall = summarize(GroupBy.single(len(values)), values, data.statistics, value_order)[0]
+
+        groups: Dict[str, Dict[str, Dict[str, Any]]] = {}
+        for attribute in data.group_by_attributes:
+            keep = columns.present(attribute)[has_value]
+            grouping, _ = GroupBy.from_columns(columns, attribute, data.value_attribute)
+
+            if data.approximate:
+                sketch = data.quantile_sketch(values[keep], grouping)
+                group_summaries = summarize(grouping, values[keep], data.statistics, sketch=sketch)
+            else:
+                # Map the value order onto the rows that carry this attribute
+                subset_position = np.cumsum(keep) - 1
+                subset_order = subset_position[value_order[keep[value_order]]]
+                group_summaries = summarize(grouping, values[keep], data.statistics, subset_order)
+            groups[attribute] = dict(zip(grouping.groups.tolist(), group_summaries))
+
+        return {"summary": overall, "groups": groups}
+
+    except Exception as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+
+@app.post("/rolling")
+def rolling(data: RollingRequest) -> Dict[str, Any]:
+    attributes = [data.value_attribute] + ([data.group_by_attribute] if data.group_by_attribute else [])
+    columns = load_columns(data, attributes)
+    try:
+        validate_rolling_statistics(data.statistics)
+
+        dates, has_timestamp = columns.dates()
+        values, has_value = columns.numeric(data.value_attribute)
+        rows = has_timestamp & has_value
+        if not rows.any():
+            raise HTTPException(status_code=400, detail="No events with both a timestamp and a value")
+
+        # One time grid, from the first to the last bucket holding a value, shared by all groups
+        buckets = time_buckets(dates[rows], data.time_bucket)
+        first = int(buckets.min())
+        buckets -= first
+        n_buckets = int(buckets.max()) + 1
+        # A window longer than the grid covers the same buckets as one exactly as long
+        window = min(data.window, n_buckets)
+
+        def statistics(codes: np.ndarray, keep: Any, n_groups: int) -> Dict[str, np.ndarray]:
+            if n_groups * n_buckets > config.ROLLING_MAX_CELLS:
+                raise ValueError(
+                    f"Too many windows ({n_groups} groups x {n_buckets} buckets): use a coarser time_bucket"
+                )
+            return rolling_statistics(
+                codes, buckets[keep], values[rows][keep], (n_groups, n_buckets),
+                window, data.statistics, data.min_periods,
+            )
+
+        overall = statistics(np.zeros(len(buckets), dtype=np.intp), slice(None), 1)
+        result: Dict[str, Any] = {
+            "time_bucket": data.time_bucket,
+            "window": data.window,
+            "periods": bucket_labels(first, n_buckets, data.time_bucket),
+            "rolling": {name: statistic[0] for name, statistic in overall.items()},
+        }
+        if data.group_by_attribute:
+            has_label = columns.present(data.group_by_attribute)
+            keep = has_label[rows]
+            grouping = GroupBy.from_attribute(columns, data.group_by_attribute, rows & has_label)
+            per_group = statistics(grouping.codes, keep, len(grouping))
+            result["groups"] = {
+                group: {name: statistic[code] for name, statistic in per_group.items()}
+                for code, group in enumerate(grouping.groups.tolist())
+            }
+        return result
+
+    except Exception as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+
+# Operations /batch can run, by name, with the request model and handler of their endpoint
+BATCH_OPERATIONS: Dict[str, Tuple[Type[DatasetRequest], Callable[[Any], Any]]] = {
+    "predict": (PredictionRequest, predict),
+    "average-by-attribute": (AggregateByAttributeRequest, average_by_attribute),
+    "median-by-attribute": (MedianByAttributeRequest, median_by_attribute),
+    "highest-value": (RequestBody, highest_value),
+    "lowest-value": (RequestBody, lowest_value),
+    "median-value": (MedianValueRequest, median_value),
+    "predict-future-values": (FutureValuesRequest, predict_future_values),
+    "outliers": (OutliersRequest, outliers),
+    "count-by-time": (CountByTimeRequest, count_by_time),
+    "min-max-by-attribute": (MinMaxByAttributeRequest, min_max_by_attribute),
+    "summary": (SummaryRequest, summary),
+    "rolling": (RollingRequest, rolling),
+}
+
+
+def _operation_attributes(operations: List[BatchOperation]) -> List[str]:
+    # Parameters naming attributes: x_attribute, attribute_name, group_by_attributes, ...
+    names: Dict[str, None] = {}
+    for operation in operations:
+        for key, value in operation.parameters.items():
+            if "attribute" in key:
+                names.update(dict.fromkeys(value if isinstance(value, list) else [value]))
+    return [name for name in names if isinstance(name, str)]
+
+
+def _run_operation(operation: BatchOperation, columns: EventColumns) -> Dict[str, Any]:
+    entry: Dict[str, Any] = {"operation": operation.operation}
+    spec = BATCH_OPERATIONS.get(operation.operation)
+    if spec is None:
+        return {**entry, "status_code": 400,
+                "detail": f"Unknown operation: {operation.operation}. Supported: {', '.join(BATCH_OPERATIONS)}"}
+    if {"data", "dataset_id"} & operation.parameters.keys():
+        return {**entry, "status_code": 400, "detail": "Operations use the batch's dataset; leave out data and dataset_id"}
+
+    model, handler = spec
+    try:
+        request = model.model_validate({**operation.parameters, "data": []})
+    except ValidationError as e:
+        return {**entry, "status_code": 422, "detail": e.errors(include_url=False, include_context=False)}
+    request._columns = columns
+    try:
+        return {**entry, "status_code": 200, "result": handler(request)}
+    except HTTPException as e:
+        return {**entry, "status_code": e.status_code, "detail": e.detail}
+
+
+@app.post("/batch")
+def batch(data: BatchRequest) -> Dict[str, List[Dict[str, Any]]]:
+    # Parse the dataset once; the operations share it along with the timestamps, group
+    # codes and sorted values any of them derive
+    columns = load_columns(data, _operation_attributes(data.operations)).sharing()
+    return {"results": [_run_operation(operation, columns) for operation in data.operations]}
+
+
+@app.post("/datasets")
+def upload_dataset(data: DatasetUpload) -> Dict[str, Any]:
+    dataset_id = data._fingerprint or content_hash(data.data)
+    if data.storage == "disk":
+        return upload_disk_dataset(dataset_id, data)
+
+    # Identical uploads map to the same id; skip parsing when it is already held
+    try:
+        columns = dataset_store.get(dataset_id)
+    except KeyError:
+        # Held datasets are kept compact: typed and dictionary-encoded rather than an object per value
+        columns = data.columns(None).compact()
+        try:
+            dataset_store.put(dataset_id, columns)
+        except DatasetTooLarge as e:
+            raise HTTPException(status_code=413, detail=str(e))
+
+    metrics.record_rows(len(columns))
+    return {"dataset_id": dataset_id, "rows": len(columns), "storage": "memory"}
+
+
+def upload_disk_dataset(dataset_id: str, data: DatasetUpload) -> Dict[str, Any]:
+    store = require_disk_store()
+    if dataset_id not in store:
+        try:
+            store.write(dataset_id, data.columns(None))
+        except ValueError as e:
+            raise HTTPException(status_code=400, detail=str(e))
+    rows = store.rows(dataset_id)
+    metrics.record_rows(rows)
+    return {"dataset_id": dataset_id, "rows": rows, "storage": "disk"}
+
+
+def references_held(params: Dict[str, Any]) -> bool:
+    """Whether the dataset and model a request names by id are still held here.
+
+    A request for a deleted or evicted one must reach its handler for the 404,
+    not be revalidated or answered from the result cache.
+    """
+    dataset_id, model = params.get("dataset_id"), params.get("model_id")
+    if isinstance(dataset_id, str) and dataset_id not in dataset_store:
+        if disk_store is None or dataset_id not in disk_store:
+            return False
+    return not isinstance(model, str) or model_store.get(model) is not None
+
+
+@app.delete("/datasets/{dataset_id}")
+def delete_dataset(dataset_id: str) -> Dict[str, str]:
+    on_disk = disk_store is not None and disk_store.delete(dataset_id)
+    if dataset_store.delete(dataset_id) is None and not on_disk:
+        raise HTTPException(status_code=404, detail=f"Dataset not found: {dataset_id}")
+    # Cached results may have been computed from the deleted dataset
+    result_cache.clear()
+    return {"deleted": dataset_id}
+
+
+# Aggregation sessions that event batches are appended to, by session id
+session_store = SessionStore(max_sessions=config.SESSION_MAX_COUNT, ttl=config.SESSION_TTL)
+
+
+class SessionCreateRequest(BaseModel):
+    value_attribute: str
+    group_by_attribute: Optional[str] = None  # Optional breakdown of every statistic
+    relative_accuracy: float = Field(config.SKETCH_RELATIVE_ACCURACY, gt=0, lt=1)  # For medians and quartiles
+
+
+class SessionAppendRequest(BaseModel):
+    data: EventList  # New events only; earlier batches are already counted
+    batch_id: Optional[str] = None  # Appending the same batch_id again is a no-op, so retries are safe
+
+
+def get_session(session_id: str) -> AggregationSession:
+    try:
+        return session_store.get(session_id)
+    except KeyError:
+        raise HTTPException(status_code=404, detail=f"Session not found: {session_id}")
+
+
+@app.post("/sessions")
+def create_session(data: SessionCreateRequest) -> Dict[str, Any]:
+    session = AggregationSession(data.value_attribute, data.group_by_attribute, data.relative_accuracy)
+    session_store.add(session)
+    return {"session_id": session.id, "attributes": session.attributes}
+
+
+@app.post("/sessions/{session_id}/events")
+def append_session_events(session_id: str, data: SessionAppendRequest) -> Dict[str, Any]:
+    session = get_session(session_id)
+    columns = EventColumns.from_events(data.data, session.attributes)
+    metrics.record_rows(len(columns))
+    try:
+        appended = session.append(columns, data.batch_id)
+    except Exception as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    return {"appended": len(columns) if appended else 0, "events": session.events, "batches": session.batches}
+
+
+@app.get("/sessions/{session_id}")
+def session_summary(session_id: str) -> Dict[str, Any]:
+    return get_session(session_id).summary()
+
+
+@app.get("/sessions/{session_id}/average-by-attribute")
+def session_average_by_attribute(session_id: str) -> Dict[str, Dict[str, float]]:
+    return get_session(session_id).average_values()
+
+
+@app.get("/sessions/{session_id}/count-by-time")
+def session_count_by_time(session_id: str, time_format: str = "year") -> Dict[str, Dict[str, int]]:
+    session = get_session(session_id)
+    try:
+        return session.counts_by_time(time_format)
+    except Exception as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+
+@app.get("/sessions/{session_id}/predict-future-values")
+def session_predict_future_values(session_id: str, time_points: List[int] = Query([])) -> Dict[str, Any]:
+    return get_session(session_id).predicted_values(time_points)
+
+
+@app.delete("/sessions/{session_id}")
+def delete_session(session_id: str) -> Dict[str, str]:
+    if session_store.delete(session_id) is None:
+        raise HTTPException(status_code=404, detail=f"Session not found: {session_id}")
+    return {"deleted": session_id}
+
+
+@app.get("/cache")
+def cache_statistics() -> Dict[str, float]:
+    return result_cache.stats()
+
+
+@app.get("/metrics", response_class=Response)
+def prometheus_metrics() -> Response:
+    return Response(metrics.render(), media_type=metrics.PROMETHEUS_MEDIA_TYPE)
+
+
+def require_admin(authorization: Optional[str] = Header(None)) -> None:
+    if not config.ADMIN_TOKEN:
+        raise HTTPException(status_code=403, detail="Admin endpoints are disabled: set ANALYTICS_ADMIN_TOKEN")
+    if not profiling.authorized(authorization):
+        raise HTTPException(status_code=401, detail="Missing or invalid admin token", headers={"WWW-Authenticate": "Bearer"})
+
+
+@app.get("/admin/profiles", dependencies=[Depends(require_admin)])
+def list_profiles() -> List[Dict[str, Any]]:
+    return profiling.store.list()
+
+
+@app.get("/admin/profiles/{profile_id}", dependencies=[Depends(require_admin)])
+def get_profile(profile_id: str) -> Dict[str, Any]:
+    profile = profiling.store.get(profile_id)
+    if profile is None:
+        raise HTTPException(status_code=404, detail=f"Profile not found: {profile_id}")
+    return {name: value for name, value in profile.items() if name != "pstats"}
+
+
+@app.get("/admin/profiles/{profile_id}/pstats", response_class=Response, dependencies=[Depends(require_admin)])
+def download_profile(profile_id: str) -> Response:
+    profile = profiling.store.get(profile_id)
+    if profile is None or "pstats" not in profile:
+        raise HTTPException(status_code=404, detail=f"cProfile profile not found: {profile_id}")
+    return Response(
+        profile["pstats"],
+        media_type="application/octet-stream",
+        headers={"Content-Disposition": f'attachment; filename="{profile_id}.pstats"'},
+    )
+
+
 @app.get("/")
 def health_check() -> Dict[str, str]:
     return {"status": "healthy", "microservice": "analytics", "updated": "02/04/2025"}
@@ -0,0 +1,266 @@
+"""Prometheus-style request metrics and per-request stage timings.
+
+``MetricsMiddleware`` opens a :class:`RequestTimings` for every HTTP request; code
+serving the request marks its stages with :func:`stage` (a no-op outside a request),
+records its input size with :func:`record_rows`, and the middleware turns both into
+histograms for ``GET /metrics`` and a ``Server-Timing`` response header.
+"""
+import bisect
+import functools
+import threading
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Any, Callable, Dict, Iterator, List, Optional, Sequence, Tuple, TypeVar, Union
+
+from starlette.datastructures import MutableHeaders
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+PROMETHEUS_MEDIA_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+# Stages in the order a request passes through them, used to order Server-Timing
+STAGES = ("parse", "validate", "extract", "compute", "serialize", "compress")
+
+Labels = Tuple[str, ...]
+Function = TypeVar("Function", bound=Callable[..., Any])
+
+
+class Counter:
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str]) -> None:
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._values: Dict[Labels, float] = {}
+        self._lock = threading.Lock()
+
+    def inc(self, labels: Labels, amount: float = 1.0) -> None:
+        with self._lock:
+            self._values[labels] = self._values.get(labels, 0.0) + amount
+
+    def collect(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} counter"]
+        with self._lock:
+            for labels, value in sorted(self._values.items()):
+                lines.append(f"{self.name}{_labels(self.labelnames, labels)} {_number(value)}")
+        return lines
+
+
+class Histogram:
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str], buckets: Sequence[float]) -> None:
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self.buckets = sorted(buckets)
+        # Per label set: count per bucket (the last one is +Inf), and the sum of observations
+        self._counts: Dict[Labels, List[int]] = {}
+        self._sums: Dict[Labels, float] = {}
+        self._lock = threading.Lock()
+
+    def observe(self, labels: Labels, value: float) -> None:
+        with self._lock:
+            counts = self._counts.get(labels)
+            if counts is None:
+                counts = self._counts[labels] = [0] * (len(self.buckets) + 1)
+                self._sums[labels] = 0.0
+            counts[bisect.bisect_left(self.buckets, value)] += 1
+            self._sums[labels] += value
+
+    def collect(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} histogram"]
+        with self._lock:
+            for labels, counts in sorted(self._counts.items()):
+                cumulative = 0
+                for bound, count in zip([*self.buckets, float("inf")], counts):
+                    cumulative += count
+                    bucket_labels = _labels((*self.labelnames, "le"), (*labels, _number(bound)))
+                    lines.append(f"{self.name}_bucket{bucket_labels} {cumulative}")
+                lines.append(f"{self.name}_sum{_labels(self.labelnames, labels)} {_number(self._sums[labels])}")
+                lines.append(f"{self.name}_count{_labels(self.labelnames, labels)} {cumulative}")
+        return lines
+
+
+def _number(value: float) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    return str(int(value)) if float(value).is_integer() else repr(float(value))
+
+
+def _labels(names: Sequence[str], values: Sequence[str]) -> str:
+    if not names:
+        return ""
+    escaped = (value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"') for value in values)
+    return "{" + ",".join(f'{name}="{value}"' for name, value in zip(names, escaped)) + "}"
+
+
+SECONDS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+ROWS = (10, 100, 1000, 10_000, 100_000, 1_000_000, 10_000_000)
+BYTES = (100, 1000, 10_000, 100_000, 1_000_000, 10_000_000, 100_000_000, 1_000_000_000)
+
+REQUESTS = Counter("analytics_requests_total", "HTTP requests handled.", ["method", "route", "status"])
+REQUEST_SECONDS = Histogram(
+    "analytics_request_duration_seconds", "Time to handle a request, until its response was sent.",
+    ["method", "route"], SECONDS,
+)
+STAGE_SECONDS = Histogram(
+    "analytics_stage_duration_seconds", "Time requests spent in each stage (parse, validate, extract, compute, serialize, compress).",
+    ["route", "stage"], SECONDS,
+)
+REQUEST_ROWS = Histogram("analytics_request_rows", "Events in a request's dataset.", ["route"], ROWS)
+REQUEST_BYTES = Histogram("analytics_request_body_bytes", "Request body size as received.", ["route"], BYTES)
+RESPONSE_BYTES = Histogram("analytics_response_body_bytes", "Response body size as sent.", ["route"], BYTES)
+METRICS: List[Union[Counter, Histogram]] = [REQUESTS, REQUEST_SECONDS, STAGE_SECONDS, REQUEST_ROWS, REQUEST_BYTES, RESPONSE_BYTES]
+
+
+def render() -> str:
+    """All metrics in the Prometheus text exposition format."""
+    return "\n".join(line for metric in METRICS for line in metric.collect()) + "\n"
+
+
+class RequestTimings:
+    """Time spent per stage while serving one request.
+
+    Stages nest: entering a stage pauses the enclosing one, so every stage's time is
+    exclusive (``compute`` does not include the ``extract`` it triggers).
+    """
+
+    def __init__(self) -> None:
+        self.started = time.perf_counter()
+        self.stages: Dict[str, float] = {}
+        self.rows: Optional[int] = None
+        self._stack: List[Tuple[str, float]] = []
+
+    def begin(self, name: str) -> None:
+        now = time.perf_counter()
+        if self._stack:
+            self._charge(now)
+        self._stack.append((name, now))
+
+    def end(self, name: str) -> None:
+        """Close stage ``name`` if it is the innermost open one."""
+        if not self._stack or self._stack[-1][0] != name:
+            return
+        now = time.perf_counter()
+        self._charge(now)
+        self._stack.pop()
+        if self._stack:
+            self._stack[-1] = (self._stack[-1][0], now)
+
+    def finish(self) -> float:
+        """Close every open stage; returns the request's total time."""
+        while self._stack:
+            self.end(self._stack[-1][0])
+        return time.perf_counter() - self.started
+
+    def _charge(self, now: float) -> None:
+        name, since = self._stack[-1]
+        self.stages[name] = self.stages.get(name, 0.0) + now - since
+
+    def server_timing(self) -> str:
+        ordered = sorted(self.stages.items(), key=lambda item: STAGES.index(item[0]) if item[0] in STAGES else len(STAGES))
+        entries = [f"{name};dur={seconds * 1000:.3f}" for name, seconds in ordered]
+        return ", ".join([*entries, f"total;dur={(time.perf_counter() - self.started) * 1000:.3f}"])
+
+
+_current: ContextVar[Optional[RequestTimings]] = ContextVar("request_timings", default=None)
+
+
+def current() -> Optional[RequestTimings]:
+    return _current.get()
+
+
+@contextmanager
+def stage(name: str) -> Iterator[None]:
+    """Attribute the time spent in the block to stage ``name`` of the current request."""
+    timings = _current.get()
+    if timings is None:
+        yield
+        return
+    timings.begin(name)
+    try:
+        yield
+    finally:
+        timings.end(name)
+
+
+def timed(name: str) -> Callable[[Function], Function]:
+    """Decorator form of :func:`stage`."""
+
+    def decorate(function: Function) -> Function:
+        @functools.wraps(function)
+        def wrapper(*args: Any, **kwargs: Any) -> Any:
+            with stage(name):
+                return function(*args, **kwargs)
+
+        return wrapper  # type: ignore[return-value]
+
+    return decorate
+
+
+def begin(name: str) -> None:
+    timings = _current.get()
+    if timings is not None:
+        timings.begin(name)
+
+
+def end(name: str) -> None:
+    timings = _current.get()
+    if timings is not None:
+        timings.end(name)
+
+
+def record_rows(rows: int) -> None:
+    timings = _current.get()
+    if timings is not None:
+        timings.rows = rows
+
+
+class MetricsMiddleware:
+    """Record request counts, latencies, stage timings and payload sizes per route.
+
+    Routes are labelled with their path template (``/datasets/{dataset_id}``), and
+    paths that match no route with ``unmatched``. Responses get a ``Server-Timing``
+    header with the stages measured so far and the total.
+    """
+
+    def __init__(self, app: ASGIApp) -> None:
+        self.app = app
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        timings = RequestTimings()
+        token = _current.set(timings)
+        sizes = {"request": 0, "response": 0}
+        status = 500
+
+        async def receive_counted() -> Message:
+            message = await receive()
+            if message["type"] == "http.request":
+                sizes["request"] += len(message.get("body", b""))
+            return message
+
+        async def send_timed(message: Message) -> None:
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+                MutableHeaders(scope=message).append("Server-Timing", timings.server_timing())
+            elif message["type"] == "http.response.body":
+                sizes["response"] += len(message.get("body", b""))
+            await send(message)
+
+        try:
+            await self.app(scope, receive_counted, send_timed)
+        finally:
+            _current.reset(token)
+            seconds = timings.finish()
+            route = getattr(scope.get("route"), "path", "unmatched")
+            REQUESTS.inc((scope["method"], route, str(status)))
+            REQUEST_SECONDS.observe((scope["method"], route), seconds)
+            for name, stage_seconds in timings.stages.items():
+                STAGE_SECONDS.observe((route, name), stage_seconds)
+            if timings.rows is not None:
+                REQUEST_ROWS.observe((route,), timings.rows)
+            REQUEST_BYTES.observe((route,), sizes["request"])
+            RESPONSE_BYTES.observe((route,), sizes["response"])
@@ -0,0 +1,123 @@
+"""Fitted /predict models, cached so they are neither refitted nor retrained on re-upload.
+
+A model's id is a hash of its training data and of the feature and target names, so
+fitting the same data twice finds the cached coefficients, and a client holding the
+id can ask for predictions without sending the training set again.
+"""
+import hashlib
+import json
+import threading
+from collections import OrderedDict
+from typing import Any, Dict, List, Optional, Sequence, Union
+
+import numpy as np
+
+from app.regression import LinearFit, MultiLinearFit
+
+
+class TrainingDigest:
+    """Hash of training columns that may arrive in batches.
+
+    Each column is hashed on its own, so a dataset streamed batch by batch hashes
+    the same as when its columns are hashed whole.
+    """
+
+    def __init__(self, columns: Sequence[np.ndarray] = ()) -> None:
+        self._digests: List[Any] = []
+        if columns:
+            self.update(columns)
+
+    def update(self, columns: Sequence[np.ndarray]) -> None:
+        if not self._digests:
+            self._digests = [hashlib.blake2b(digest_size=16) for _ in columns]
+        for digest, column in zip(self._digests, columns):
+            digest.update(np.ascontiguousarray(column).data)
+
+    def digest(self) -> bytes:
+        return b"".join(digest.digest() for digest in self._digests)
+
+
+def model_id(source: Union[str, Sequence[np.ndarray], TrainingDigest], x: Union[str, List[str]], y_attribute: str) -> str:
+    """Identify a fit of ``y_attribute`` on the feature ``x`` or the list of features ``x``.
+
+    ``source`` is a dataset id, or the training columns themselves (or their
+    :class:`TrainingDigest`) when the events came with the request.
+    """
+    digest = hashlib.blake2b(digest_size=16)
+    digest.update(json.dumps([x, y_attribute]).encode())
+    if isinstance(source, str):
+        digest.update(b"\0dataset\0" + source.encode())
+    else:
+        training = source if isinstance(source, TrainingDigest) else TrainingDigest(source)
+        digest.update(training.digest())
+    return digest.hexdigest()
+
+
+def prediction_points(x_values: Sequence[Any], width: Optional[int]) -> np.ndarray:
+    """The ``(points, features)`` array of ``x_values``: numbers for a one-feature fit
+    (``width`` None), otherwise lists of ``width`` feature values."""
+    if width is None:
+        if any(isinstance(value, list) for value in x_values):
+            raise ValueError("x_values must be numbers when predicting from a single x_attribute")
+        return np.array(x_values, dtype=float).reshape(-1, 1)
+    if any(not isinstance(point, list) or len(point) != width for point in x_values):
+        raise ValueError(f"Each x_values entry must be a list of {width} values, one per x_attributes entry")
+    return np.array(x_values, dtype=float).reshape(-1, width)
+
+
+class FittedModel:
+    """A least-squares fit of ``y_attribute`` on one feature ``x`` or a list of features ``x``."""
+
+    def __init__(self, model_id: str, x: Union[str, List[str]], y_attribute: str, fit: Union[LinearFit, MultiLinearFit]) -> None:
+        self.id = model_id
+        self.x = x
+        self.y_attribute = y_attribute
+        self.fit = fit
+
+    @property
+    def width(self) -> Optional[int]:
+        """Features per prediction point; None for a one-feature fit, whose points are plain numbers."""
+        return None if isinstance(self.x, str) else len(self.x)
+
+    def predict(self, x: np.ndarray) -> np.ndarray:
+        """Predictions at the rows of the ``(points, features)`` array ``x``."""
+        if isinstance(self.fit, LinearFit):
+            return self.fit.predict(x[:, 0])
+        return self.fit.predict(x)
+
+    def statistics(self) -> Dict[str, Any]:
+        if isinstance(self.fit, LinearFit):
+            return self.fit.statistics()
+        return self.fit.statistics(list(self.x))
+
+
+class ModelStore:
+    """Fitted models by id, evicting the least recently used beyond ``max_models``."""
+
+    def __init__(self, max_models: int) -> None:
+        self.max_models = max_models
+        self._models: "OrderedDict[str, FittedModel]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return len(self._models)
+
+    def get(self, model_id: str) -> Optional[FittedModel]:
+        with self._lock:
+            model = self._models.get(model_id)
+            if model is not None:
+                self._models.move_to_end(model_id)
+            return model
+
+    def put(self, model: FittedModel) -> None:
+        if self.max_models <= 0:
+            return
+        with self._lock:
+            self._models[model.id] = model
+            self._models.move_to_end(model.id)
+            while len(self._models) > self.max_models:
+                self._models.popitem(last=False)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._models.clear()
@@ -0,0 +1,161 @@
+import asyncio
+import functools
+import multiprocessing
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from multiprocessing.shared_memory import SharedMemory
+from typing import Any, Callable, Dict, List, NamedTuple, Optional, Tuple
+
+import numpy as np
+from fastapi import HTTPException
+from fastapi.concurrency import run_in_threadpool
+
+from app.columnar import EventColumns
+
+# Returns the request to ship (without its events) and the columns to run it on, or None to run inline
+OffloadPlanner = Callable[[Any], Optional[Tuple[Any, EventColumns]]]
+
+
+class _SharedArray(NamedTuple):
+    name: str
+    dtype: str
+    shape: Tuple[int, ...]
+
+
+class _WorkerHTTPError(Exception):
+    # HTTPException does not survive pickling; carry its fields back instead
+    def __init__(self, status_code: int, detail: Any) -> None:
+        super().__init__(status_code, detail)
+        self.status_code = status_code
+        self.detail = detail
+
+
+def _share(value: Any, segments: List[SharedMemory]) -> Any:
+    # Copy typed arrays into shared memory once; object columns are pickled as usual
+    if isinstance(value, np.ndarray) and value.dtype != object and value.nbytes:
+        segment = SharedMemory(create=True, size=value.nbytes)
+        segments.append(segment)
+        view: np.ndarray = np.ndarray(value.shape, value.dtype, buffer=segment.buf)
+        view[...] = value
+        del view
+        return _SharedArray(segment.name, value.dtype.str, value.shape)
+    if isinstance(value, dict):
+        return {key: _share(item, segments) for key, item in value.items()}
+    if isinstance(value, tuple):
+        return tuple(_share(item, segments) for item in value)
+    return value
+
+
+def _attach(value: Any, segments: List[SharedMemory]) -> Any:
+    if isinstance(value, _SharedArray):
+        segment = SharedMemory(name=value.name)
+        segments.append(segment)
+        array: np.ndarray = np.ndarray(value.shape, np.dtype(value.dtype), buffer=segment.buf)
+        array.flags.writeable = False
+        return array
+    if isinstance(value, dict):
+        return {key: _attach(item, segments) for key, item in value.items()}
+    if isinstance(value, tuple):
+        return tuple(_attach(item, segments) for item in value)
+    return value
+
+
+def _run_in_worker(endpoint: Callable[..., Any], request: Any, state: Dict[str, Any]) -> Any:
+    segments: List[SharedMemory] = []
+    columns = EventColumns.__new__(EventColumns)
+    columns.__dict__.update(_attach(state, segments))
+    request._columns = columns
+    try:
+        return endpoint(data=request)
+    except HTTPException as e:
+        raise _WorkerHTTPError(e.status_code, e.detail)
+    finally:
+        request._columns = None
+        del columns
+        for segment in segments:
+            try:
+                segment.close()
+            except BufferError:
+                # A view outlived the request; the mapping is released when it is collected
+                pass
+
+
+class ProcessOffload:
+    """Runs large analytics requests in a process pool so they cannot hold the server's GIL.
+
+    ``planner`` picks the requests worth shipping and resolves their columns; typed
+    columns travel through shared memory rather than being pickled. At most
+    ``workers + queue_depth`` requests are offloaded at once; beyond that a request
+    waits up to ``queue_timeout`` seconds for a slot and is then refused with a 503.
+    """
+
+    def __init__(self, planner: OffloadPlanner, workers: int, queue_depth: int, queue_timeout: float) -> None:
+        self.planner = planner
+        self.workers = workers
+        self.queue_depth = queue_depth
+        self.queue_timeout = queue_timeout
+        self.in_flight = 0
+        self._pool: Optional[ProcessPoolExecutor] = None
+        self._lock = threading.Lock()
+
+    @property
+    def capacity(self) -> int:
+        return self.workers + self.queue_depth
+
+    def _get_pool(self) -> ProcessPoolExecutor:
+        # Started on first use so imports and small deployments never pay for it
+        with self._lock:
+            if self._pool is None:
+                self._pool = ProcessPoolExecutor(self.workers, mp_context=multiprocessing.get_context("spawn"))
+            return self._pool
+
+    def shutdown(self) -> None:
+        with self._lock:
+            if self._pool is not None:
+                self._pool.shutdown(cancel_futures=True)
+                self._pool = None
+
+    async def _acquire(self) -> None:
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + self.queue_timeout
+        while self.in_flight >= self.capacity:
+            if loop.time() >= deadline:
+                raise HTTPException(
+                    status_code=503,
+                    detail="Server busy: too many large requests in progress",
+                    headers={"Retry-After": str(max(1, round(self.queue_timeout)))},
+                )
+            await asyncio.sleep(0.01)
+        self.in_flight += 1
+
+    async def run(self, endpoint: Callable[..., Any], request: Any, columns: EventColumns) -> Any:
+        await self._acquire()
+        segments: List[SharedMemory] = []
+        try:
+            state = await run_in_threadpool(_share, vars(columns), segments)
+            future = self._get_pool().submit(_run_in_worker, endpoint, request, state)
+            return await asyncio.wrap_future(future)
+        except _WorkerHTTPError as e:
+            raise HTTPException(status_code=e.status_code, detail=e.detail)
+        except BrokenProcessPool:
+            # A worker died (e.g. out of memory); start a fresh pool for the next request
+            self.shutdown()
+            raise HTTPException(status_code=503, detail="Worker process failed while handling the request")
+        finally:
+            self.in_flight -= 1
+            for segment in segments:
+                segment.close()
+                segment.unlink()
+
+    def wrap(self, endpoint: Callable[..., Any]) -> Callable[..., Any]:
+        """Turn a ``def endpoint(data)`` handler into one that offloads large requests."""
+
+        @functools.wraps(endpoint)
+        async def dispatch(data: Any) -> Any:
+            plan = await run_in_threadpool(self.planner, data) if self.workers > 0 else None
+            if plan is None:
+                return await run_in_threadpool(endpoint, data=data)
+            return await self.run(endpoint, *plan)
+
+        return dispatch
@@ -0,0 +1,57 @@
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Dict, List, Optional, Sequence, TypeVar
+
+import numpy as np
+
+from app import config
+
+Item = TypeVar("Item")
+Result = TypeVar("Result")
+
+# One thread pool per worker count; numpy releases the GIL inside the chunk kernels
+_pools: Dict[int, ThreadPoolExecutor] = {}
+_pools_lock = threading.Lock()
+
+
+def workers_for(rows: int) -> int:
+    """Threads a computation over ``rows`` rows should be split across; 1 means serial."""
+    if rows < config.PARALLEL_MIN_ROWS:
+        return 1
+    return max(1, config.PARALLEL_WORKERS)
+
+
+def map_parallel(function: Callable[[Item], Result], items: Sequence[Item], workers: int) -> List[Result]:
+    if workers <= 1 or len(items) <= 1:
+        return [function(item) for item in items]
+    with _pools_lock:
+        pool = _pools.get(workers)
+        if pool is None:
+            pool = _pools[workers] = ThreadPoolExecutor(workers, thread_name_prefix="analytics-parallel")
+    return list(pool.map(function, items))
+
+
+def chunk_slices(rows: int, parts: int) -> List[slice]:
+    bounds = np.linspace(0, rows, max(1, parts) + 1).astype(np.int64)
+    return [slice(int(start), int(stop)) for start, stop in zip(bounds[:-1], bounds[1:])]
+
+
+def map_chunks(function: Callable[[slice], Result], rows: int, workers: int) -> List[Result]:
+    """Apply ``function`` to ``workers`` contiguous row ranges concurrently."""
+    return map_parallel(function, chunk_slices(rows, workers), workers)
+
+
+def bincount(
+    codes: np.ndarray, weights: Optional[np.ndarray] = None, minlength: int = 0, workers: int = 1
+) -> np.ndarray:
+    """``np.bincount`` computed as per-chunk partial counts that are then added up."""
+    if workers <= 1:
+        return np.bincount(codes, weights=weights, minlength=minlength)
+    length = max(minlength, int(codes.max()) + 1 if len(codes) else 0)
+    partials = map_chunks(
+        lambda rows: np.bincount(codes[rows], weights=None if weights is None else weights[rows], minlength=length),
+        len(codes),
+        workers,
+    )
+    total: np.ndarray = np.sum(partials, axis=0)
+    return total
@@ -0,0 +1,239 @@
+"""Opt-in profiles of individual requests.
+
+A request is profiled when it sends ``X-Profile`` (``cprofile``, ``sample`` or ``1``
+for the default mode) and ``ANALYTICS_PROFILE_ALLOW_HEADER`` allows it, or is picked
+at random at ``ANALYTICS_PROFILE_SAMPLE_RATE``. The handler then runs under cProfile,
+or under a sampler that records the handler thread's stack every few milliseconds,
+while tracemalloc traces allocations. tracemalloc is process-wide, so the peak and
+allocations of a profile include those of requests running concurrently with it. The
+result is kept in a bounded in-memory ring. Requests that are not profiled only pay
+for a header lookup.
+"""
+import hmac
+import cProfile
+import io
+import marshal
+import pstats
+import random
+import sys
+import threading
+import time
+import tracemalloc
+import uuid
+from collections import Counter, deque
+from contextvars import ContextVar
+from datetime import datetime, timezone
+from typing import Any, Callable, Deque, Dict, List, Optional, Tuple
+
+from starlette.datastructures import Headers, MutableHeaders
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+from app import config
+
+PROFILE_HEADER = "x-profile"
+PROFILE_MODES = ("cprofile", "sample")
+
+# Seconds between stack samples, and how many functions and allocation sites a report lists
+SAMPLE_INTERVAL = 0.002
+REPORT_LINES = 30
+
+
+class ProfileSession:
+    """Profiler state for one request; :meth:`run` calls the handler under it."""
+
+    def __init__(self, mode: str, trigger: str, method: str, path: str) -> None:
+        self.id = uuid.uuid4().hex[:16]
+        self.mode = mode
+        self.trigger = trigger
+        self.method = method
+        self.path = path
+        self.started_at = datetime.now(timezone.utc)
+        self.started = time.perf_counter()
+        self.profiler: Optional[cProfile.Profile] = None
+        self.samples: Counter[str] = Counter()
+        self.snapshot: Optional[tracemalloc.Snapshot] = None
+        self.peak_bytes = 0
+        self._owns_tracemalloc = False
+
+    def start_tracing(self) -> None:
+        if not tracemalloc.is_tracing():
+            tracemalloc.start()
+            self._owns_tracemalloc = True
+        tracemalloc.reset_peak()
+
+    def stop_tracing(self) -> None:
+        if tracemalloc.is_tracing():
+            self.snapshot = tracemalloc.take_snapshot()
+            self.peak_bytes = tracemalloc.get_traced_memory()[1]
+        if self._owns_tracemalloc:
+            tracemalloc.stop()
+
+    def run(self, function: Callable[..., Any], *args: Any, **kwargs: Any) -> Any:
+        """Call ``function`` on this thread under the session's profiler."""
+        if self.mode == "sample":
+            stop = threading.Event()
+            sampler = threading.Thread(
+                target=self._sample, args=(threading.get_ident(), stop), name="analytics-profile-sampler", daemon=True
+            )
+            sampler.start()
+            try:
+                return function(*args, **kwargs)
+            finally:
+                stop.set()
+                sampler.join()
+
+        self.profiler = cProfile.Profile()
+        self.profiler.enable()
+        try:
+            return function(*args, **kwargs)
+        finally:
+            self.profiler.disable()
+
+    def _sample(self, thread_id: int, stop: threading.Event) -> None:
+        while not stop.wait(SAMPLE_INTERVAL):
+            frame = sys._current_frames().get(thread_id)
+            stack = []
+            # Walk up to (not including) run(), so stacks start at the handler
+            while frame is not None and frame.f_code is not ProfileSession.run.__code__:
+                code = frame.f_code
+                stack.append(f"{code.co_name} ({code.co_filename}:{frame.f_lineno})")
+                frame = frame.f_back
+            # Once stop is set the handler has returned and the thread is waiting on join()
+            if stack and not stop.is_set():
+                # Collapsed stacks, root first, as flame graph tools read them
+                self.samples[";".join(reversed(stack))] += 1
+
+    def finish(self, status: int) -> Dict[str, Any]:
+        record: Dict[str, Any] = {
+            "id": self.id,
+            "method": self.method,
+            "path": self.path,
+            "status": status,
+            "mode": self.mode,
+            "trigger": self.trigger,
+            "started_at": self.started_at.isoformat(timespec="milliseconds"),
+            "duration_ms": (time.perf_counter() - self.started) * 1000,
+            "peak_traced_bytes": self.peak_bytes,
+            "allocations": [],
+        }
+        if self.snapshot is not None:
+            statistics = self.snapshot.filter_traces(
+                [tracemalloc.Filter(False, tracemalloc.__file__), tracemalloc.Filter(False, __file__)]
+            )
+            record["allocations"] = [
+                {"location": str(statistic.traceback), "bytes": statistic.size, "count": statistic.count}
+                for statistic in statistics.statistics("lineno")[:REPORT_LINES]
+            ]
+        if self.profiler is not None:
+            report = io.StringIO()
+            stats = pstats.Stats(self.profiler, stream=report)
+            stats.sort_stats("cumulative").print_stats(REPORT_LINES)
+            record["report"] = report.getvalue()
+            # The format pstats.Stats.dump_stats writes, for snakeviz and friends
+            record["pstats"] = marshal.dumps(stats.stats)  # type: ignore[attr-defined]
+        else:
+            record["samples"] = sum(self.samples.values())
+            record["stacks"] = [f"{stack} {count}" for stack, count in self.samples.most_common()]
+        return record
+
+
+class ProfileStore:
+    """Ring of the most recent profiles."""
+
+    def __init__(self, size: int) -> None:
+        self._profiles: Deque[Dict[str, Any]] = deque(maxlen=max(1, size))
+        self._lock = threading.Lock()
+
+    def add(self, profile: Dict[str, Any]) -> None:
+        with self._lock:
+            self._profiles.append(profile)
+
+    def get(self, profile_id: str) -> Optional[Dict[str, Any]]:
+        with self._lock:
+            return next((profile for profile in self._profiles if profile["id"] == profile_id), None)
+
+    def list(self) -> List[Dict[str, Any]]:
+        """Summaries, newest first."""
+        summary_fields = ("id", "method", "path", "status", "mode", "trigger", "started_at", "duration_ms", "peak_traced_bytes")
+        with self._lock:
+            return [{name: profile[name] for name in summary_fields} for profile in reversed(self._profiles)]
+
+    def clear(self) -> None:
+        with self._lock:
+            self._profiles.clear()
+
+
+store = ProfileStore(config.PROFILE_RING_SIZE)
+
+_current: ContextVar[Optional[ProfileSession]] = ContextVar("profile_session", default=None)
+# tracemalloc and the profilers are process-wide, so one request is profiled at a time
+_busy = threading.Lock()
+
+
+def current() -> Optional[ProfileSession]:
+    return _current.get()
+
+
+def authorized(authorization: Optional[str]) -> bool:
+    """Whether an ``Authorization`` header carries the configured admin bearer token."""
+    if not config.ADMIN_TOKEN or authorization is None:
+        return False
+    scheme, _, token = authorization.partition(" ")
+    return scheme.lower() == "bearer" and hmac.compare_digest(token.strip().encode(), config.ADMIN_TOKEN.encode())
+
+
+def requested_mode(headers: Headers) -> Optional[Tuple[str, str]]:
+    """The profiling mode asked for by ``X-Profile``, or picked by sampling; None when off."""
+    requested = headers.get(PROFILE_HEADER)
+    allowed = config.PROFILE_ALLOW_HEADER and (not config.ADMIN_TOKEN or authorized(headers.get("authorization")))
+    if requested is not None and allowed:
+        requested = requested.strip().lower()
+        if requested in PROFILE_MODES:
+            return requested, "header"
+        if requested in ("1", "true", "yes"):
+            return config.PROFILE_MODE, "header"
+    if config.PROFILE_SAMPLE_RATE > 0 and random.random() < config.PROFILE_SAMPLE_RATE:
+        return config.PROFILE_MODE, "sampled"
+    return None
+
+
+class ProfilingMiddleware:
+    """Profile requests that ask for it (or are sampled) and store the result.
+
+    A profiled response carries ``X-Profile-Id``; the profile is then available from
+    ``GET /admin/profiles/{id}``. While another request is being profiled, new
+    requests run unprofiled.
+    """
+
+    def __init__(self, app: ASGIApp) -> None:
+        self.app = app
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        requested = requested_mode(Headers(scope=scope))
+        if requested is None or not _busy.acquire(blocking=False):
+            await self.app(scope, receive, send)
+            return
+
+        mode, trigger = requested
+        session = ProfileSession(mode, trigger, scope["method"], scope["path"])
+        token = _current.set(session)
+        status = 500
+
+        async def send_with_id(message: Message) -> None:
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+                MutableHeaders(scope=message).append("X-Profile-Id", session.id)
+            await send(message)
+
+        try:
+            session.start_tracing()
+            await self.app(scope, receive, send_with_id)
+        finally:
+            _current.reset(token)
+            session.stop_tracing()
+            _busy.release()
+            store.add(session.finish(status))
@@ -0,0 +1,316 @@
+import math
+from typing import Any, Dict, List, Optional, Tuple
+
+import numpy as np
+
+
+class LinearFit:
+    """Mergeable sufficient statistics for a one-feature least-squares line.
+
+    Keeps the count, means and centered second moments (equivalent to n, Σx, Σy,
+    Σx², Σxy, Σy²), combined across batches with Chan's parallel update so large
+    offsets such as years and prices stay accurate. The fit is closed form.
+    """
+
+    def __init__(self) -> None:
+        self.n = 0
+        self.mean_x = 0.0
+        self.mean_y = 0.0
+        self.sxx = 0.0
+        self.syy = 0.0
+        self.sxy = 0.0
+
+    @classmethod
+    def from_arrays(cls, x: np.ndarray, y: np.ndarray, chunk_size: int = 1_000_000) -> "LinearFit":
+        fit = cls()
+        for start in range(0, len(x), chunk_size):
+            fit.update(x[start:start + chunk_size], y[start:start + chunk_size])
+        return fit
+
+    def update(self, x: np.ndarray, y: np.ndarray) -> "LinearFit":
+        if len(x):
+            batch = LinearFit()
+            batch.n = len(x)
+            batch.mean_x = float(x.mean())
+            batch.mean_y = float(y.mean())
+            dx = x - batch.mean_x
+            dy = y - batch.mean_y
+            batch.sxx = float(dx @ dx)
+            batch.syy = float(dy @ dy)
+            batch.sxy = float(dx @ dy)
+            self.merge(batch)
+        return self
+
+    def merge(self, other: "LinearFit") -> "LinearFit":
+        if not other.n:
+            return self
+        n = self.n + other.n
+        dx = other.mean_x - self.mean_x
+        dy = other.mean_y - self.mean_y
+        weight = self.n * other.n / n
+        self.sxx += other.sxx + dx * dx * weight
+        self.syy += other.syy + dy * dy * weight
+        self.sxy += other.sxy + dx * dy * weight
+        self.mean_x += dx * other.n / n
+        self.mean_y += dy * other.n / n
+        self.n = n
+        return self
+
+    @property
+    def slope(self) -> float:
+        # A constant feature carries no trend; predict the mean like LinearRegression does
+        return self.sxy / self.sxx if self.sxx > 0 else 0.0
+
+    @property
+    def intercept(self) -> float:
+        return self.mean_y - self.slope * self.mean_x
+
+    def predict(self, x: np.ndarray) -> np.ndarray:
+        predictions: np.ndarray = self.intercept + self.slope * np.asarray(x, dtype=float)
+        return predictions
+
+    @property
+    def r_squared(self) -> float:
+        if self.syy <= 0:
+            # A constant target is fitted exactly
+            return 1.0
+        if self.sxx <= 0:
+            return 0.0
+        return min(1.0, self.sxy * self.sxy / (self.sxx * self.syy))
+
+    @property
+    def residual_variance(self) -> Optional[float]:
+        if self.n <= 2:
+            return None
+        residual_sum_of_squares = max(self.syy - self.slope * self.sxy, 0.0)
+        return residual_sum_of_squares / (self.n - 2)
+
+    def standard_errors(self) -> Dict[str, Optional[float]]:
+        variance = self.residual_variance
+        if variance is None or self.sxx <= 0:
+            return {"slope_stderr": None, "intercept_stderr": None}
+        return {
+            "slope_stderr": math.sqrt(variance / self.sxx),
+            "intercept_stderr": math.sqrt(variance * (1 / self.n + self.mean_x ** 2 / self.sxx)),
+        }
+
+    def statistics(self) -> Dict[str, Optional[float]]:
+        return {
+            "n": self.n,
+            "slope": self.slope,
+            "intercept": self.intercept,
+            "r_squared": self.r_squared,
+            **self.standard_errors(),
+        }
+
+
+class GroupedLinearFit:
+    """:class:`LinearFit` for many groups at once, as arrays indexed by group code.
+
+    Every group's sufficient statistics come from segment sums (``np.bincount``) over
+    the group codes, so fitting thousands of groups costs a few passes over the data
+    rather than a Python loop per group. Batches merge with the same parallel update.
+    """
+
+    def __init__(self, n_groups: int = 0) -> None:
+        self.n: np.ndarray = np.zeros(0, dtype=np.int64)
+        self.mean_x: np.ndarray = np.zeros(0)
+        self.mean_y: np.ndarray = np.zeros(0)
+        self.sxx: np.ndarray = np.zeros(0)
+        self.syy: np.ndarray = np.zeros(0)
+        self.sxy: np.ndarray = np.zeros(0)
+        self._grow(n_groups)
+
+    def __len__(self) -> int:
+        return len(self.n)
+
+    def _grow(self, n_groups: int) -> None:
+        extra = n_groups - len(self.n)
+        if extra > 0:
+            self.n = np.concatenate((self.n, np.zeros(extra, dtype=np.int64)))
+            for name in ("mean_x", "mean_y", "sxx", "syy", "sxy"):
+                setattr(self, name, np.concatenate((getattr(self, name), np.zeros(extra))))
+
+    @classmethod
+    def from_arrays(cls, codes: np.ndarray, x: np.ndarray, y: np.ndarray, n_groups: int) -> "GroupedLinearFit":
+        return cls(n_groups).update(codes, x, y, n_groups)
+
+    def update(self, codes: np.ndarray, x: np.ndarray, y: np.ndarray, n_groups: int) -> "GroupedLinearFit":
+        """Add points ``(x, y)`` to the groups ``codes`` in ``range(n_groups)``."""
+        batch = GroupedLinearFit(n_groups)
+        batch.n = np.bincount(codes, minlength=n_groups)
+        filled = batch.n > 0
+        batch.mean_x = np.divide(np.bincount(codes, x, n_groups), batch.n, out=np.zeros(n_groups), where=filled)
+        batch.mean_y = np.divide(np.bincount(codes, y, n_groups), batch.n, out=np.zeros(n_groups), where=filled)
+        dx = x - batch.mean_x[codes]
+        dy = y - batch.mean_y[codes]
+        batch.sxx = np.bincount(codes, dx * dx, n_groups)
+        batch.syy = np.bincount(codes, dy * dy, n_groups)
+        batch.sxy = np.bincount(codes, dx * dy, n_groups)
+        return self.merge(batch)
+
+    def merge(self, other: "GroupedLinearFit") -> "GroupedLinearFit":
+        """Fold in ``other``, whose group codes match this fit's."""
+        self._grow(len(other))
+        size = len(other)
+        n = self.n[:size] + other.n
+        dx = other.mean_x - self.mean_x[:size]
+        dy = other.mean_y - self.mean_y[:size]
+        weight = np.divide(self.n[:size] * other.n, n, out=np.zeros(size), where=n > 0)
+        share = np.divide(other.n, n, out=np.zeros(size), where=n > 0)
+        self.sxx[:size] += other.sxx + dx * dx * weight
+        self.syy[:size] += other.syy + dy * dy * weight
+        self.sxy[:size] += other.sxy + dx * dy * weight
+        self.mean_x[:size] += dx * share
+        self.mean_y[:size] += dy * share
+        self.n[:size] = n
+        return self
+
+    @property
+    def slope(self) -> np.ndarray:
+        # As in LinearFit, a constant feature has no trend and predicts the mean
+        slope: np.ndarray = np.divide(self.sxy, self.sxx, out=np.zeros(len(self)), where=self.sxx > 0)
+        return slope
+
+    @property
+    def intercept(self) -> np.ndarray:
+        intercept: np.ndarray = self.mean_y - self.slope * self.mean_x
+        return intercept
+
+    def predict(self, x: np.ndarray) -> np.ndarray:
+        """Predictions of every group (rows) at every ``x`` (columns)."""
+        predictions: np.ndarray = self.intercept[:, None] + np.outer(self.slope, np.asarray(x, dtype=float))
+        return predictions
+
+    @property
+    def r_squared(self) -> np.ndarray:
+        explained = np.divide(
+            self.sxy * self.sxy, self.sxx * self.syy, out=np.zeros(len(self)), where=(self.sxx > 0) & (self.syy > 0)
+        )
+        r_squared: np.ndarray = np.where(self.syy <= 0, 1.0, np.minimum(explained, 1.0))
+        return r_squared
+
+    def standard_errors(self) -> Dict[str, np.ndarray]:
+        """Standard errors per group; NaN where LinearFit would report None."""
+        valid = (self.n > 2) & (self.sxx > 0)
+        residual = np.maximum(self.syy - self.slope * self.sxy, 0.0)
+        variance = np.divide(residual, self.n - 2, out=np.full(len(self), np.nan), where=valid)
+        sxx = np.where(valid, self.sxx, 1.0)
+        return {
+            "slope_stderr": np.sqrt(variance / sxx),
+            "intercept_stderr": np.sqrt(variance * (1 / np.maximum(self.n, 1) + self.mean_x ** 2 / sxx)),
+        }
+
+    def statistics(self) -> List[Dict[str, Optional[float]]]:
+        """One :meth:`LinearFit.statistics`-shaped dict per group."""
+        columns = {
+            "n": self.n.tolist(),
+            "slope": self.slope.tolist(),
+            "intercept": self.intercept.tolist(),
+            "r_squared": self.r_squared.tolist(),
+            **{name: [None if math.isnan(value) else value for value in errors.tolist()]
+               for name, errors in self.standard_errors().items()},
+        }
+        return [{name: values[index] for name, values in columns.items()} for index in range(len(self))]
+
+
+class MultiLinearFit:
+    """Mergeable sufficient statistics for least squares on several features.
+
+    The multivariate counterpart of :class:`LinearFit`: the count, the means of the
+    features and the target, and their centered cross-product matrix, merged across
+    batches with the same parallel update. The coefficients solve the centered normal
+    equations; collinear or constant features get the minimum-norm solution.
+    """
+
+    def __init__(self, n_features: int) -> None:
+        self.n = 0
+        # The target is the last entry of the means and the last row and column of the cross-products
+        self.means = np.zeros(n_features + 1)
+        self.comoments = np.zeros((n_features + 1, n_features + 1))
+
+    @property
+    def n_features(self) -> int:
+        return len(self.means) - 1
+
+    @classmethod
+    def from_arrays(cls, x: np.ndarray, y: np.ndarray, chunk_size: int = 1_000_000) -> "MultiLinearFit":
+        """Fit ``y`` on the columns of the ``(points, features)`` array ``x``."""
+        fit = cls(x.shape[1])
+        for start in range(0, len(x), chunk_size):
+            fit.update(x[start:start + chunk_size], y[start:start + chunk_size])
+        return fit
+
+    def update(self, x: np.ndarray, y: np.ndarray) -> "MultiLinearFit":
+        if len(x):
+            batch = MultiLinearFit(self.n_features)
+            batch.n = len(x)
+            points = np.column_stack((x, y))
+            batch.means = points.mean(axis=0)
+            points -= batch.means
+            batch.comoments = points.T @ points
+            self.merge(batch)
+        return self
+
+    def merge(self, other: "MultiLinearFit") -> "MultiLinearFit":
+        if not other.n:
+            return self
+        n = self.n + other.n
+        delta = other.means - self.means
+        self.comoments += other.comoments + np.outer(delta, delta) * (self.n * other.n / n)
+        self.means += delta * (other.n / n)
+        self.n = n
+        return self
+
+    def _solve(self) -> Tuple[np.ndarray, int]:
+        k = self.n_features
+        coefficients, _, rank, _ = np.linalg.lstsq(self.comoments[:k, :k], self.comoments[:k, k], rcond=None)
+        return coefficients, int(rank)
+
+    @property
+    def coefficients(self) -> np.ndarray:
+        return self._solve()[0]
+
+    @property
+    def intercept(self) -> float:
+        return float(self.means[-1] - self.means[:-1] @ self.coefficients)
+
+    def predict(self, x: np.ndarray) -> np.ndarray:
+        """Predictions at the rows of the ``(points, features)`` array ``x``."""
+        predictions: np.ndarray = self.intercept + np.asarray(x, dtype=float) @ self.coefficients
+        return predictions
+
+    @property
+    def r_squared(self) -> float:
+        syy = float(self.comoments[-1, -1])
+        if syy <= 0:
+            return 1.0
+        explained = float(self.coefficients @ self.comoments[:-1, -1])
+        return min(1.0, max(0.0, explained / syy))
+
+    def standard_errors(self) -> Dict[str, Any]:
+        """Standard errors of the intercept and each coefficient; None when the features are not independent."""
+        k = self.n_features
+        coefficients, rank = self._solve()
+        if self.n <= k + 1 or rank < k:
+            return {"intercept_stderr": None, "coefficient_stderrs": [None] * k}
+        residual_sum_of_squares = max(self.comoments[-1, -1] - float(coefficients @ self.comoments[:k, k]), 0.0)
+        variance = residual_sum_of_squares / (self.n - k - 1)
+        inverse = np.linalg.inv(self.comoments[:k, :k])
+        mean_x = self.means[:k]
+        return {
+            "intercept_stderr": math.sqrt(variance * (1 / self.n + max(float(mean_x @ inverse @ mean_x), 0.0))),
+            "coefficient_stderrs": np.sqrt(variance * np.maximum(np.diag(inverse), 0.0)).tolist(),
+        }
+
+    def statistics(self, feature_names: List[str]) -> Dict[str, Any]:
+        """Fit statistics, with coefficients and their standard errors keyed by feature name."""
+        errors = self.standard_errors()
+        return {
+            "n": self.n,
+            "intercept": self.intercept,
+            "coefficients": dict(zip(feature_names, self.coefficients.tolist())),
+            "r_squared": self.r_squared,
+            "intercept_stderr": errors["intercept_stderr"],
+            "coefficient_stderrs": dict(zip(feature_names, errors["coefficient_stderrs"])),
+        }
@@ -0,0 +1,53 @@
+import json
+import math
+from typing import Any
+
+import numpy as np
+from fastapi.responses import JSONResponse
+
+
+def _fallback(value: Any) -> Any:
+    # Arrays orjson cannot write natively (non-contiguous, object dtype) and NumPy scalars
+    if isinstance(value, np.ndarray):
+        return value.tolist()
+    if isinstance(value, np.generic):
+        return value.item()
+    raise TypeError(f"Type is not JSON serializable: {type(value).__name__}")
+
+
+def _finite(value: Any) -> Any:
+    # The standard library writes non-finite floats as bare NaN/Infinity, where orjson writes null
+    if isinstance(value, float):
+        return value if math.isfinite(value) else None
+    if isinstance(value, (np.ndarray, np.generic)):
+        return _finite(value.tolist())
+    if isinstance(value, dict):
+        return {key: _finite(item) for key, item in value.items()}
+    if isinstance(value, (list, tuple)):
+        return [_finite(item) for item in value]
+    return value
+
+
+def dumps(content: Any) -> bytes:
+    """Serialize ``content`` to JSON, writing NumPy arrays and scalars without ``.tolist()``.
+
+    Non-string dict keys (such as the time points of ``predict_future_values``) become
+    strings and NaN or infinity becomes ``null``. Without orjson installed the standard library
+    encoder is used instead.
+    """
+    try:
+        import orjson
+    except ImportError:
+        return json.dumps(_finite(content), default=_fallback, ensure_ascii=False, separators=(",", ":")).encode()
+    return orjson.dumps(content, default=_fallback, option=orjson.OPT_SERIALIZE_NUMPY | orjson.OPT_NON_STR_KEYS)
+
+
+class FastJSONResponse(JSONResponse):
+    """JSON response rendered with :func:`dumps`.
+
+    Analytics handlers return it directly, which also skips FastAPI's validation and
+    re-encoding of the returned value against the handler's return annotation.
+    """
+
+    def render(self, content: Any) -> bytes:
+        return dumps(content)
@@ -0,0 +1,187 @@
+"""Rolling statistics over a regular time grid.
+
+Events are resampled onto day, week (starting Monday), month or year buckets, and
+every statistic is computed for the trailing window of ``window`` buckets ending at
+each bucket, for all groups at once:
+
+* counts and sums from prefix sums, so each window costs O(1);
+* minima and maxima with the van Herk/Gil-Werman algorithm, O(1) per window
+  whatever its length;
+* quantiles by sorting each window's values once, after collapsing repeated
+  ``(group, bucket, value)`` triples into weights, a span of buckets at a time.
+"""
+from typing import Dict, List, Sequence
+
+import numpy as np
+
+from app.summary import PERCENTILE_STATISTIC
+
+ROLLING_STATISTICS = ("count", "sum", "mean", "min", "max", "median")
+TIME_BUCKETS = ("day", "week", "month", "year")
+_UNITS = {"day": "D", "month": "M", "year": "Y"}
+
+# Rows expanded at once when computing rolling quantiles, bounding their memory
+QUANTILE_CHUNK_ROWS = 4_000_000
+
+
+def _quantile_level(name: str) -> float:
+    if name == "median":
+        return 0.5
+    match = PERCENTILE_STATISTIC.fullmatch(name)
+    if match is None or float(match.group(1)) > 100:
+        raise ValueError(
+            f"Unknown statistics: {name}. Supported: {', '.join(ROLLING_STATISTICS)}, or a percentile such as p90"
+        )
+    return float(match.group(1)) / 100
+
+
+def validate_rolling_statistics(statistics: Sequence[str]) -> None:
+    for name in statistics:
+        if name not in ROLLING_STATISTICS:
+            _quantile_level(name)
+
+
+def time_buckets(dates: np.ndarray, time_bucket: str) -> np.ndarray:
+    """Number every ``datetime64`` date by its bucket; consecutive buckets get consecutive numbers."""
+    if time_bucket == "week":
+        # 1970-01-01 was a Thursday; shifting by three days makes weeks start on Monday
+        buckets: np.ndarray = (dates.astype("datetime64[D]").astype(np.int64) + 3) // 7
+        return buckets
+    if time_bucket not in TIME_BUCKETS:
+        raise ValueError("Invalid time_bucket: Must be 'day', 'week', 'month', or 'year'")
+    buckets = dates.astype(f"datetime64[{_UNITS[time_bucket]}]").astype(np.int64)
+    return buckets
+
+
+def bucket_labels(first: int, count: int, time_bucket: str) -> List[str]:
+    """ISO labels of ``count`` buckets from bucket number ``first``; weeks are labelled by their Monday."""
+    numbers = np.arange(first, first + count)
+    if time_bucket == "week":
+        starts = (numbers * 7 - 3).astype("datetime64[D]")
+    else:
+        starts = numbers.astype(f"datetime64[{_UNITS[time_bucket]}]")
+    labels: List[str] = np.datetime_as_string(starts).tolist()
+    return labels
+
+
+def _rolling_sum(grid: np.ndarray, window: int) -> np.ndarray:
+    # Window totals as differences of prefix sums along the time axis
+    cumulative = np.zeros((grid.shape[0], grid.shape[1] + 1), dtype=grid.dtype)
+    np.cumsum(grid, axis=1, out=cumulative[:, 1:])
+    starts = np.maximum(np.arange(grid.shape[1]) + 1 - window, 0)
+    totals: np.ndarray = cumulative[:, 1:] - cumulative[:, starts]
+    return totals
+
+
+def _rolling_extreme(grid: np.ndarray, window: int, ufunc: np.ufunc, identity: float) -> np.ndarray:
+    """Trailing-window minimum or maximum along the time axis (van Herk/Gil-Werman)."""
+    n_groups, n_buckets = grid.shape
+    blocks = -(-(n_buckets + window - 1) // window)
+    padded = np.full((n_groups, blocks * window), identity)
+    padded[:, window - 1:window - 1 + n_buckets] = grid
+    # Running extremes from the start and from the end of every block of ``window`` buckets
+    shaped = padded.reshape(n_groups, blocks, window)
+    prefix = ufunc.accumulate(shaped, axis=2).reshape(n_groups, -1)
+    suffix = ufunc.accumulate(shaped[:, :, ::-1], axis=2)[:, :, ::-1].reshape(n_groups, -1)
+    # The window starting at padded index i spans the end of i's block and the start of the next
+    result: np.ndarray = ufunc(suffix[:, :n_buckets], prefix[:, window - 1:window - 1 + n_buckets])
+    return result
+
+
+def _rolling_quantiles(
+    codes: np.ndarray, buckets: np.ndarray, values: np.ndarray, shape: tuple, window: int, levels: Sequence[float]
+) -> Dict[float, np.ndarray]:
+    n_groups, n_buckets = shape
+    results = {q: np.full(shape, np.nan) for q in levels}
+    if not len(values):
+        return results
+
+    # Order by group and value, so entry numbers sort like values within each group, and
+    # keep repeated values within a (group, bucket) cell once, with a weight
+    order = np.lexsort((buckets, values, codes))
+    codes, buckets, values = codes[order], buckets[order], values[order]
+    distinct = np.flatnonzero(np.concatenate((
+        [True], (codes[1:] != codes[:-1]) | (buckets[1:] != buckets[:-1]) | (values[1:] != values[:-1])
+    )))
+    weights = np.diff(np.append(distinct, len(values)))
+    codes, buckets, values = codes[distinct], buckets[distinct], values[distinct]
+    by_bucket = np.argsort(buckets, kind="stable")
+    bucket_order = buckets[by_bucket]
+    n_entries = len(values)
+
+    # Each entry lands in ``window`` windows; take a span of window ends at a time
+    per_bucket = n_entries / n_buckets
+    span = max(1, int(QUANTILE_CHUNK_ROWS // (per_bucket * window + 1)))
+    offsets = np.arange(window)
+    for first in range(0, n_buckets, span):
+        last = min(first + span, n_buckets)
+        low, high = np.searchsorted(bucket_order, [first - window + 1, last])
+        if low == high:
+            continue
+        ends = (bucket_order[low:high, None] + offsets).ravel()
+        rows = np.repeat(by_bucket[low:high], window)
+        inside = (ends >= first) & (ends < last)
+        ends, rows = ends[inside], rows[inside]
+
+        # One integer sort orders the entries by window, then by value; ranks are read off
+        # the running total of their weights
+        windows_of_rows = codes[rows] * (last - first) + (ends - first)
+        composite = windows_of_rows * n_entries + rows
+        composite.sort()
+        keys, rows = np.divmod(composite, n_entries)
+        cumulative = np.cumsum(weights[rows])
+        key_starts = np.flatnonzero(np.concatenate(([True], keys[1:] != keys[:-1])))
+        windows = keys[key_starts]
+        before = np.where(key_starts > 0, cumulative[key_starts - 1], 0)
+        totals = np.append(before[1:], cumulative[-1]) - before
+        groups, positions = windows // (last - first), first + windows % (last - first)
+        for q in levels:
+            position = q * (totals - 1)
+            lower = np.floor(position).astype(np.int64)
+            upper = np.minimum(lower + 1, totals - 1)
+            low_values = values[rows[np.searchsorted(cumulative, before + lower, side="right")]]
+            high_values = values[rows[np.searchsorted(cumulative, before + upper, side="right")]]
+            results[q][groups, positions] = low_values + (high_values - low_values) * (position - lower)
+    return results
+
+
+def rolling_statistics(
+    codes: np.ndarray,
+    buckets: np.ndarray,
+    values: np.ndarray,
+    shape: tuple,
+    window: int,
+    statistics: Sequence[str],
+    min_periods: int = 1,
+) -> Dict[str, np.ndarray]:
+    """Trailing-window statistics as ``shape`` = ``(groups, buckets)`` arrays.
+
+    ``codes`` and ``buckets`` place every value in the grid. Windows holding fewer
+    than ``min_periods`` values are NaN for every statistic except ``count``.
+    """
+    n_groups, n_buckets = shape
+    cells = codes * n_buckets + buckets
+    counts = _rolling_sum(np.bincount(cells, minlength=n_groups * n_buckets).reshape(shape), window)
+    enough = counts >= max(min_periods, 1)
+
+    results: Dict[str, np.ndarray] = {}
+    sums = None
+    levels = [_quantile_level(name) for name in statistics if name not in ROLLING_STATISTICS or name == "median"]
+    quantiles = _rolling_quantiles(codes, buckets, values, shape, window, levels) if levels else {}
+    for name in statistics:
+        if name == "count":
+            results[name] = counts
+            continue
+        if name in ("sum", "mean"):
+            if sums is None:
+                sums = _rolling_sum(np.bincount(cells, values, n_groups * n_buckets).reshape(shape), window)
+            statistic = sums if name == "sum" else sums / np.maximum(counts, 1)
+        elif name in ("min", "max"):
+            ufunc, identity = (np.minimum, np.inf) if name == "min" else (np.maximum, -np.inf)
+            grid = np.full(n_groups * n_buckets, identity)
+            ufunc.at(grid, cells, values)
+            statistic = _rolling_extreme(grid.reshape(shape), window, ufunc, identity)
+        else:
+            statistic = quantiles[_quantile_level(name)]
+        results[name] = np.where(enough, statistic, np.nan)
+    return results
@@ -0,0 +1,285 @@
+import asyncio
+import functools
+import hashlib
+from typing import (
+    Any, AsyncIterator, Callable, ClassVar, Coroutine, Dict, List, Optional, Tuple, Type, TypeVar, get_origin,
+    get_type_hints,
+)
+
+from fastapi import HTTPException, Request, Response
+from fastapi.concurrency import run_in_threadpool
+from fastapi.exceptions import RequestValidationError
+from fastapi.routing import APIRoute
+from pydantic import BaseModel, PrivateAttr, ValidationError
+
+from app import config, metrics, profiling
+from app.arrow import COLUMNAR_MEDIA_TYPES, columns_from_table, read_table
+from app.cache import ResultCache, body_etag, etag_matches, request_fingerprint
+from app.columnar import EventColumns
+from app.offload import ProcessOffload
+from app.responses import FastJSONResponse
+from app.streaming import NDJSON_MEDIA_TYPES, Accumulator, iter_ndjson_batches
+
+AccumulatorFactory = Callable[[Any], Optional[Accumulator]]
+Model = TypeVar("Model", bound=BaseModel)
+
+
+class EventSource(BaseModel):
+    """Base for request models carrying a dataset.
+
+    When the events arrive as a binary columnar body the route attaches the Arrow
+    table and a hash of the body here, and ``data`` is left empty; :meth:`columns`
+    decodes only the table columns a handler reads.
+    """
+
+    # Whether identical requests may be answered without running the handler (result cache, ETags)
+    cacheable: ClassVar[bool] = True
+    _columns: Optional[EventColumns] = PrivateAttr(default=None)
+    _table: Optional[Any] = PrivateAttr(default=None)
+    _fingerprint: Optional[str] = PrivateAttr(default=None)
+
+    @property
+    def has_columns(self) -> bool:
+        """Whether the events came as columns (a columnar body, or columns attached by the server)."""
+        return self._columns is not None or self._table is not None
+
+    def columns(self, attributes: Optional[List[str]]) -> EventColumns:
+        """The request's own events as columns, with at least ``attributes`` (None for all)."""
+        if self._columns is not None:
+            return self._columns
+        if self._table is not None:
+            return columns_from_table(self._table, attributes)
+        return EventColumns.from_events(getattr(self, "data", None), attributes)
+
+
+def media_type(request: Request) -> str:
+    return request.headers.get("content-type", "").split(";")[0].strip().lower()
+
+
+def _query_body(request: Request, model: Type[BaseModel]) -> Dict[str, Any]:
+    # When the body holds the events, the remaining request fields travel as query parameters
+    body: Dict[str, Any] = {}
+    for name, field in model.model_fields.items():
+        values = request.query_params.getlist(name)
+        if name != "data" and values:
+            body[name] = values if get_origin(field.annotation) is list else values[-1]
+    return body
+
+
+def _validate(model: Type[Model], body: Dict[str, Any]) -> Model:
+    try:
+        return model.model_validate(body)
+    except ValidationError as e:
+        raise RequestValidationError(
+            [{**error, "loc": ("query", *error["loc"])} for error in e.errors(include_url=False)]
+        )
+
+
+def _guarded(function: Callable[..., Any], *args: Any) -> Any:
+    # Match the JSON handlers: anything but an HTTPException becomes a 400
+    try:
+        return function(*args)
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+
+def _event_source(endpoint: Callable[..., Any]) -> Optional[Type[EventSource]]:
+    model = get_type_hints(endpoint).get("data")
+    return model if isinstance(model, type) and issubclass(model, EventSource) else None
+
+
+def _rendered(endpoint: Callable[..., Any], offload: Optional[ProcessOffload] = None) -> Callable[..., Any]:
+    # Returning a response skips FastAPI's validation and re-encoding of the result
+    dispatch = endpoint if offload is None else offload.wrap(endpoint)
+
+    @functools.wraps(endpoint)
+    async def render(data: Any) -> Response:
+        metrics.end("validate")
+        with metrics.stage("compute"):
+            session = profiling.current()
+            if session is not None:
+                # Profiled requests stay in this process so the profiler sees the handler
+                result = await run_in_threadpool(session.run, endpoint, data=data)
+            elif asyncio.iscoroutinefunction(dispatch):
+                result = await dispatch(data=data)
+            else:
+                result = await run_in_threadpool(dispatch, data=data)
+        if isinstance(result, Response):
+            return result
+        with metrics.stage("serialize"):
+            return FastJSONResponse(result)
+
+    return render
+
+
+async def _timed_batches(
+    batches: AsyncIterator[Tuple[int, List[Any]]]
+) -> AsyncIterator[Tuple[int, List[Any]]]:
+    # Reading and decoding each batch is the parse stage; the caller's work in between is not
+    while True:
+        with metrics.stage("parse"):
+            try:
+                start, batch = await batches.__anext__()
+            except StopAsyncIteration:
+                return
+        metrics.record_rows(start + len(batch))
+        yield start, batch
+
+
+def analytics_route(
+    accumulators: Dict[str, AccumulatorFactory],
+    offload: Optional[ProcessOffload] = None,
+    cache: Optional[ResultCache] = None,
+    references_held: Optional[Callable[[Dict[str, Any]], bool]] = None,
+) -> Type[APIRoute]:
+    """Route class that also accepts non-JSON bodies on routes taking a ``data`` model.
+
+    NDJSON bodies on paths with an accumulator are reduced in constant memory as
+    batches arrive; on other paths the events are collected and the regular handler
+    runs. Arrow IPC and Parquet bodies are decoded straight into columns. With
+    ``offload``, handlers of those routes may run in a worker process. Their results
+    are rendered with orjson (see ``FastJSONResponse``) rather than FastAPI's encoder.
+
+    JSON and columnar requests are fingerprinted from their raw body before anything
+    is parsed. The fingerprint is the response's strong ``ETag``, so a matching
+    ``If-None-Match`` gets a 304 straight away, and with ``cache`` it is also the
+    result cache key; the ``X-Cache`` header reports the outcome. NDJSON responses
+    get an ``ETag`` hashed from the response body instead. The fingerprint does not
+    cover the datasets and models a request names by id, so ``references_held`` is
+    asked whether they are still held before a 304 or a cached result is returned.
+    """
+
+    class AnalyticsRoute(APIRoute):
+        def __init__(self, path: str, endpoint: Callable[..., Any], **kwargs: Any) -> None:
+            if _event_source(endpoint) is not None:
+                endpoint = _rendered(endpoint, offload)
+            super().__init__(path, endpoint, **kwargs)
+
+        async def call_endpoint(self, data: EventSource) -> Response:
+            response: Response = await self.endpoint(data=data)
+            return response
+
+        def get_route_handler(self) -> Callable[[Request], Coroutine[Any, Any, Response]]:
+            handle_json = super().get_route_handler()
+            model = _event_source(self.endpoint)
+            if model is None:
+                return handle_json
+            source: Type[EventSource] = model
+            factory = accumulators.get(self.path)
+
+            async def handle_ndjson(request: Request) -> Response:
+                params = _query_body(request, source)
+                batches = _timed_batches(iter_ndjson_batches(request, config.STREAM_BATCH_SIZE))
+                accumulator = None
+                if factory is not None:
+                    with metrics.stage("validate"):
+                        accumulator = await run_in_threadpool(
+                            _guarded, factory, _validate(source, {**params, "data": []})
+                        )
+                if accumulator is None:
+                    events = [event async for _, batch in batches for event in batch]
+                    with metrics.stage("validate"):
+                        data = _validate(source, {**params, "data": events})
+                    return await self.call_endpoint(data)
+
+                async for start, batch in batches:
+                    columns = EventColumns.from_events(batch, accumulator.attributes, start)
+                    with metrics.stage("compute"):
+                        await run_in_threadpool(_guarded, accumulator.update, columns)
+                with metrics.stage("compute"):
+                    result = await run_in_threadpool(_guarded, accumulator.result)
+                with metrics.stage("serialize"):
+                    return FastJSONResponse(result)
+
+            async def handle_columnar(request: Request) -> Response:
+                body_bytes = await request.body()
+                with metrics.stage("validate"):
+                    data = _validate(source, {**_query_body(request, source), "data": []})
+                with metrics.stage("parse"):
+                    data._table = await run_in_threadpool(read_table, body_bytes, media_type(request))
+                data._fingerprint = hashlib.blake2b(body_bytes, digest_size=16).hexdigest()
+                return await self.call_endpoint(data)
+
+            async def handle(request: Request) -> Response:
+                if media_type(request) in NDJSON_MEDIA_TYPES:
+                    return await handle_ndjson(request)
+                if media_type(request) in COLUMNAR_MEDIA_TYPES:
+                    return await handle_columnar(request)
+                if media_type(request) in ("", "application/json"):
+                    # Decode here so it is timed; FastAPI reuses the decoded body and reports any error
+                    with metrics.stage("parse"):
+                        try:
+                            await request.json()
+                        except Exception:
+                            pass
+                # Validation runs inside FastAPI's handler and ends where the endpoint starts
+                metrics.begin("validate")
+                return await handle_json(request)
+
+            if not source.cacheable:
+                return handle
+
+            async def handle_streamed(request: Request) -> Response:
+                # Streamed bodies would have to be buffered to be fingerprinted up front
+                response = await handle(request)
+                if response.status_code == 200:
+                    etag = body_etag(bytes(response.body))
+                    if etag_matches(request.headers.get("if-none-match"), etag):
+                        return Response(status_code=304, headers={"ETag": etag})
+                    response.headers["ETag"] = etag
+                if cache is not None:
+                    response.headers["X-Cache"] = "BYPASS"
+                return response
+
+            async def held(request: Request) -> bool:
+                if references_held is None:
+                    return True
+                if media_type(request) in COLUMNAR_MEDIA_TYPES:
+                    return references_held(dict(request.query_params))
+                body = await request.body()
+                # Only bodies that can name an id are parsed, so inline events still revalidate unparsed
+                if b'"dataset_id"' not in body and b'"model_id"' not in body:
+                    return True
+                try:
+                    parsed = await request.json()
+                except Exception:
+                    return True
+                return not isinstance(parsed, dict) or references_held(parsed)
+
+            async def handle_fingerprinted(request: Request) -> Response:
+                if media_type(request) in NDJSON_MEDIA_TYPES:
+                    return await handle_streamed(request)
+
+                key = request_fingerprint(
+                    self.path, request.query_params.multi_items(), media_type(request), await request.body()
+                )
+                etag = f'"{key}"'
+                if etag_matches(request.headers.get("if-none-match"), etag) and await held(request):
+                    return Response(status_code=304, headers={"ETag": etag})
+
+                if cache is None or not cache.enabled:
+                    response = await handle(request)
+                    response.headers["ETag"] = etag
+                    if cache is not None:
+                        response.headers["X-Cache"] = "BYPASS"
+                    return response
+
+                # Profiled requests must run the handler to be worth profiling
+                if "no-cache" not in request.headers.get("cache-control", "") and profiling.current() is None:
+                    cached = cache.get(key)
+                    if cached is not None and await held(request):
+                        headers = {"ETag": etag, "X-Cache": "HIT", "Age": str(int(cached.age))}
+                        return Response(cached.body, media_type=cached.media_type, headers=headers)
+
+                response = await handle(request)
+                if response.status_code == 200:
+                    cache.put(key, bytes(response.body), response.media_type or "application/json")
+                response.headers["ETag"] = etag
+                response.headers["X-Cache"] = "MISS"
+                return response
+
+            return handle_fingerprinted
+
+    return AnalyticsRoute
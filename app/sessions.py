@@ -0,0 +1,257 @@
+"""Stateful aggregation sessions that events are appended to batch by batch.
+
+A session keeps only mergeable running state, so every append costs time in the
+size of the batch and reading results never revisits earlier events:
+
+* per-group (and overall) counts, sums, minima, maxima and Welford means and
+  squared deviations, merged with Chan's parallel update;
+* a quantile sketch per group for medians and percentiles;
+* event counts per day, folded into years, months or days when read;
+* least-squares sufficient statistics of the value over the calendar year.
+"""
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from typing import Any, Dict, List, Optional
+
+import numpy as np
+from fastapi import HTTPException
+
+from app.columnar import EventColumns
+from app.groupby import GroupCodes
+from app.regression import LinearFit
+from app.sketch import QuantileSketch
+from app.streaming import future_values
+from app.timeseries import day_counts, fold_day_counts, timestamp_years
+
+# Batch ids remembered per session for deduplicating retried appends
+MAX_BATCH_IDS = 1024
+
+# Quantiles reported per group, estimated from the sketches
+SESSION_QUANTILES = {"median": 0.5, "q1": 0.25, "q3": 0.75}
+
+
+class RunningMoments:
+    """Count, sum, extremes, mean and sum of squared deviations for each of many groups."""
+
+    def __init__(self, n_groups: int = 0) -> None:
+        self.counts = np.zeros(0, dtype=np.int64)
+        self.sums = np.zeros(0)
+        self.means = np.zeros(0)
+        self.m2 = np.zeros(0)
+        self.mins = np.zeros(0)
+        self.maxs = np.zeros(0)
+        self._grow(n_groups)
+
+    def __len__(self) -> int:
+        return len(self.counts)
+
+    def _grow(self, n_groups: int) -> None:
+        extra = n_groups - len(self.counts)
+        if extra > 0:
+            self.counts = np.concatenate((self.counts, np.zeros(extra, dtype=np.int64)))
+            self.sums = np.concatenate((self.sums, np.zeros(extra)))
+            self.means = np.concatenate((self.means, np.zeros(extra)))
+            self.m2 = np.concatenate((self.m2, np.zeros(extra)))
+            self.mins = np.concatenate((self.mins, np.full(extra, np.inf)))
+            self.maxs = np.concatenate((self.maxs, np.full(extra, -np.inf)))
+
+    def update(self, codes: np.ndarray, values: np.ndarray, n_groups: int) -> None:
+        self._grow(n_groups)
+        batch_counts = np.bincount(codes, minlength=n_groups)
+        batch_sums = np.bincount(codes, weights=values, minlength=n_groups)
+        filled = batch_counts > 0
+        batch_means = np.divide(batch_sums, batch_counts, out=np.zeros(n_groups), where=filled)
+        deviations = values - batch_means[codes]
+        batch_m2 = np.bincount(codes, weights=deviations * deviations, minlength=n_groups)
+
+        # Chan et al.: combine (n_a, mean_a, M2_a) with the batch's (n_b, mean_b, M2_b)
+        counts = self.counts + batch_counts
+        delta = batch_means - self.means
+        share = np.divide(batch_counts, counts, out=np.zeros(n_groups), where=filled)
+        self.means = np.where(filled, self.means + delta * share, self.means)
+        self.m2 = self.m2 + batch_m2 + np.where(filled, delta * delta * self.counts * share, 0.0)
+        self.counts = counts
+        self.sums = self.sums + batch_sums
+        np.minimum.at(self.mins, codes, values)
+        np.maximum.at(self.maxs, codes, values)
+
+    def variances(self) -> np.ndarray:
+        """Sample variance (``ddof=1``) per group; NaN below two values."""
+        variances: np.ndarray = np.divide(
+            self.m2, self.counts - 1, out=np.full(len(self), np.nan), where=self.counts > 1
+        )
+        return variances
+
+
+class AggregationSession:
+    """Running aggregates of ``value_attribute``, optionally by ``group_by_attribute``."""
+
+    def __init__(
+        self, value_attribute: str, group_by_attribute: Optional[str] = None, relative_accuracy: float = 0.01
+    ) -> None:
+        self.id = uuid.uuid4().hex
+        self.value_attribute = value_attribute
+        self.group_by_attribute = group_by_attribute
+        self.relative_accuracy = relative_accuracy
+        self.created = time.time()
+        self.last_used = time.monotonic()
+        self.events = 0
+        self.batches = 0
+
+        self.group_codes = GroupCodes()
+        self.by_group = RunningMoments()
+        self.group_sketch = QuantileSketch(relative_accuracy, 0)
+        self.overall = RunningMoments(1)
+        self.overall_sketch = QuantileSketch(relative_accuracy, 1)
+        self.days = np.zeros(0, dtype="datetime64[D]")
+        self.day_counts = np.zeros(0, dtype=np.int64)
+        self.trend = LinearFit()
+        # Ids of recently appended batches, so a retried append is not counted twice
+        self._batch_ids: "OrderedDict[str, None]" = OrderedDict()
+        self.lock = threading.Lock()
+
+    @property
+    def attributes(self) -> List[str]:
+        return [name for name in (self.group_by_attribute, self.value_attribute) if name is not None]
+
+    def append(self, columns: EventColumns, batch_id: Optional[str] = None) -> bool:
+        """Fold a batch of events into the running state.
+
+        Returns False, changing nothing, when ``batch_id`` was already appended.
+        """
+        values, has_value = columns.numeric(self.value_attribute)
+        if not np.isfinite(values[has_value]).all():
+            raise ValueError("Values must be finite numbers")
+        dates, has_timestamp = columns.dates()
+        if self.group_by_attribute is not None:
+            labels, has_label = columns.keys(self.group_by_attribute)
+            grouped = has_label & has_value
+        dated = has_timestamp & has_value
+
+        with self.lock:
+            if batch_id is not None:
+                if batch_id in self._batch_ids:
+                    return False
+                self._batch_ids[batch_id] = None
+                if len(self._batch_ids) > MAX_BATCH_IDS:
+                    self._batch_ids.popitem(last=False)
+            self.events += len(columns)
+            self.batches += 1
+
+            present = values[has_value]
+            self.overall.update(np.zeros(len(present), dtype=np.intp), present, 1)
+            self.overall_sketch.update(present)
+            if self.group_by_attribute is not None:
+                codes = self.group_codes.encode(labels[grouped])
+                self.by_group.update(codes, values[grouped], len(self.group_codes))
+                self.group_sketch.update(values[grouped], codes, len(self.group_codes))
+            self._add_days(dates[has_timestamp])
+            self.trend.update(timestamp_years(dates[dated]), values[dated])
+            return True
+
+    def _add_days(self, dates: np.ndarray) -> None:
+        days, counts = day_counts(dates)
+        merged, inverse = np.unique(np.concatenate((self.days, days)), return_inverse=True)
+        self.day_counts = np.bincount(inverse, weights=np.concatenate((self.day_counts, counts))).astype(np.int64)
+        self.days = merged
+
+    def average_values(self) -> Dict[str, Any]:
+        self._require_groups()
+        with self.lock:
+            filled = np.flatnonzero(self.by_group.counts)
+            if not len(filled):
+                raise HTTPException(
+                    status_code=400, detail=f"No valid data found for attributes: {', '.join(self.attributes)}"
+                )
+            means = self.by_group.sums[filled] / self.by_group.counts[filled]
+            return {"average_values": dict(zip([self.group_codes.groups[code] for code in filled], means.tolist()))}
+
+    def counts_by_time(self, time_format: str) -> Dict[str, Any]:
+        with self.lock:
+            return {"counts_by_time": fold_day_counts(self.days, self.day_counts, time_format)}
+
+    def predicted_values(self, time_points: List[int]) -> Dict[str, Any]:
+        with self.lock:
+            return future_values(self.trend, time_points)
+
+    def summary(self) -> Dict[str, Any]:
+        """Statistics overall and per group; those undefined for too few values are null."""
+        with self.lock:
+            result: Dict[str, Any] = {
+                "session_id": self.id,
+                "value_attribute": self.value_attribute,
+                "group_by_attribute": self.group_by_attribute,
+                "events": self.events,
+                "batches": self.batches,
+                "overall": _statistics(self.overall, self.overall_sketch)[0],
+            }
+            if self.group_by_attribute is not None:
+                per_group = _statistics(self.by_group, self.group_sketch)
+                result["groups"] = dict(zip(self.group_codes.groups, per_group))
+            return result
+
+    def _require_groups(self) -> None:
+        if self.group_by_attribute is None:
+            raise HTTPException(status_code=400, detail="This session was created without a group_by_attribute")
+
+
+def _statistics(moments: RunningMoments, sketch: QuantileSketch) -> List[Dict[str, Any]]:
+    empty = moments.counts == 0
+    variances = moments.variances()
+    columns: Dict[str, np.ndarray] = {
+        "count": moments.counts,
+        "sum": moments.sums,
+        "mean": np.where(empty, np.nan, moments.means),
+        "variance": variances,
+        "std": np.sqrt(variances),
+        "min": np.where(empty, np.nan, moments.mins),
+        "max": np.where(empty, np.nan, moments.maxs),
+    }
+    for name, q in SESSION_QUANTILES.items():
+        columns[name] = sketch.quantile(q)
+    lists = {name: column.tolist() for name, column in columns.items()}
+    return [{name: values[index] for name, values in lists.items()} for index in range(len(moments))]
+
+
+class SessionStore:
+    """Sessions by id, evicting the least recently used beyond ``max_sessions`` or idle past ``ttl`` seconds."""
+
+    def __init__(self, max_sessions: int, ttl: float) -> None:
+        self.max_sessions = max_sessions
+        self.ttl = ttl
+        self._sessions: "OrderedDict[str, AggregationSession]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return len(self._sessions)
+
+    def add(self, session: AggregationSession) -> None:
+        with self._lock:
+            self._sessions[session.id] = session
+            self._expire()
+            while len(self._sessions) > max(1, self.max_sessions):
+                self._sessions.popitem(last=False)
+
+    def get(self, session_id: str) -> AggregationSession:
+        """Return a live session and mark it as used; raises KeyError."""
+        with self._lock:
+            self._expire()
+            session = self._sessions[session_id]
+            self._sessions.move_to_end(session_id)
+            session.last_used = time.monotonic()
+            return session
+
+    def delete(self, session_id: str) -> Optional[AggregationSession]:
+        with self._lock:
+            return self._sessions.pop(session_id, None)
+
+    def _expire(self) -> None:
+        # Oldest-used first, so stop at the first session still in use
+        now = time.monotonic()
+        while self._sessions:
+            session = next(iter(self._sessions.values()))
+            if now - session.last_used <= self.ttl:
+                break
+            self._sessions.popitem(last=False)
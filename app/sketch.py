@@ -0,0 +1,120 @@
+import math
+from typing import Optional
+
+import numpy as np
+
+# Bucket keys are offset by this much so negatives, zero and positives sort by value
+_KEY_OFFSET = 1 << 40
+
+
+class QuantileSketch:
+    """Mergeable relative-error quantile sketch (DDSketch) for one or more groups.
+
+    Values fall into logarithmic buckets whose width is set by ``relative_accuracy``;
+    any quantile estimate is within that relative distance of a true value at the
+    requested rank. Only ``(group, bucket) -> count`` pairs are kept, so memory grows
+    with the spread of the values, not their number, and two sketches merge by
+    adding counts. All groups are built and queried together without Python loops.
+    """
+
+    def __init__(self, relative_accuracy: float = 0.01, n_groups: int = 1) -> None:
+        if not 0 < relative_accuracy < 1:
+            raise ValueError("relative_accuracy must be between 0 and 1")
+        self.relative_accuracy = relative_accuracy
+        self.gamma = (1 + relative_accuracy) / (1 - relative_accuracy)
+        self._log_gamma = math.log(self.gamma)
+        self.n_groups = 0
+        self.bucket_groups = np.zeros(0, dtype=np.int64)
+        self.bucket_keys = np.zeros(0, dtype=np.int64)
+        self.bucket_counts = np.zeros(0, dtype=np.int64)
+        self.counts = np.zeros(0, dtype=np.int64)
+        self.mins = np.zeros(0)
+        self.maxs = np.zeros(0)
+        self._grow(n_groups)
+
+    def _grow(self, n_groups: int) -> None:
+        extra = n_groups - self.n_groups
+        if extra > 0:
+            self.counts = np.concatenate((self.counts, np.zeros(extra, dtype=np.int64)))
+            self.mins = np.concatenate((self.mins, np.full(extra, np.inf)))
+            self.maxs = np.concatenate((self.maxs, np.full(extra, -np.inf)))
+            self.n_groups = n_groups
+
+    @property
+    def nbytes(self) -> int:
+        arrays = (self.bucket_groups, self.bucket_keys, self.bucket_counts, self.counts, self.mins, self.maxs)
+        return sum(array.nbytes for array in arrays)
+
+    def _keys(self, values: np.ndarray) -> np.ndarray:
+        magnitudes = np.abs(values)
+        keys = np.zeros(len(values), dtype=np.int64)
+        nonzero = magnitudes > 0
+        indexes = np.ceil(np.log(magnitudes[nonzero]) / self._log_gamma).astype(np.int64)
+        keys[nonzero] = np.sign(values[nonzero]).astype(np.int64) * (_KEY_OFFSET + indexes)
+        return keys
+
+    def _bucket_values(self, keys: np.ndarray) -> np.ndarray:
+        signs = np.sign(keys)
+        indexes = np.abs(keys) - _KEY_OFFSET
+        # The bucket centre keeps the estimate within relative_accuracy of any value in it
+        values: np.ndarray = signs * 2 * np.power(self.gamma, indexes.astype(float)) / (self.gamma + 1)
+        return values
+
+    def update(self, values: np.ndarray, codes: Optional[np.ndarray] = None, n_groups: int = 1) -> "QuantileSketch":
+        """Add ``values``; ``codes`` assigns each value to a group in ``range(n_groups)``."""
+        values = np.asarray(values, dtype=float)
+        if not np.isfinite(values).all():
+            raise ValueError("Approximate quantiles require finite values")
+        codes = np.zeros(len(values), dtype=np.int64) if codes is None else np.asarray(codes, dtype=np.int64)
+        self._grow(max(n_groups, int(codes.max()) + 1 if len(codes) else 0))
+        if not len(values):
+            return self
+
+        self.counts += np.bincount(codes, minlength=self.n_groups)
+        np.minimum.at(self.mins, codes, values)
+        np.maximum.at(self.maxs, codes, values)
+        self._add_buckets(codes, self._keys(values), np.ones(len(values), dtype=np.int64))
+        return self
+
+    def merge(self, other: "QuantileSketch") -> "QuantileSketch":
+        """Fold ``other`` (same accuracy, matching group codes) into this sketch."""
+        if other.gamma != self.gamma:
+            raise ValueError("Cannot merge sketches with different relative accuracy")
+        self._grow(other.n_groups)
+        self.counts[:other.n_groups] += other.counts
+        self.mins[:other.n_groups] = np.minimum(self.mins[:other.n_groups], other.mins)
+        self.maxs[:other.n_groups] = np.maximum(self.maxs[:other.n_groups], other.maxs)
+        self._add_buckets(other.bucket_groups, other.bucket_keys, other.bucket_counts)
+        return self
+
+    def _add_buckets(self, groups: np.ndarray, keys: np.ndarray, counts: np.ndarray) -> None:
+        groups = np.concatenate((self.bucket_groups, groups))
+        keys = np.concatenate((self.bucket_keys, keys))
+        counts = np.concatenate((self.bucket_counts, counts))
+
+        # Collapse (group, key) pairs, sorted by group then by bucket value
+        order = np.lexsort((keys, groups))
+        groups, keys, counts = groups[order], keys[order], counts[order]
+        starts = np.flatnonzero(np.concatenate(([True], (groups[1:] != groups[:-1]) | (keys[1:] != keys[:-1]))))
+        self.bucket_groups = groups[starts]
+        self.bucket_keys = keys[starts]
+        self.bucket_counts = np.add.reduceat(counts, starts) if len(counts) else counts
+
+    def quantile(self, q: float) -> np.ndarray:
+        """Estimate the ``q`` quantile of every group; NaN for empty groups."""
+        result = np.full(self.n_groups, np.nan)
+        filled = np.flatnonzero(self.counts)
+        if not len(filled):
+            return result
+
+        cumulative = np.cumsum(self.bucket_counts)
+        group_starts = np.searchsorted(self.bucket_groups, filled)
+        before = np.where(group_starts > 0, cumulative[group_starts - 1], 0)
+        ranks = np.floor(q * (self.counts[filled] - 1))
+        buckets = np.searchsorted(cumulative, before + ranks, side="right")
+        estimates = self._bucket_values(self.bucket_keys[buckets])
+        estimates = np.clip(estimates, self.mins[filled], self.maxs[filled])
+        # The extremes are tracked exactly
+        estimates = np.where(ranks == 0, self.mins[filled], estimates)
+        result[filled] = np.where(ranks == self.counts[filled] - 1, self.maxs[filled], estimates)
+        return result
@@ -0,0 +1,235 @@
+import json
+from typing import Any, AsyncIterator, Dict, List, Optional, Tuple, Union
+
+import numpy as np
+from fastapi import HTTPException, Request
+from fastapi.exceptions import RequestValidationError
+
+from app.columnar import EventColumns
+from app.groupby import GroupBy, GroupCodes
+from app.model_store import FittedModel, ModelStore, TrainingDigest, model_id, prediction_points
+from app.regression import GroupedLinearFit, LinearFit, MultiLinearFit
+from app.timeseries import count_timestamps, timestamp_years
+
+NDJSON_MEDIA_TYPES = {"application/x-ndjson", "application/ndjson"}
+
+
+async def iter_ndjson_batches(request: Request, batch_size: int) -> AsyncIterator[Tuple[int, List[Any]]]:
+    """Yield ``(first_index, events)`` batches parsed from an NDJSON request body."""
+    pending = b""
+    batch: List[Any] = []
+    start = 0
+    line_number = 0
+
+    def parse(line: bytes) -> None:
+        nonlocal line_number
+        line_number += 1
+        if not line.strip():
+            return
+        try:
+            batch.append(json.loads(line))
+        except json.JSONDecodeError as e:
+            raise RequestValidationError(
+                [{"type": "json_invalid", "loc": ("body", line_number), "msg": "JSON decode error", "input": {}, "ctx": {"error": e.msg}}]
+            )
+
+    async for chunk in request.stream():
+        lines = (pending + chunk).split(b"\n")
+        pending = lines.pop()
+        for line in lines:
+            parse(line)
+            if len(batch) >= batch_size:
+                yield start, batch
+                start += len(batch)
+                batch = []
+    parse(pending)
+    if batch:
+        yield start, batch
+
+
+class Accumulator:
+    """Reduces an event stream batch by batch, keeping only running state."""
+
+    attributes: List[str] = []
+
+    def update(self, columns: EventColumns) -> None:
+        raise NotImplementedError
+
+    def result(self) -> Dict[str, Any]:
+        raise NotImplementedError
+
+
+class CountByTimeAccumulator(Accumulator):
+    def __init__(self, time_format: str) -> None:
+        self.time_format = time_format
+        self.counts: Dict[str, int] = {}
+
+    def update(self, columns: EventColumns) -> None:
+        for key, count in count_timestamps(columns, self.time_format).items():
+            self.counts[key] = self.counts.get(key, 0) + count
+
+    def result(self) -> Dict[str, Any]:
+        return {"counts_by_time": self.counts}
+
+
+class ExtremeAccumulator(Accumulator):
+    def __init__(self, attribute: str, result_key: str, highest: bool) -> None:
+        self.attributes = [attribute]
+        self.result_key = result_key
+        self.highest = highest
+        self.value: Any = None
+
+    def update(self, columns: EventColumns) -> None:
+        values, present = columns.numeric(self.attributes[0])
+        if present.any():
+            batch = float(values[present].max() if self.highest else values[present].min())
+            if self.value is None:
+                self.value = batch
+            else:
+                self.value = max(self.value, batch) if self.highest else min(self.value, batch)
+
+    def result(self) -> Dict[str, Any]:
+        if self.value is None:
+            raise HTTPException(
+                status_code=400,
+                detail="No valid values found for the specified attribute.",
+            )
+        return {self.result_key: self.value}
+
+
+class GroupMeanAccumulator(Accumulator):
+    def __init__(self, group_by_attribute: str, value_attribute: str) -> None:
+        self.attributes = [group_by_attribute, value_attribute]
+        self.sums: Dict[str, float] = {}
+        self.counts: Dict[str, int] = {}
+
+    def update(self, columns: EventColumns) -> None:
+        grouping, values = GroupBy.from_columns(columns, *self.attributes)
+        sums = grouping.sum(values).tolist()
+        for group, total, count in zip(grouping.groups.tolist(), sums, grouping.counts.tolist()):
+            self.sums[group] = self.sums.get(group, 0.0) + total
+            self.counts[group] = self.counts.get(group, 0) + count
+
+    def result(self) -> Dict[str, Any]:
+        if not self.counts:
+            raise HTTPException(
+                status_code=400,
+                detail=f"No valid data found for attributes: {', '.join(self.attributes)}",
+            )
+        return {"average_values": {group: self.sums[group] / count for group, count in self.counts.items()}}
+
+
+class PredictAccumulator(Accumulator):
+    def __init__(
+        self, x: Union[str, List[str]], y_attribute: str, x_values: List[Any], store: Optional[ModelStore] = None
+    ) -> None:
+        # ``x`` is one feature, or a list of features for a multivariate fit; the fitted
+        # model is kept in ``store`` for reuse by its id, as fits of JSON bodies are
+        self.x_attributes = [x] if isinstance(x, str) else x
+        self.attributes = [*self.x_attributes, y_attribute]
+        self.x_values = x_values
+        self.x_counts = [0] * len(self.x_attributes)
+        self.y_count = 0
+        self.model = FittedModel("", x, y_attribute, LinearFit() if isinstance(x, str) else MultiLinearFit(len(x)))
+        self.training = TrainingDigest()
+        self.store = store
+
+    def update(self, columns: EventColumns) -> None:
+        x_columns = [columns.numeric(attribute) for attribute in self.x_attributes]
+        y_all, y_present = columns.numeric(self.attributes[-1])
+        self.y_count += int(np.count_nonzero(y_present))
+        rows = y_present.copy()
+        for index, (_, x_present) in enumerate(x_columns):
+            self.x_counts[index] += int(np.count_nonzero(x_present))
+            rows &= x_present
+        x_data = [x_all[rows] for x_all, _ in x_columns]
+        y_data = y_all[rows]
+        if np.isnan(y_data).any() or any(np.isnan(x).any() for x in x_data):
+            raise HTTPException(status_code=400, detail="Input data contains NaN or invalid values.")
+        self.training.update([*x_data, y_data])
+        if isinstance(self.model.fit, LinearFit):
+            self.model.fit.update(x_data[0], y_data)
+        else:
+            self.model.fit.update(np.column_stack(x_data), y_data)
+
+    def fitted(self) -> FittedModel:
+        if not all(self.x_counts) or not self.y_count:
+            raise HTTPException(status_code=400, detail="Input data cannot be empty.")
+        # The fit holds the events carrying every attribute; any other event is unpaired
+        if any(count != self.model.fit.n for count in (*self.x_counts, self.y_count)):
+            raise HTTPException(status_code=400, detail="Mismatched x and y data lengths.")
+        self.model.id = model_id(self.training, self.model.x, self.model.y_attribute)
+        return self.model
+
+    def result(self) -> Dict[str, Any]:
+        model = self.fitted()
+        if self.store is not None:
+            self.store.put(model)
+        prediction = model.predict(prediction_points(self.x_values, model.width))
+        return {"prediction": prediction.tolist(), "fit": model.statistics(), "model_id": model.id}
+
+
+class FutureValuesAccumulator(Accumulator):
+    def __init__(self, value_attribute: str, time_points: List[int], group_by_attribute: Optional[str] = None) -> None:
+        self.attributes = [value_attribute] if group_by_attribute is None else [group_by_attribute, value_attribute]
+        self.value_attribute = value_attribute
+        self.group_by_attribute = group_by_attribute
+        self.time_points = time_points
+        self.fit = LinearFit()
+        self.group_codes = GroupCodes()
+        self.group_fits = GroupedLinearFit()
+
+    def update(self, columns: EventColumns) -> None:
+        dates, has_timestamp = columns.dates()
+        values, has_value = columns.numeric(self.value_attribute)
+        rows = has_timestamp & has_value
+        if self.group_by_attribute is None:
+            self.fit.update(timestamp_years(dates[rows]), values[rows])
+            return
+        labels, has_label = columns.keys(self.group_by_attribute)
+        rows &= has_label
+        codes = self.group_codes.encode(labels[rows])
+        self.group_fits.update(codes, timestamp_years(dates[rows]), values[rows], len(self.group_codes))
+
+    def result(self) -> Dict[str, Any]:
+        if self.group_by_attribute is None:
+            return future_values(self.fit, self.time_points)
+        return grouped_future_values(self.group_fits, self.group_codes.groups, self.time_points)
+
+
+def future_values(fit: LinearFit, time_points: List[int]) -> Dict[str, Any]:
+    """The ``/predict-future-values`` response for a value-over-years fit."""
+    if not time_points:
+        return {"predicted_values": {}}
+    if fit.n < 2:
+        raise HTTPException(
+            status_code=400, detail="Not enough data for prediction: At least 2 data points required"
+        )
+    predictions = fit.predict(np.array(time_points, dtype=float))
+    return {
+        "predicted_values": dict(zip([int(point) for point in time_points], predictions.tolist())),
+        "fit": fit.statistics(),
+    }
+
+
+def grouped_future_values(fits: GroupedLinearFit, groups: List[str], time_points: List[int]) -> Dict[str, Any]:
+    """The ``/predict-future-values`` response with a ``group_by_attribute``.
+
+    Groups with fewer than 2 data points are listed in ``skipped_groups`` instead.
+    """
+    if not time_points:
+        return {"predicted_values": {}}
+    fitted = np.flatnonzero(fits.n >= 2)
+    if not len(fitted):
+        raise HTTPException(
+            status_code=400, detail="Not enough data for prediction: At least 2 data points required in some group"
+        )
+    points = [int(point) for point in time_points]
+    predictions = fits.predict(np.array(time_points, dtype=float))[fitted].tolist()
+    statistics = fits.statistics()
+    names = [groups[code] for code in fitted.tolist()]
+    return {
+        "predicted_values": {name: dict(zip(points, row)) for name, row in zip(names, predictions)},
+        "fit": {name: statistics[code] for name, code in zip(names, fitted.tolist())},
+        "skipped_groups": [groups[code] for code in np.flatnonzero(fits.n < 2).tolist()],
+    }
@@ -0,0 +1,104 @@
+import re
+from typing import Any, Callable, Dict, List, Optional, Sequence
+
+import numpy as np
+
+from app.groupby import GroupBy
+from app.sketch import QuantileSketch
+
+SUMMARY_STATISTICS = ("count", "sum", "mean", "median", "min", "max", "q1", "q3", "outliers")
+
+# Arbitrary percentiles are requested as e.g. "p90" or "p99.9"
+PERCENTILE_STATISTIC = re.compile(r"p(\d+(?:\.\d+)?)")
+
+# Fewer values than this and the IQR bounds are not meaningful
+MIN_OUTLIER_VALUES = 4
+
+
+def _percentile(name: str) -> Optional[float]:
+    match = PERCENTILE_STATISTIC.fullmatch(name)
+    if match is None or float(match.group(1)) > 100:
+        return None
+    return float(match.group(1)) / 100
+
+
+def validate_statistics(statistics: Sequence[str]) -> None:
+    unknown = [name for name in statistics if name not in SUMMARY_STATISTICS and _percentile(name) is None]
+    if unknown:
+        raise ValueError(
+            f"Unknown statistics: {', '.join(unknown)}. "
+            f"Supported: {', '.join(SUMMARY_STATISTICS)}, or a percentile such as p90"
+        )
+
+
+def summarize(
+    grouping: GroupBy,
+    values: np.ndarray,
+    statistics: Sequence[str],
+    value_order: Optional[np.ndarray] = None,
+    sketch: Optional[QuantileSketch] = None,
+) -> List[Dict[str, Any]]:
+    """Compute the requested statistics for every group of ``grouping``.
+
+    ``value_order`` is the ``argsort`` of ``values``; medians, quartiles, extremes
+    and outliers are all read off the one group-ordered copy derived from it.
+    With a ``sketch`` of the same groups, quantiles are estimated from it instead
+    and the values are never sorted.
+    """
+    results: Dict[str, List[Any]] = {}
+    starts = grouping.starts
+    sums = grouping.sum(values)
+
+    quantile: Callable[[float], np.ndarray]
+    if sketch is not None:
+        quantile = sketch.quantile
+        mins, maxs = sketch.mins, sketch.maxs
+    else:
+        needs_order = any(name not in ("count", "sum", "mean") for name in statistics)
+        ordered = grouping.sorted_values(values, value_order) if needs_order else values
+        mins, maxs = ordered[starts], ordered[starts + grouping.counts - 1]
+
+        def quantile(q: float) -> np.ndarray:
+            return grouping.quantile(values, q, ordered)
+
+    for name in statistics:
+        if name == "count":
+            results[name] = grouping.counts.tolist()
+        elif name == "sum":
+            results[name] = sums.tolist()
+        elif name == "mean":
+            results[name] = (sums / grouping.counts).tolist()
+        elif name == "median":
+            results[name] = quantile(0.5).tolist()
+        elif name == "min":
+            results[name] = mins.tolist()
+        elif name == "max":
+            results[name] = maxs.tolist()
+        elif name == "q1":
+            results[name] = quantile(0.25).tolist()
+        elif name == "q3":
+            results[name] = quantile(0.75).tolist()
+        elif name == "outliers":
+            results[name] = _outliers(grouping, values, quantile(0.25), quantile(0.75))
+        else:
+            results[name] = quantile(_percentile(name) or 0.0).tolist()
+
+    return [
+        {name: results[name][index] for name in statistics}
+        for index in range(len(grouping))
+    ]
+
+
+def _outliers(grouping: GroupBy, values: np.ndarray, q1: np.ndarray, q3: np.ndarray) -> List[np.ndarray]:
+    iqr = q3 - q1
+    lower_bound = (q1 - 1.5 * iqr)[grouping.codes]
+    upper_bound = (q3 + 1.5 * iqr)[grouping.codes]
+    enough = (grouping.counts >= MIN_OUTLIER_VALUES)[grouping.codes]
+    mask = enough & ((values < lower_bound) | (values > upper_bound))
+
+    # Keep the input order of the outliers within each group
+    rows = np.flatnonzero(mask)
+    rows = rows[np.argsort(grouping.codes[rows], kind="stable")]
+    per_group = np.bincount(grouping.codes[rows], minlength=len(grouping))
+    split: List[np.ndarray] = np.split(values[rows], np.cumsum(per_group)[:-1])
+    return split
@@ -0,0 +1,156 @@
+from datetime import date
+from typing import TYPE_CHECKING, Dict, Tuple
+
+import numpy as np
+
+from app import parallel
+
+if TYPE_CHECKING:
+    from app.columnar import EventColumns
+
+# numpy unit each time_format truncates dates to
+TIME_BUCKET_UNITS = {"year": "Y", "month": "M", "day": "D"}
+
+
+def _two_digit_table() -> np.ndarray:
+    # Maps a big-endian pair of ASCII bytes to its value 0-99, or 255 if not two digits
+    table = np.full(1 << 16, 255, dtype=np.int32)
+    digits = np.arange(ord("0"), ord("9") + 1)
+    table[(digits[:, None] << 8) + digits[None, :]] = np.arange(100).reshape(10, 10)
+    return table
+
+
+_TWO_DIGITS = _two_digit_table()
+
+# "YYYY-MM-DD" viewed as fields of two-byte digit pairs and one-byte separators
+_ISO_DATE = np.dtype({
+    "names": ["century", "year", "dash1", "month", "dash2", "day"],
+    "formats": [">u2", ">u2", "u1", ">u2", "u1", ">u2"],
+    "offsets": [0, 2, 4, 5, 7, 8],
+    "itemsize": 10,
+})
+
+
+def parse_dates(timestamps: np.ndarray, strict: bool = True) -> np.ndarray:
+    """Parse a column of ISO 8601 timestamps into ``datetime64[D]`` in one pass.
+
+    Only the date part counts; times and offsets are ignored as before. Canonical
+    ``YYYY-MM-DD...`` values are decoded with table lookups over the raw bytes,
+    anything else (e.g. ``20230601``) goes through ``date.fromisoformat`` row by
+    row, which also raises for invalid dates, or leaves them NaT unless ``strict``.
+    """
+    if timestamps.dtype.kind == "M":
+        return timestamps.astype("datetime64[D]")
+
+    fields = timestamps.astype("S10").view(_ISO_DATE)
+    century = _TWO_DIGITS[fields["century"]]
+    year = _TWO_DIGITS[fields["year"]]
+    month = _TWO_DIGITS[fields["month"]]
+    day = _TWO_DIGITS[fields["day"]]
+    valid = (
+        (fields["dash1"] == ord("-")) & (fields["dash2"] == ord("-"))
+        & (century < 100) & (year < 100) & (month >= 1) & (month <= 12) & (day >= 1)
+    )
+
+    dates = np.full(len(timestamps), np.datetime64("NaT"), dtype="datetime64[D]")
+    if valid.any():
+        months = (century * 100 + year - 1970) * 12 + month - 1
+        if not valid.all():
+            # Point rows left to the row parser at a real month so the lookups stay in range
+            months = np.where(valid, months, months[valid][0])
+        first = int(months.min())
+        # Day numbers of every month start in range, with one extra for the last month's length
+        month_starts = np.arange(first, int(months.max()) + 2).astype("datetime64[M]").astype("datetime64[D]")
+        start_days = month_starts.astype(np.int64)
+        valid &= day <= np.diff(start_days)[months - first]
+        days = (start_days[months - first] + day - 1).view("datetime64[D]")
+        dates = np.where(valid, days, dates)
+
+    odd = np.flatnonzero(~valid)
+    if len(odd):
+        parse = _iso_date if strict else _iso_date_or_nat
+        dates[odd] = [parse(timestamp) for timestamp in timestamps[odd]]
+    return dates
+
+
+def _iso_date(timestamp: object) -> date:
+    return date.fromisoformat(str(timestamp).split("T")[0])
+
+
+def _iso_date_or_nat(timestamp: object) -> object:
+    try:
+        return _iso_date(timestamp)
+    except ValueError:
+        return np.datetime64("NaT")
+
+
+def count_timestamps(columns: "EventColumns", time_format: str) -> Dict[str, int]:
+    """Count the present timestamps of ``columns`` per year, month or day bucket.
+
+    Timestamps that are not ISO dates are counted in a day bucket keyed by the text
+    before ``T``, as they were before timestamps were parsed, whatever the other rows
+    hold; year and month buckets raise for them.
+    """
+    try:
+        dates, present = columns.dates()
+    except ValueError:
+        if time_format != "day":
+            raise
+        timestamps, present = columns.timestamps()
+        timestamps = timestamps[present]
+        dates = parse_dates(timestamps, strict=False)
+        parsed = ~np.isnat(dates)
+        counts = count_time_buckets(dates[parsed], time_format)
+        for key, count in day_prefix_counts(timestamps[~parsed]).items():
+            counts[key] = counts.get(key, 0) + count
+        return counts
+    return count_time_buckets(dates[present], time_format)
+
+
+def day_prefix_counts(timestamps: np.ndarray) -> Dict[str, int]:
+    """Count timestamp strings by the unparsed text before ``T``."""
+    if not len(timestamps):
+        return {}
+    prefixes = np.char.partition(timestamps.astype(str), "T")[:, 0]
+    keys, counts = np.unique(prefixes, return_counts=True)
+    return dict(zip(keys.tolist(), counts.tolist()))
+
+
+def count_time_buckets(dates: np.ndarray, time_format: str) -> Dict[str, int]:
+    """Count ``datetime64`` dates per year, month or day bucket."""
+    _bucket_unit(time_format)
+    return fold_day_counts(*day_counts(dates), time_format)
+
+
+def day_counts(dates: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+    """The distinct days among ``dates`` (``datetime64[D]``, ascending) and how often each occurs."""
+    if not len(dates):
+        return np.zeros(0, dtype="datetime64[D]"), np.zeros(0, dtype=np.int64)
+    days = dates.astype("datetime64[D]", copy=False).astype(np.int64)
+    first = days.min()
+    per_day = parallel.bincount(days - first, workers=parallel.workers_for(len(days)))
+    filled = np.flatnonzero(per_day)
+    return (filled + first).astype("datetime64[D]"), per_day[filled].astype(np.int64)
+
+
+def fold_day_counts(days: np.ndarray, counts: np.ndarray, time_format: str) -> Dict[str, int]:
+    """Add up per-day counts into year, month or day buckets keyed by their ISO prefix."""
+    unit = _bucket_unit(time_format)
+    if not len(days):
+        return {}
+    keys, inverse = np.unique(days.astype(f"datetime64[{unit}]"), return_inverse=True)
+    totals = np.bincount(inverse, weights=counts).astype(np.int64)
+    return dict(zip(np.datetime_as_string(keys).tolist(), totals.tolist()))
+
+
+def _bucket_unit(time_format: str) -> str:
+    unit = TIME_BUCKET_UNITS.get(time_format)
+    if unit is None:
+        raise ValueError("Invalid time_format: Must be 'year', 'month', or 'day'")
+    return unit
+
+
+def timestamp_years(dates: np.ndarray) -> np.ndarray:
+    # Calendar year of each date, as a regression feature
+    years: np.ndarray = dates.astype("datetime64[Y]").astype(float) + 1970
+    return years
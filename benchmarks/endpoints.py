@@ -0,0 +1,426 @@
+"""Latency, throughput and memory of every route at several dataset sizes.
+
+Each size's synthetic dataset is sent to every analytics route ``--repeat`` times,
+in process through the ASGI app and over HTTP to a uvicorn server, and the latency
+percentiles, rows per second (at the median latency) and the server's peak RSS
+while serving the route are reported. Requests send ``Cache-Control: no-cache`` so
+the result cache never answers them.
+
+``--body`` picks how events travel: ``json`` sends them inline, as clients do by
+default, ``dataset`` uploads them once through POST /datasets and sends the
+``dataset_id`` and ``arrow`` sends an Arrow IPC body. ``--offload-workers`` runs the
+server with each given number of offload workers, defaulting to the server's own
+``ANALYTICS_OFFLOAD_WORKERS``; e.g. ``--body json dataset --offload-workers 0 2``
+measures inline JSON and stored datasets with offloading off and on. Several
+values of either run every combination.
+
+``--save-baseline`` writes the results as JSON and ``--compare`` checks them against
+such a file, exiting with status 1 when a median latency got slower by more than
+``--tolerance``.
+
+Peak RSS is that of the server process; requests offloaded to worker processes
+do not count towards it.
+
+Besides the analytics routes, the session routes read a session holding the
+dataset's events, and the DELETE routes remove a dataset or session created
+before each request, untimed. Admin routes are sent with a bearer token, the
+server's ``ANALYTICS_ADMIN_TOKEN`` or a generated one. Not covered: POST /datasets
+beyond ``upload dataset`` with ``dataset`` bodies; ``/admin/profiles/{id}`` and its
+``/pstats`` download, which need a recorded profile and so profiling turned on for
+the benchmarked requests; and deleting models, which have no route.
+
+Usage: python -m benchmarks.endpoints [--sizes 1000 100000 1000000] [--transports inprocess http]
+       [--body json ...] [--offload-workers N ...] [--repeat 5] [--routes /summary ...]
+       [--save-baseline FILE] [--compare FILE]
+"""
+import argparse
+import json
+import os
+import platform
+import resource
+import secrets
+import socket
+import subprocess
+import sys
+import time
+from datetime import datetime, timezone
+from typing import Any, Dict, List, NamedTuple, Optional, Tuple
+
+import httpx
+import numpy as np
+
+from app import config
+from benchmarks.datasets import arrow_stream, events, generate_columns
+
+
+class Route(NamedTuple):
+    name: str
+    method: str
+    path: str  # May name the benchmark's {dataset_id} or {session_id}
+    params: Dict[str, Any]
+    sends: str = "dataset"  # The dataset per --body, "events" as JSON, or "params" alone
+    fresh: bool = False  # Create the dataset or session the path names before each request
+
+
+AGGREGATE = {"group_by_attribute": "suburb", "value_attribute": "price"}
+SESSION = {"value_attribute": "price", "group_by_attribute": "suburb"}
+
+ROUTES = [
+    Route("predict", "POST", "/predict", {"x_attribute": "land_size", "y_attribute": "price", "x_values": [300, 600, 900]}),
+    Route("average-by-attribute", "POST", "/average-by-attribute", AGGREGATE),
+    Route("median-by-attribute", "POST", "/median-by-attribute", AGGREGATE),
+    Route("median-by-attribute approximate", "POST", "/median-by-attribute", {**AGGREGATE, "approximate": True}),
+    Route("highest-value", "POST", "/highest-value", {"attribute_name": "price"}),
+    Route("lowest-value", "POST", "/lowest-value", {"attribute_name": "price"}),
+    Route("median-value", "POST", "/median-value", {"attribute_name": "price"}),
+    Route("predict-future-values", "POST", "/predict-future-values", {"value_attribute": "price", "time_points": [2025, 2026]}),
+    Route("outliers", "POST", "/outliers", {"value_attribute": "price"}),
+    Route("count-by-time", "POST", "/count-by-time", {"time_format": "month"}),
+    Route("min-max-by-attribute", "POST", "/min-max-by-attribute", AGGREGATE),
+    Route("summary", "POST", "/summary", {"value_attribute": "price", "group_by_attributes": ["suburb", "bedrooms"]}),
+    Route("rolling", "POST", "/rolling", {"value_attribute": "price", "time_bucket": "week", "window": 4, "statistics": ["mean", "max", "median"]}),
+    Route("batch", "POST", "/batch", {"operations": [
+        {"operation": "average-by-attribute", "parameters": AGGREGATE},
+        {"operation": "median-by-attribute", "parameters": AGGREGATE},
+        {"operation": "min-max-by-attribute", "parameters": AGGREGATE},
+        {"operation": "median-value", "parameters": {"attribute_name": "price"}},
+        {"operation": "outliers", "parameters": {"value_attribute": "price"}},
+        {"operation": "count-by-time", "parameters": {"time_format": "month"}},
+    ]}),
+    Route("session create", "POST", "/sessions", SESSION, "params"),
+    Route("session summary", "GET", "/sessions/{session_id}", {}),
+    Route("session average-by-attribute", "GET", "/sessions/{session_id}/average-by-attribute", {}),
+    Route("session count-by-time", "GET", "/sessions/{session_id}/count-by-time", {"time_format": "month"}),
+    Route("session predict-future-values", "GET", "/sessions/{session_id}/predict-future-values", {"time_points": [2025, 2026]}),
+    # After the reads, so they see the dataset's events once
+    Route("session append events", "POST", "/sessions/{session_id}/events", {}, "events"),
+    Route("cache statistics", "GET", "/cache", {}),
+    Route("metrics", "GET", "/metrics", {}),
+    Route("profiles", "GET", "/admin/profiles", {}),
+    Route("delete session", "DELETE", "/sessions/{session_id}", {}, fresh=True),
+    Route("delete dataset", "DELETE", "/datasets/{dataset_id}", {}, fresh=True),
+    Route("health check", "GET", "/", {}),
+]
+
+NO_CACHE = {"cache-control": "no-cache"}
+
+# Sent with every request, for the admin routes
+ADMIN_TOKEN = config.ADMIN_TOKEN or secrets.token_hex(16)
+ADMIN = {"authorization": f"Bearer {ADMIN_TOKEN}"}
+
+
+class Result(NamedTuple):
+    transport: str
+    body: str
+    rows: int
+    route: str
+    status: int
+    p50_ms: float
+    p90_ms: float
+    p99_ms: float
+    rows_per_second: float
+    peak_rss_mb: float
+    offload_workers: int = 0  # Missing from baselines saved before it was recorded
+
+    @property
+    def key(self) -> Tuple[str, str, int, str, int]:
+        return self.transport, self.body, self.rows, self.route, self.offload_workers
+
+
+def _peak_rss_mb(pid: int) -> float:
+    # VmHWM is the resident high-water mark; getrusage is the fallback outside Linux
+    try:
+        with open(f"/proc/{pid}/status") as status:
+            for line in status:
+                if line.startswith("VmHWM:"):
+                    return int(line.split()[1]) / 1024
+    except OSError:
+        pass
+    scale = 1 if sys.platform == "darwin" else 1024
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * scale / 1024 / 1024
+
+
+def _reset_peak_rss(pid: int) -> None:
+    # Writing 5 to clear_refs resets VmHWM on Linux; elsewhere peaks accumulate across routes
+    try:
+        with open(f"/proc/{pid}/clear_refs", "w") as clear_refs:
+            clear_refs.write("5")
+    except OSError:
+        pass
+
+
+class Transport:
+    name = ""
+    pid = 0
+    offload_workers = 0
+
+    def request(self, method: str, path: str, **kwargs: Any) -> httpx.Response:
+        raise NotImplementedError
+
+    def close(self) -> None:
+        pass
+
+
+class InProcess(Transport):
+    """Calls the ASGI app in this process; no sockets or server loop involved."""
+
+    name = "inprocess"
+
+    def __init__(self, offload_workers: int) -> None:
+        from fastapi.testclient import TestClient
+
+        from app.main import app, offload
+
+        self.pid = os.getpid()
+        self.offload = offload
+        self.offload_workers = offload.workers = offload_workers
+        self.admin_token, config.ADMIN_TOKEN = config.ADMIN_TOKEN, ADMIN_TOKEN
+        self.client = TestClient(app, headers=ADMIN)
+        self.client.__enter__()
+
+    def request(self, method: str, path: str, **kwargs: Any) -> httpx.Response:
+        return self.client.request(method, path, **kwargs)
+
+    def close(self) -> None:
+        self.client.__exit__(None, None, None)
+        self.offload.shutdown()
+        self.offload.workers = config.OFFLOAD_WORKERS
+        config.ADMIN_TOKEN = self.admin_token
+
+
+class OverHTTP(Transport):
+    """Starts ``uvicorn app.main:app`` on a free local port and talks to it over TCP."""
+
+    name = "http"
+
+    def __init__(self, offload_workers: int) -> None:
+        with socket.socket() as probe:
+            probe.bind(("127.0.0.1", 0))
+            port = probe.getsockname()[1]
+        self.offload_workers = offload_workers
+        self.server = subprocess.Popen(
+            [sys.executable, "-m", "uvicorn", "app.main:app", "--port", str(port), "--log-level", "warning"],
+            env={**os.environ, "ANALYTICS_OFFLOAD_WORKERS": str(offload_workers), "ANALYTICS_ADMIN_TOKEN": ADMIN_TOKEN},
+        )
+        self.pid = self.server.pid
+        self.client = httpx.Client(base_url=f"http://127.0.0.1:{port}", headers=ADMIN, timeout=None)
+        deadline = time.monotonic() + 30
+        while True:
+            try:
+                self.client.get("/")
+                return
+            except httpx.TransportError:
+                if time.monotonic() > deadline or self.server.poll() is not None:
+                    self.close()
+                    raise RuntimeError("uvicorn did not start")
+                time.sleep(0.2)
+
+    def request(self, method: str, path: str, **kwargs: Any) -> httpx.Response:
+        return self.client.request(method, path, **kwargs)
+
+    def close(self) -> None:
+        self.client.close()
+        self.server.terminate()
+        self.server.wait()
+
+
+def _request_arguments(route: Route, body: str, dataset: Dict[str, Any]) -> Dict[str, Any]:
+    """Keyword arguments for ``Transport.request`` sending ``route`` with the dataset."""
+    if route.method != "POST":
+        return {"params": route.params} if route.params else {}
+    if route.sends == "params":
+        return {"json": route.params}
+    if route.sends == "events":
+        return {"content": dataset["json_prefix"] + b'"batch_id":null}', "headers": {"content-type": "application/json"}}
+    if body == "arrow":
+        headers = {**NO_CACHE, "content-type": "application/vnd.apache.arrow.stream"}
+        return {"params": route.params, "content": dataset["arrow"], "headers": headers}
+    if body == "json":
+        # Pre-encode the events so client-side serialization is not timed
+        content = dataset["json_prefix"] + json.dumps(route.params)[1:-1].encode() + b"}"
+        return {"content": content, "headers": {**NO_CACHE, "content-type": "application/json"}}
+    return {"json": {**route.params, "dataset_id": dataset["dataset_id"]}, "headers": NO_CACHE}
+
+
+def _upload(transport: Transport, dataset: Dict[str, Any]) -> httpx.Response:
+    response = transport.request(
+        "POST", "/datasets", content=dataset["upload"], headers={"content-type": "application/vnd.apache.arrow.stream"}
+    )
+    response.raise_for_status()
+    return response
+
+
+def _session(transport: Transport, dataset: Optional[Dict[str, Any]] = None) -> str:
+    """A new session, holding the dataset's events when given."""
+    response = transport.request("POST", "/sessions", json=SESSION)
+    response.raise_for_status()
+    session_id: str = response.json()["session_id"]
+    if dataset is not None:
+        append = _request_arguments(Route("", "POST", "", {}, "events"), "json", dataset)
+        transport.request("POST", f"/sessions/{session_id}/events", **append).raise_for_status()
+    return session_id
+
+
+def _prepare(
+    transport: Transport, body: str, rows: int, seed: int, routes: List[Route]
+) -> Tuple[Dict[str, Any], List[Result]]:
+    """Generate the dataset for ``body`` and the routes; with ``dataset`` bodies also time its upload."""
+    columns = generate_columns(rows, seed=seed)
+    dataset: Dict[str, Any] = {"upload": arrow_stream(columns)}
+    results: List[Result] = []
+    if body == "arrow":
+        dataset["arrow"] = dataset["upload"]
+    if body == "json" or any(route.sends == "events" for route in routes):
+        dataset["json_prefix"] = b'{"data":' + json.dumps(events(columns)).encode() + b","
+    if body == "dataset":
+        _reset_peak_rss(transport.pid)
+        start = time.perf_counter()
+        response = _upload(transport, dataset)
+        seconds = time.perf_counter() - start
+        dataset["dataset_id"] = response.json()["dataset_id"]
+        results.append(_result(transport, body, rows, "upload dataset", response.status_code, [seconds]))
+    if any("{session_id}" in route.path and not route.fresh for route in routes):
+        dataset["session_id"] = _session(transport, dataset)
+    return dataset, results
+
+
+def _result(
+    transport: Transport, body: str, rows: int, route: str, status: int, seconds: List[float], processed: bool = True
+) -> Result:
+    p50, p90, p99 = np.percentile(seconds, [50, 90, 99])
+    throughput = rows / p50 if processed and p50 else 0.0
+    return Result(
+        transport.name, body, rows, route, status, p50 * 1000, p90 * 1000, p99 * 1000, throughput,
+        _peak_rss_mb(transport.pid), transport.offload_workers,
+    )
+
+
+def _path(transport: Transport, route: Route, dataset: Dict[str, Any]) -> str:
+    """``route.path`` with its ids filled in, creating them first for ``fresh`` routes."""
+    if not route.fresh:
+        return route.path.format(**dataset)
+    if "{session_id}" in route.path:
+        return route.path.format(session_id=_session(transport))
+    return route.path.format(dataset_id=_upload(transport, dataset).json()["dataset_id"])
+
+
+def run_route(
+    transport: Transport, route: Route, body: str, rows: int, dataset: Dict[str, Any], repeat: int
+) -> Result:
+    arguments = _request_arguments(route, body, dataset)
+    transport.request(route.method, _path(transport, route, dataset), **arguments)  # warm up
+    _reset_peak_rss(transport.pid)
+    timings = []
+    status = 200
+    for _ in range(repeat):
+        path = _path(transport, route, dataset)
+        start = time.perf_counter()
+        response = transport.request(route.method, path, **arguments)
+        timings.append(time.perf_counter() - start)
+        if response.status_code != 200:
+            status = response.status_code
+    processed = route.method == "POST" and route.sends != "params"
+    return _result(transport, body, rows, route.name, status, timings, processed)
+
+
+def run(
+    transports: List[str], sizes: List[int], bodies: List[str], repeat: int, routes: List[Route], seed: int = 0,
+    offload_workers: Optional[List[int]] = None,
+) -> List[Result]:
+    results: List[Result] = []
+    for transport_name in transports:
+        for workers in offload_workers or [config.OFFLOAD_WORKERS]:
+            transport: Transport = InProcess(workers) if transport_name == "inprocess" else OverHTTP(workers)
+            try:
+                for body in bodies:
+                    for rows in sizes:
+                        results.extend(_run_dataset(transport, body, rows, repeat, routes, seed))
+            finally:
+                transport.close()
+    return results
+
+
+def _run_dataset(transport: Transport, body: str, rows: int, repeat: int, routes: List[Route], seed: int) -> List[Result]:
+    dataset, results = _prepare(transport, body, rows, seed, routes)
+    for result in results:
+        print(_format(result), flush=True)
+    for route in routes:
+        result = run_route(transport, route, body, rows, dataset, repeat)
+        results.append(result)
+        print(_format(result), flush=True)
+    if "dataset_id" in dataset:
+        transport.request("DELETE", f"/datasets/{dataset['dataset_id']}")
+    if "session_id" in dataset:
+        transport.request("DELETE", f"/sessions/{dataset['session_id']}")
+    return results
+
+
+def _format(result: Result) -> str:
+    status = "" if result.status == 200 else f"  status {result.status}"
+    return (
+        f"{result.transport:<9} {result.body:<7} {result.offload_workers:>2} {result.rows:>9,} {result.route:<32} "
+        f"p50 {result.p50_ms:9.1f}ms  p90 {result.p90_ms:9.1f}ms  p99 {result.p99_ms:9.1f}ms  "
+        f"{result.rows_per_second:>13,.0f} rows/s  peak RSS {result.peak_rss_mb:7.1f} MB{status}"
+    )
+
+
+def save_baseline(path: str, results: List[Result]) -> None:
+    meta = {
+        "created": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+        "python": platform.python_version(),
+        "machine": platform.machine(),
+        "cpus": os.cpu_count(),
+    }
+    with open(path, "w") as baseline:
+        json.dump({"meta": meta, "results": [result._asdict() for result in results]}, baseline, indent=2)
+
+
+def compare(path: str, results: List[Result], tolerance: float) -> List[str]:
+    """Descriptions of the results whose median latency regressed past ``tolerance``."""
+    with open(path) as baseline:
+        previous = {Result(**entry).key: Result(**entry) for entry in json.load(baseline)["results"]}
+    regressions = []
+    for result in results:
+        before: Optional[Result] = previous.get(result.key)
+        if before is not None and result.p50_ms > before.p50_ms * (1 + tolerance):
+            regressions.append(
+                f"{' '.join(map(str, result.key))}: p50 {before.p50_ms:.1f}ms -> {result.p50_ms:.1f}ms"
+            )
+    return regressions
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sizes", type=int, nargs="+", default=[1000, 100000, 1000000])
+    parser.add_argument("--transports", nargs="+", choices=["inprocess", "http"], default=["inprocess", "http"])
+    parser.add_argument("--body", nargs="+", choices=["json", "dataset", "arrow"], default=["json"])
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--routes", nargs="+", help="Only these paths, e.g. /summary /outliers")
+    parser.add_argument("--offload-workers", type=int, nargs="+", default=[config.OFFLOAD_WORKERS])
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--save-baseline", metavar="FILE")
+    parser.add_argument("--compare", metavar="FILE")
+    parser.add_argument("--tolerance", type=float, default=0.25, help="Allowed median slowdown, as a fraction")
+    args = parser.parse_args()
+
+    routes = [route for route in ROUTES if not args.routes or route.path in args.routes]
+    print(
+        f"{platform.python_version()} on {platform.machine()}, {os.cpu_count()} CPUs, "
+        f"{'/'.join(args.body)} bodies, {'/'.join(map(str, args.offload_workers))} offload workers"
+    )
+    results = run(args.transports, args.sizes, args.body, args.repeat, routes, args.seed, args.offload_workers)
+
+    if args.save_baseline:
+        save_baseline(args.save_baseline, results)
+        print(f"Saved {len(results)} results to {args.save_baseline}")
+    if args.compare:
+        regressions = compare(args.compare, results, args.tolerance)
+        for regression in regressions:
+            print(f"REGRESSION {regression}")
+        if regressions:
+            sys.exit(1)
+        print(f"No median latency regressed more than {args.tolerance:.0%} against {args.compare}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,65 @@
+"""Speedup of the parallel group-by and reductions per worker count.
+
+Usage: python -m benchmarks.parallel_speedup [--rows 50000000] [--groups 1000] [--workers 1 2 4 8]
+"""
+import argparse
+import os
+import time
+from typing import Callable, Dict, List
+
+import numpy as np
+
+from app import config, parallel
+from app.groupby import GroupBy
+from app.timeseries import count_time_buckets
+
+
+def _best_of(function: Callable[[], object], repeat: int) -> float:
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        function()
+        timings.append(time.perf_counter() - start)
+    return min(timings)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rows", type=int, default=10_000_000)
+    parser.add_argument("--groups", type=int, default=1000)
+    parser.add_argument("--workers", type=int, nargs="+")
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+    cpus = os.cpu_count() or 1
+    worker_counts: List[int] = args.workers or sorted({count for count in (1, 2, 4, 8, cpus) if count <= cpus})
+
+    rng = np.random.default_rng(0)
+    labels = np.char.add("group-", rng.integers(0, args.groups, args.rows).astype(str))
+    values = rng.lognormal(12, 1, args.rows)
+    dates = np.datetime64("2000-01-01") + rng.integers(0, 9000, args.rows).astype("timedelta64[D]")
+    lower, upper = np.percentile(values, [25, 75])
+
+    operations: Dict[str, Callable[[], object]] = {
+        "factorize + mean (average/min-max-by-attribute)": lambda: GroupBy(labels).mean(values),
+        "median by group (median-by-attribute)": lambda: grouping.median(values),
+        "min and max by group": lambda: (grouping.min(values), grouping.max(values)),
+        "count by month (count-by-time)": lambda: count_time_buckets(dates, "month"),
+        "outlier filter (outliers)": lambda: parallel.map_chunks(
+            lambda rows: values[rows][(values[rows] < lower) | (values[rows] > upper)], len(values), config.PARALLEL_WORKERS
+        ),
+    }
+
+    print(f"{args.rows:,} rows, {args.groups:,} groups, {cpus} CPUs")
+    config.PARALLEL_MIN_ROWS = 0
+    baseline: Dict[str, float] = {}
+    for workers in worker_counts:
+        config.PARALLEL_WORKERS = workers
+        grouping = GroupBy(labels)
+        for name, operation in operations.items():
+            seconds = _best_of(operation, args.repeat)
+            baseline.setdefault(name, seconds)
+            print(f"workers={workers:<3} {name:<50} {seconds:8.3f}s  speedup {baseline[name] / seconds:5.2f}x")
+
+
+if __name__ == "__main__":
+    main()
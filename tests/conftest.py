@@ -0,0 +1,9 @@
+import pytest
+from app.main import result_cache
+
+
+@pytest.fixture(autouse=True)
+def no_result_cache(monkeypatch):
+    # Tests repeat identical requests under different settings; only test_cache exercises the cache
+    monkeypatch.setattr(result_cache, "max_bytes", 0)
+    result_cache.clear()
@@ -0,0 +1,115 @@
+import io
+
+import pytest
+from fastapi.testclient import TestClient
+from app.main import app
+
+pa = pytest.importorskip("pyarrow")
+pq = pytest.importorskip("pyarrow.parquet")
+
+client = TestClient(app)
+
+SALES = [
+    {"time_object": {"timestamp": "2020-06-01T00:00:00"}, "event_type": "sale", "attribute": {"suburb": "Balmain", "price": 300000, "sqft": 1500}},
+    {"time_object": {"timestamp": "2021-06-01T00:00:00"}, "event_type": "sale", "attribute": {"suburb": "Balmain", "price": 350000, "sqft": 1700}},
+    {"time_object": {"timestamp": "2022-03-01T00:00:00"}, "event_type": "sale", "attribute": {"suburb": "Rhodes", "price": 400000, "sqft": 2000}},
+    {"time_object": {"timestamp": "2022-06-01T00:00:00"}, "event_type": "sale", "attribute": {"suburb": "Rhodes", "price": 4500000, "sqft": 2600}},
+    {"time_object": {"timestamp": None}, "event_type": "sale", "attribute": {"suburb": "Rhodes", "price": None, "sqft": None}}
+]
+
+
+def sales_table(timestamp_type):
+    timestamps = [event["time_object"]["timestamp"] for event in SALES]
+    if timestamp_type != "string":
+        timestamps = pa.array(timestamps).cast(timestamp_type)
+    return pa.table({
+        "timestamp": timestamps,
+        "event_type": [event["event_type"] for event in SALES],
+        "suburb": pa.array([event["attribute"]["suburb"] for event in SALES]).dictionary_encode(),
+        "price": pa.array([event["attribute"]["price"] for event in SALES], type=pa.int64()),
+        "sqft": pa.array([event["attribute"]["sqft"] for event in SALES], type=pa.float64()),
+    })
+
+
+def arrow_stream(table):
+    sink = io.BytesIO()
+    with pa.ipc.new_stream(sink, table.schema) as writer:
+        writer.write_table(table)
+    return sink.getvalue()
+
+
+def parquet_file(table):
+    sink = io.BytesIO()
+    pq.write_table(table, sink)
+    return sink.getvalue()
+
+
+CASES = [
+    ("/count-by-time", {"time_format": "month"}),
+    ("/highest-value", {"attribute_name": "price"}),
+    ("/average-by-attribute", {"group_by_attribute": "suburb", "value_attribute": "price"}),
+    ("/median-by-attribute", {"group_by_attribute": "suburb", "value_attribute": "price"}),
+    ("/outliers", {"value_attribute": "price"}),
+    ("/predict", {"x_attribute": "sqft", "y_attribute": "price", "x_values": [1800]}),
+    ("/predict-future-values", {"value_attribute": "price", "time_points": [2024]}),
+]
+
+
+@pytest.mark.parametrize("path, params", CASES)
+@pytest.mark.parametrize("media_type, encode, timestamp_type", [
+    ("application/vnd.apache.arrow.stream", arrow_stream, "string"),
+    ("application/vnd.apache.parquet", parquet_file, "timestamp"),
+])
+def test_columnar_body_matches_json(path, params, media_type, encode, timestamp_type):
+    if timestamp_type == "timestamp":
+        timestamp_type = pa.timestamp("ms")
+    response = client.post(path, params=params, content=encode(sales_table(timestamp_type)), headers={"content-type": media_type})
+    expected = client.post(path, json={**params, "data": SALES})
+    assert response.status_code == 200
+    assert response.json() == expected.json()
+
+
+def test_upload_arrow_dataset():
+    body = arrow_stream(sales_table("string"))
+    response = client.post("/datasets", content=body, headers={"content-type": "application/vnd.apache.arrow.stream"})
+    assert response.status_code == 200
+    assert response.json()["rows"] == 5
+
+    lowest = client.post("/lowest-value", json={"attribute_name": "price", "dataset_id": response.json()["dataset_id"]})
+    assert lowest.json() == {"lowest_value": 300000}
+
+
+def test_invalid_arrow_body():
+    response = client.post("/highest-value", params={"attribute_name": "price"}, content=b"not arrow", headers={"content-type": "application/vnd.apache.arrow.stream"})
+    assert response.status_code == 400
+
+
+@pytest.mark.parametrize("unit", ["ms", "us", "ns"])
+def test_sub_second_timestamps_and_nullable_booleans(unit):
+    # As pandas writes them: nanosecond timestamps with fractions of a second, nullable flags
+    table = sales_table("string").drop(["timestamp"]).append_column(
+        "timestamp", pa.array(["2020-06-01T10:00:00.25", "2021-06-01T00:00:00.5", "2022-03-01", "2022-06-01T23:59:59.999", None]).cast(pa.timestamp(unit))
+    ).append_column("garage", pa.array([True, None, False, True, None]))
+    body = parquet_file(table)
+    headers = {"content-type": "application/vnd.apache.parquet"}
+
+    response = client.post("/count-by-time", params={"time_format": "day"}, content=body, headers=headers)
+    assert response.status_code == 200
+    assert response.json() == {"counts_by_time": {"2020-06-01": 1, "2021-06-01": 1, "2022-03-01": 1, "2022-06-01": 1}}
+
+    response = client.post("/average-by-attribute", params={"group_by_attribute": "garage", "value_attribute": "price"}, content=body, headers=headers)
+    assert response.status_code == 200
+    assert response.json() == {"average_values": {"True": 2400000.0, "False": 400000.0}}
+
+
+def test_unread_columns_are_not_decoded():
+    # numpy has no nanosecond time of day, so this column cannot be decoded
+    table = sales_table("string").append_column("opened_at", pa.array([1, 2, 3, 4, 5], type=pa.time64("ns")))
+    body = arrow_stream(table)
+    headers = {"content-type": "application/vnd.apache.arrow.stream"}
+    response = client.post("/highest-value", params={"attribute_name": "price"}, content=body, headers=headers)
+    assert response.json() == {"highest_value": 4500000}
+
+    response = client.post("/highest-value", params={"attribute_name": "opened_at"}, content=body, headers=headers)
+    assert response.status_code == 400
+    assert response.json()["detail"].startswith("Column 'opened_at' cannot be read")
@@ -0,0 +1,75 @@
+from fastapi.testclient import TestClient
+from app.columnar import EventColumns
+from app.groupby import GroupBy
+from app.main import app
+
+client = TestClient(app)
+
+SALES = [
+    {"time_object": {"timestamp": f"202{index % 4}-0{index % 9 + 1}-01"}, "event_type": "sale",
+     "attribute": {"suburb": ["Balmain", "Rhodes", "Glebe"][index % 3], "bedrooms": index % 4 + 1,
+                   "land_size": 200 + index * 3, "price": 300000 + (index * 7919) % 90000}}
+    for index in range(200)
+]
+
+OPERATIONS = [
+    ("predict", {"x_attribute": "land_size", "y_attribute": "price", "x_values": [300, 600]}),
+    ("average-by-attribute", {"group_by_attribute": "suburb", "value_attribute": "price"}),
+    ("median-by-attribute", {"group_by_attribute": "suburb", "value_attribute": "price"}),
+    ("highest-value", {"attribute_name": "price"}),
+    ("lowest-value", {"attribute_name": "price"}),
+    ("median-value", {"attribute_name": "price"}),
+    ("predict-future-values", {"value_attribute": "price", "time_points": [2025]}),
+    ("outliers", {"value_attribute": "price"}),
+    ("count-by-time", {"time_format": "month"}),
+    ("min-max-by-attribute", {"group_by_attribute": "suburb", "value_attribute": "price"}),
+    ("summary", {"value_attribute": "price", "group_by_attributes": ["suburb", "bedrooms"]}),
+    ("rolling", {"value_attribute": "price", "time_bucket": "month", "window": 3, "statistics": ["mean", "median"]}),
+]
+
+
+def test_batch_matches_individual_requests():
+    response = client.post("/batch", json={
+        "data": SALES,
+        "operations": [{"operation": name, "parameters": parameters} for name, parameters in OPERATIONS],
+    })
+    assert response.status_code == 200
+    results = response.json()["results"]
+    assert [result["operation"] for result in results] == [name for name, _ in OPERATIONS]
+    for (name, parameters), result in zip(OPERATIONS, results):
+        assert result["status_code"] == 200, result
+        assert result["result"] == client.post(f"/{name}", json={"data": SALES, **parameters}).json(), name
+
+
+def test_batch_over_uploaded_dataset():
+    dataset_id = client.post("/datasets", json={"data": SALES}).json()["dataset_id"]
+    response = client.post("/batch", json={
+        "dataset_id": dataset_id, "operations": [{"operation": "median-value", "parameters": {"attribute_name": "price"}}],
+    })
+    expected = client.post("/median-value", json={"data": SALES, "attribute_name": "price"}).json()
+    assert response.json()["results"][0]["result"] == expected
+
+
+def test_failed_operations_do_not_fail_the_batch():
+    results = client.post("/batch", json={"data": SALES, "operations": [
+        {"operation": "mode"},
+        {"operation": "outliers", "parameters": {}},
+        {"operation": "outliers", "parameters": {"value_attribute": "price", "data": []}},
+        {"operation": "count-by-time", "parameters": {"time_format": "week"}},
+        {"operation": "highest-value", "parameters": {"attribute_name": "price"}},
+    ]}).json()["results"]
+    assert [result["status_code"] for result in results] == [400, 422, 400, 400, 200]
+    assert results[1]["detail"][0]["loc"] == ["value_attribute"]
+    assert results[3]["detail"] == "Invalid time_format: Must be 'year', 'month', or 'day'"
+    assert client.post("/batch", json={"data": SALES, "operations": []}).status_code == 422
+
+
+def test_sharing_view_reuses_intermediates():
+    columns = EventColumns.from_events(SALES)
+    first, _ = GroupBy.from_columns(columns, "suburb", "price")
+    assert GroupBy.from_columns(columns, "suburb", "price")[0] is not first
+
+    shared = columns.sharing()
+    first, _ = GroupBy.from_columns(shared, "suburb", "price")
+    assert GroupBy.from_columns(shared, "suburb", "price")[0] is first
+    assert GroupBy.from_columns(columns.sharing(), "suburb", "price")[0] is not first
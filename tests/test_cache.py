@@ -0,0 +1,90 @@
+import pytest
+from fastapi.testclient import TestClient
+from app.cache import ResultCache
+from app.main import app, model_store, result_cache
+
+client = TestClient(app)
+
+SALES = [
+    {"time_object": {"timestamp": "2023-06-01T00:00:00"}, "event_type": "sale", "attribute": {"suburb": "Balmain", "price": 500000}},
+    {"time_object": {"timestamp": "2023-07-01T00:00:00"}, "event_type": "sale", "attribute": {"suburb": "Rhodes", "price": 300000}},
+]
+
+
+@pytest.fixture
+def cache(monkeypatch):
+    monkeypatch.setattr(result_cache, "max_bytes", 1024 * 1024)
+    monkeypatch.setattr(result_cache, "hits", 0)
+    monkeypatch.setattr(result_cache, "misses", 0)
+    return result_cache
+
+
+def test_identical_requests_hit_the_cache(cache):
+    body = {"group_by_attribute": "suburb", "value_attribute": "price", "data": SALES}
+    first = client.post("/average-by-attribute", json=body)
+    second = client.post("/average-by-attribute", json=body)
+    assert first.headers["x-cache"] == "MISS"
+    assert second.headers["x-cache"] == "HIT"
+    assert second.headers["age"] == "0"
+    assert second.json() == first.json()
+
+    # Errors are never cached
+    for _ in range(2):
+        assert client.post("/average-by-attribute", json={**body, "value_attribute": "missing"}).status_code == 400
+
+    refreshed = client.post("/average-by-attribute", json=body, headers={"cache-control": "no-cache"})
+    assert refreshed.headers["x-cache"] == "MISS"
+    assert client.get("/cache").json()["hits"] == 1
+
+
+def test_query_order_does_not_matter_and_ndjson_bypasses(cache):
+    first = client.post("/count-by-time?time_format=month&dataset_id=x", json={"data": SALES})
+    second = client.post("/count-by-time?dataset_id=x&time_format=month", json={"data": SALES})
+    assert second.headers["x-cache"] == "HIT"
+    assert second.json() == first.json()
+
+    ndjson = "\n".join('{"time_object": {"timestamp": "2023-06-01"}, "event_type": "sale", "attribute": {}}' for _ in range(2))
+    response = client.post("/count-by-time", content=ndjson, headers={"content-type": "application/x-ndjson"})
+    assert response.headers["x-cache"] == "BYPASS"
+
+
+def test_deleting_a_dataset_clears_results(cache):
+    dataset_id = client.post("/datasets", json={"data": SALES}).json()["dataset_id"]
+    assert "x-cache" not in client.post("/datasets", json={"data": SALES}).headers
+    body = {"dataset_id": dataset_id, "attribute_name": "price"}
+    assert client.post("/highest-value", json=body).headers["x-cache"] == "MISS"
+    assert client.post("/highest-value", json=body).headers["x-cache"] == "HIT"
+
+    client.delete(f"/datasets/{dataset_id}")
+    assert client.post("/highest-value", json=body).status_code == 404
+
+
+def test_evicted_models_are_not_answered_from_the_cache(cache):
+    fitted = client.post("/predict", json={"x_attribute": "price", "y_attribute": "price", "x_values": [1], "data": SALES})
+    body = {"model_id": fitted.json()["model_id"], "x_values": [2]}
+    assert client.post("/predict", json=body).headers["x-cache"] == "MISS"
+    assert client.post("/predict", json=body).headers["x-cache"] == "HIT"
+
+    model_store.clear()
+    assert client.post("/predict", json=body).status_code == 404
+
+
+def test_ttl_and_lru_bounds(monkeypatch):
+    cache = ResultCache(max_bytes=10, ttl=30)
+    cache.put("a", b"12345", "application/json")
+    cache.put("b", b"12345", "application/json")
+    assert cache.get("a") is not None
+    cache.put("c", b"123", "application/json")
+    assert cache.get("b") is None
+    assert cache.get("a") is not None and cache.get("c") is not None
+    assert cache.nbytes == 8
+    assert cache.evictions == 1
+
+    cache.put("huge", b"x" * 11, "application/json")
+    assert cache.get("huge") is None
+
+    stored_at = cache.get("a").stored_at
+    monkeypatch.setattr("app.cache.time.monotonic", lambda: stored_at + 31)
+    assert cache.get("a") is None
+    assert cache.stats()["hits"] == 4
+    assert cache.stats()["misses"] == 3
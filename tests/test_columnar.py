@@ -0,0 +1,121 @@
+import numpy as np
+from fastapi.testclient import TestClient
+from app.columnar import EventColumns
+from app.groupby import GroupBy
+from app.main import app
+
+client = TestClient(app)
+
+
+def test_columns_extract_only_requested_attributes():
+    columns = EventColumns.from_events([
+        {"time_object": {"timestamp": "2023-06-01"}, "event_type": "sale", "attribute": {"suburb": "Rhodes", "price": "300000", "sqft": 900}},
+        {"time_object": {}, "event_type": "sale", "attribute": {"suburb": "Balmain"}}
+    ], ["price", "suburb"])
+
+    assert set(columns.attributes) == {"price", "suburb"}
+    values, present = columns.numeric("price")
+    assert values.dtype == np.float64
+    assert values[present].tolist() == [300000.0]
+    labels, present = columns.keys("suburb")
+    assert labels[present].tolist() == ["Rhodes", "Balmain"]
+    timestamps, present = columns.timestamps()
+    assert timestamps[present].tolist() == ["2023-06-01"]
+
+
+def test_columns_missing_attribute_is_never_present():
+    columns = EventColumns.from_events([{"time_object": {}, "event_type": "sale", "attribute": {"price": 1}}], ["price"])
+    _, present = columns.numeric("sqft")
+    assert not present.any()
+
+
+def test_malformed_event_is_rejected():
+    response = client.post("/highest-value", json={
+        "attribute_name": "price",
+        "data": [{"time_object": {}, "event_type": "sale"}]
+    })
+    assert response.status_code == 422
+    assert response.json()["detail"][0]["loc"] == ["body", "data", 0, "attribute"]
+
+
+def test_non_numeric_value_is_rejected():
+    response = client.post("/highest-value", json={
+        "attribute_name": "price",
+        "data": [{"time_object": {}, "event_type": "sale", "attribute": {"price": "expensive"}}]
+    })
+    assert response.status_code == 400
+    assert "could not convert" in response.json()["detail"]
+
+
+MIXED = [
+    {"time_object": {"timestamp": f"2023-0{index % 9 + 1}-01T10:00:00"}, "event_type": "sale" if index % 3 else "rent",
+     "attribute": {**attribute, "note": f"n{index}"}}
+    for index, attribute in enumerate(2 * [
+        {"suburb": "Rhodes", "rooms": 2, "price": 300000.5, "code": 1, "flag": True, "tags": ["a"]},
+        {"suburb": "Balmain", "rooms": 3, "price": 350000.0, "code": "1", "flag": False, "tags": ["b"]},
+        {"suburb": "Rhodes", "price": 410000.0, "code": 1.5},
+        {"suburb": "Glebe", "rooms": 300, "price": 400000.0, "code": 1, "flag": True},
+        {"rooms": 2, "price": None, "code": "2"},
+        {"suburb": "Rhodes", "rooms": 4, "price": 500000.0, "code": "2", "flag": False},
+    ])
+]
+
+
+def test_compact_columns_match_object_columns():
+    columns = EventColumns.from_events(MIXED)
+    compact = EventColumns.from_events(MIXED).compact()
+
+    assert compact.attributes["rooms"].dtype == np.int16
+    assert compact.attributes["price"].dtype == np.float64
+    assert compact.attributes["flag"].dtype == np.bool_
+    assert set(compact.dictionaries) == {"suburb", "code"}
+    # Unhashable and mostly distinct values stay as they were
+    assert compact.attributes["tags"].dtype == object and compact.attributes["note"].dtype == object
+    assert compact.timestamp_raw.dtype == "datetime64[D]"
+    assert compact.nbytes < columns.nbytes
+
+    for name in ("suburb", "rooms", "price", "code", "flag", "note", "missing"):
+        labels, present = columns.keys(name)
+        compact_labels, compact_present = compact.keys(name)
+        assert compact_present.tolist() == present.tolist()
+        assert compact_labels[present].tolist() == labels[present].tolist()
+    for name in ("rooms", "price", "code", "flag"):
+        values, present = columns.numeric(name)
+        compact_values, compact_present = compact.numeric(name)
+        assert compact_present.tolist() == present.tolist()
+        assert compact_values[present].tolist() == values[present].tolist()
+    assert compact.dates()[0].tolist() == columns.dates()[0].tolist()
+
+
+def test_compact_grouping_matches_labels():
+    compact = EventColumns.from_events(MIXED).compact()
+    rows = compact.present("code") & (compact.attributes["rooms"] != 3)
+    grouping = GroupBy.from_attribute(compact, "code", rows)
+    expected = GroupBy(EventColumns.from_events(MIXED).keys("code")[0][rows])
+    assert grouping.groups.tolist() == expected.groups.tolist() == ["1", "1.5", "2"]
+    assert grouping.codes.tolist() == expected.codes.tolist()
+
+
+def test_compact_types_mixed_ints_and_floats():
+    # JSON prices mix ints and floats and are mostly distinct, with a few missing
+    events = [
+        {"time_object": {}, "event_type": "sale", "attribute": {"price": index if index % 2 else index + 0.5} if index % 10 else {}}
+        for index in range(1000)
+    ]
+    columns = EventColumns.from_events(events)
+    compact = EventColumns.from_events(events).compact()
+    assert compact.attributes["price"].dtype.kind == "u"
+    assert compact.dictionaries["price"][:2].tolist() == [1, 2.5]
+    values, present = columns.numeric("price")
+    compact_values, compact_present = compact.numeric("price")
+    assert compact_present.tolist() == present.tolist()
+    assert compact_values[present].tolist() == values[present].tolist()
+    labels, _ = columns.keys("price")
+    assert compact.keys("price")[0][present].tolist() == labels[present].tolist()
+    assert labels[1:3].tolist() == ["1", "2.5"]
+
+
+def test_compact_keeps_unparseable_timestamps():
+    events = [{"time_object": {"timestamp": "not a date"}, "event_type": "sale", "attribute": {"price": 1}}]
+    compact = EventColumns.from_events(events).compact()
+    assert compact.timestamp_raw.tolist() == ["not a date"]
@@ -0,0 +1,105 @@
+import gzip
+import json
+import sys
+
+import numpy as np
+import zstandard
+from fastapi.testclient import TestClient
+from app import config
+from app.compression import negotiate
+from app.main import app
+from app.responses import dumps
+
+client = TestClient(app)
+
+SALES = [
+    {"time_object": {"timestamp": f"2023-0{index % 9 + 1}-01"}, "event_type": "sale",
+     "attribute": {"suburb": f"suburb-{index % 150}", "price": 300000 + (index * 7919) % 200000}}
+    for index in range(600)
+]
+BODY = {"group_by_attribute": "suburb", "value_attribute": "price", "data": SALES}
+
+
+def test_dumps_writes_numpy_and_integer_keys():
+    content = {"values": np.array([1.5, 2.0]), "counts": np.arange(3)[::2], 3: np.float64(np.nan)}
+    assert json.loads(dumps(content)) == {"values": [1.5, 2.0], "counts": [0, 2], "3": None}
+
+
+def test_dumps_without_orjson_writes_non_finite_floats_as_null(monkeypatch):
+    monkeypatch.setitem(sys.modules, "orjson", None)
+    content = {"values": np.array([1.5, np.nan]), 3: np.float64(np.inf), "nested": [{"mean": float("-inf")}, (np.float32(0.5),)]}
+    body = dumps(content)
+    assert b"NaN" not in body and b"Infinity" not in body
+    assert json.loads(body) == {"values": [1.5, None], "3": None, "nested": [{"mean": None}, [0.5]]}
+
+
+def test_negotiate_prefers_zstd_and_honours_weights():
+    assert negotiate("gzip, deflate, zstd") == "zstd"
+    assert negotiate("gzip, zstd;q=0.5") == "gzip"
+    assert negotiate("*") == "zstd"
+    assert negotiate("gzip;q=0, br") is None
+    assert negotiate("") is None
+
+
+def test_large_responses_are_compressed_when_accepted():
+    plain = client.post("/average-by-attribute", json=BODY, headers={"accept-encoding": "identity"})
+    assert "content-encoding" not in plain.headers
+    assert plain.headers["vary"] == "Accept-Encoding"
+
+    for encoding in ("gzip", "zstd"):
+        compressed = client.post("/average-by-attribute", json=BODY, headers={"accept-encoding": encoding})
+        assert compressed.headers["content-encoding"] == encoding
+        assert int(compressed.headers["content-length"]) < len(plain.content)
+        assert compressed.headers["etag"] == plain.headers["etag"][:-1] + f'-{encoding}"'
+        assert compressed.json() == plain.json()
+
+
+def test_small_responses_are_not_compressed():
+    response = client.post("/highest-value", json={"attribute_name": "price", "data": SALES[:3]},
+                           headers={"accept-encoding": "gzip"})
+    assert "content-encoding" not in response.headers
+
+
+def test_compressed_etag_revalidates():
+    etag = client.post("/average-by-attribute", json=BODY, headers={"accept-encoding": "gzip"}).headers["etag"]
+    revalidated = client.post("/average-by-attribute", json=BODY, headers={"accept-encoding": "gzip", "if-none-match": etag})
+    assert revalidated.status_code == 304
+    assert revalidated.headers["etag"] == etag
+
+
+def test_compressed_request_bodies():
+    expected = client.post("/average-by-attribute", json=BODY).json()
+    raw = json.dumps(BODY).encode()
+    for encoding, body in (("gzip", gzip.compress(raw)), ("zstd", zstandard.ZstdCompressor().compress(raw))):
+        response = client.post("/average-by-attribute", content=body,
+                               headers={"content-type": "application/json", "content-encoding": encoding})
+        assert response.status_code == 200
+        assert response.json() == expected
+
+    ndjson = gzip.compress("\n".join(json.dumps(event) for event in SALES).encode())
+    response = client.post("/average-by-attribute?group_by_attribute=suburb&value_attribute=price", content=ndjson,
+                           headers={"content-type": "application/x-ndjson", "content-encoding": "gzip"})
+    assert response.status_code == 200
+    assert response.json()["average_values"] == expected["average_values"]
+
+
+def test_invalid_request_encodings():
+    headers = {"content-type": "application/json"}
+    unsupported = client.post("/average-by-attribute", content=b"{}", headers={**headers, "content-encoding": "br"})
+    assert unsupported.status_code == 415
+    raw = json.dumps(BODY).encode()
+    for encoding, body in (("gzip", gzip.compress(raw)), ("zstd", zstandard.ZstdCompressor().compress(raw))):
+        invalid = client.post("/average-by-attribute", content=body[:-20], headers={**headers, "content-encoding": encoding})
+        assert invalid.status_code == 400
+        assert invalid.json()["detail"] == "Invalid compressed request body: compressed stream ended early"
+
+
+def test_decompression_bombs_are_refused(monkeypatch):
+    monkeypatch.setattr(config, "MAX_DECOMPRESSED_BYTES", 1 << 20)
+    # About 10 KB that would inflate to 10 MB
+    raw = b'{"attribute_name": "price", "data": [' + b" " * (10 << 20) + b"]}"
+    for encoding, body in (("gzip", gzip.compress(raw)), ("zstd", zstandard.ZstdCompressor().compress(raw))):
+        response = client.post("/highest-value", content=body,
+                               headers={"content-type": "application/json", "content-encoding": encoding})
+        assert response.status_code == 413
+        assert "exceeds 1048576 bytes" in response.json()["detail"]
@@ -0,0 +1,103 @@
+import pytest
+from fastapi.testclient import TestClient
+from app.columnar import EventColumns
+from app.datasets import DatasetStore, DatasetTooLarge, content_hash
+from app.main import app, dataset_store
+
+client = TestClient(app)
+
+SALES = [
+    {"time_object": {"timestamp": "2020-06-01T00:00:00"}, "event_type": "sale", "attribute": {"suburb": "Balmain", "price": 300000, "sqft": 1500}},
+    {"time_object": {"timestamp": "2021-06-01T00:00:00"}, "event_type": "sale", "attribute": {"suburb": "Balmain", "price": 350000, "sqft": 1700}},
+    {"time_object": {"timestamp": "2022-06-01T00:00:00"}, "event_type": "sale", "attribute": {"suburb": "Rhodes", "price": 400000, "sqft": 2000}},
+    {"time_object": {"timestamp": "2023-06-01T00:00:00"}, "event_type": "sale", "attribute": {"suburb": "Rhodes", "price": 4500000, "sqft": 2600}}
+]
+
+
+def test_upload_and_query_by_dataset_id():
+    response = client.post("/datasets", json={"data": SALES})
+    assert response.status_code == 200
+    dataset_id = response.json()["dataset_id"]
+    assert response.json()["rows"] == 4
+
+    by_id = client.post("/average-by-attribute", json={"group_by_attribute": "suburb", "value_attribute": "price", "dataset_id": dataset_id})
+    inline = client.post("/average-by-attribute", json={"group_by_attribute": "suburb", "value_attribute": "price", "data": SALES})
+    assert by_id.status_code == 200
+    assert by_id.json() == inline.json()
+
+    predict = client.post("/predict", json={"dataset_id": dataset_id, "x_attribute": "sqft", "y_attribute": "price", "x_values": [1800]})
+    assert predict.status_code == 200
+    count = client.post("/count-by-time", json={"dataset_id": dataset_id, "time_format": "year"})
+    assert count.json()["counts_by_time"] == {"2020": 1, "2021": 1, "2022": 1, "2023": 1}
+
+
+def test_identical_uploads_share_an_id():
+    reordered = [dict(reversed(list(event.items()))) for event in SALES]
+    first = client.post("/datasets", json={"data": SALES}).json()["dataset_id"]
+    second = client.post("/datasets", json={"data": reordered}).json()["dataset_id"]
+    assert first == second == content_hash(SALES)
+
+
+def test_delete_dataset():
+    dataset_id = client.post("/datasets", json={"data": SALES}).json()["dataset_id"]
+    assert client.delete(f"/datasets/{dataset_id}").status_code == 200
+    response = client.post("/outliers", json={"value_attribute": "price", "dataset_id": dataset_id})
+    assert response.status_code == 404
+    assert dataset_id not in dataset_store
+
+
+def test_data_or_dataset_id_required():
+    response = client.post("/outliers", json={"value_attribute": "price"})
+    assert response.status_code == 422
+    response = client.post("/outliers", json={"value_attribute": "price", "data": SALES, "dataset_id": "abc"})
+    assert response.status_code == 422
+
+
+def test_store_evicts_least_recently_used():
+    columns = [EventColumns.from_events(SALES[:index + 1]) for index in range(3)]
+    store = DatasetStore(max_bytes=columns[0].nbytes + columns[1].nbytes + 1)
+    store.put("a", columns[0])
+    store.put("b", columns[1])
+    store.get("a")
+    store.put("c", columns[0])
+    assert "a" in store and "c" in store and "b" not in store
+
+    with pytest.raises(DatasetTooLarge):
+        DatasetStore(max_bytes=1).put("a", columns[2])
+
+
+def test_held_datasets_are_compacted_and_answer_like_inline_data():
+    dataset_id = client.post("/datasets", json={"data": SALES}).json()["dataset_id"]
+    columns = dataset_store.get(dataset_id)
+    assert columns.attributes["price"].dtype.kind == "i"
+    assert "suburb" in columns.dictionaries
+
+    for path, params in [
+        ("/median-by-attribute", {"group_by_attribute": "suburb", "value_attribute": "price"}),
+        ("/summary", {"value_attribute": "price", "group_by_attributes": ["suburb"]}),
+        ("/predict-future-values", {"value_attribute": "price", "group_by_attribute": "suburb", "time_points": [2025]}),
+        ("/rolling", {"value_attribute": "price", "group_by_attribute": "suburb", "time_bucket": "year", "window": 2}),
+        ("/count-by-time", {"time_format": "month"}),
+    ]:
+        by_id = client.post(path, json={**params, "dataset_id": dataset_id})
+        inline = client.post(path, json={**params, "data": SALES})
+        assert by_id.status_code == 200
+        assert by_id.json() == inline.json()
+
+
+def test_mixed_int_and_float_columns_group_like_inline_data():
+    events = [
+        {**event, "attribute": {**event["attribute"], "bedrooms": [1, 2, 2.5][index % 3]}}
+        for index, event in enumerate(SALES)
+    ]
+    dataset_id = client.post("/datasets", json={"data": events}).json()["dataset_id"]
+    for path, params in [
+        ("/average-by-attribute", {"group_by_attribute": "bedrooms", "value_attribute": "price"}),
+        ("/summary", {"value_attribute": "price", "group_by_attributes": ["bedrooms"]}),
+    ]:
+        by_id = client.post(path, json={**params, "dataset_id": dataset_id})
+        inline = client.post(path, json={**params, "data": events})
+        assert by_id.status_code == 200
+        assert by_id.json() == inline.json()
+    average = client.post("/average-by-attribute", json={"dataset_id": dataset_id, "group_by_attribute": "bedrooms", "value_attribute": "price"})
+    assert set(average.json()["average_values"]) == {"1", "2", "2.5"}
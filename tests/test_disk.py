@@ -0,0 +1,172 @@
+import json
+import os
+
+import numpy as np
+import pytest
+from fastapi.testclient import TestClient
+
+import app.main
+from app.disk import DiskDatasetStore, order_statistics
+from app.main import app as api, model_store
+
+client = TestClient(api)
+
+rng = np.random.default_rng(11)
+EVENTS = [
+    {
+        "time_object": {"timestamp": f"20{10 + index % 14}-0{1 + index % 9}-15T00:00:00"},
+        "event_type": "sale" if index % 3 else "rent",
+        "attribute": {
+            "suburb": ["Balmain", "Rhodes", "Glebe"][index % 3],
+            "price": float(price),
+            "sqft": float(sqft),
+            **({"rooms": index % 5 + 1} if index % 7 else {}),
+        },
+    }
+    for index, (price, sqft) in enumerate(zip(rng.lognormal(13, 0.5, 250).round(), rng.uniform(800, 3000, 250).round()))
+]
+
+QUERIES = [
+    ("/average-by-attribute", {"group_by_attribute": "suburb", "value_attribute": "price"}),
+    ("/count-by-time", {"time_format": "month"}),
+    ("/outliers", {"value_attribute": "price"}),
+    ("/outliers", {"value_attribute": "price", "approximate": True}),
+    ("/predict", {"x_attribute": "sqft", "y_attribute": "price", "x_values": [1800]}),
+    ("/predict-future-values", {"value_attribute": "price", "time_points": [2030]}),
+    ("/predict-future-values", {"value_attribute": "price", "group_by_attribute": "suburb", "time_points": [2030]}),
+]
+
+
+@pytest.fixture
+def disk_store(tmp_path, monkeypatch):
+    # Small segments, so every query reads several of them
+    store = DiskDatasetStore(str(tmp_path), segment_rows=64)
+    monkeypatch.setattr(app.main, "disk_store", store)
+    model_store.clear()
+    return store
+
+
+@pytest.mark.parametrize("path, query", QUERIES)
+def test_disk_dataset_matches_inline_data(disk_store, path, query):
+    response = client.post("/datasets", json={"data": EVENTS, "storage": "disk"})
+    assert response.status_code == 200
+    assert response.json()["rows"] == 250
+    assert response.json()["storage"] == "disk"
+    dataset_id = response.json()["dataset_id"]
+
+    on_disk = client.post(path, json={**query, "dataset_id": dataset_id})
+    inline = client.post(path, json={**query, "data": EVENTS})
+    assert on_disk.status_code == 200
+    result, expected = on_disk.json(), inline.json()
+    result.pop("model_id", None)
+    expected.pop("model_id", None)
+    assert_close(result, expected)
+
+
+def assert_close(result, expected):
+    # Sums over segments round differently from sums over one array
+    if isinstance(expected, dict):
+        assert result.keys() == expected.keys()
+        for key in expected:
+            assert_close(result[key], expected[key])
+    else:
+        assert result == pytest.approx(expected)
+
+
+def test_multivariate_predict_on_disk(disk_store):
+    dataset_id = client.post("/datasets", json={"data": EVENTS, "storage": "disk"}).json()["dataset_id"]
+    rows = [event for event in EVENTS if "rooms" in event["attribute"]]
+    query = {"x_attributes": ["sqft", "rooms"], "y_attribute": "price", "x_values": [[1800, 3]]}
+
+    # Some events lack rooms, which the in-memory fit rejects in the same way
+    assert client.post("/predict", json={**query, "dataset_id": dataset_id}).status_code == 400
+    assert client.post("/predict", json={**query, "data": EVENTS}).status_code == 400
+
+    dataset_id = client.post("/datasets", json={"data": rows, "storage": "disk"}).json()["dataset_id"]
+    on_disk = client.post("/predict", json={**query, "dataset_id": dataset_id}).json()
+    inline = client.post("/predict", json={**query, "data": rows}).json()
+    assert on_disk["prediction"] == pytest.approx(inline["prediction"])
+    assert on_disk["fit"]["coefficients"] == pytest.approx(inline["fit"]["coefficients"])
+
+    reused = client.post("/predict", json={"model_id": on_disk["model_id"], "x_values": [[1800, 3]]})
+    assert reused.json()["prediction"] == pytest.approx(on_disk["prediction"])
+
+
+def test_streamed_upload_is_written_by_segment(disk_store):
+    ndjson = "\n".join(json.dumps(event) for event in EVENTS)
+    response = client.post("/datasets?storage=disk", content=ndjson, headers={"content-type": "application/x-ndjson"})
+    assert response.status_code == 200
+    dataset_id = response.json()["dataset_id"]
+    assert response.json() == {"dataset_id": dataset_id, "rows": 250, "storage": "disk"}
+    assert len(list(disk_store.segments(dataset_id))) == 4
+
+    # The same events stream to the same id, and leave no partial upload behind
+    again = client.post("/datasets?storage=disk", content=ndjson, headers={"content-type": "application/x-ndjson"})
+    assert again.json()["dataset_id"] == dataset_id
+    assert os.listdir(disk_store.directory) == [dataset_id]
+
+    query = {"group_by_attribute": "suburb", "value_attribute": "price"}
+    on_disk = client.post("/average-by-attribute", json={**query, "dataset_id": dataset_id})
+    assert_close(on_disk.json(), client.post("/average-by-attribute", json={**query, "data": EVENTS}).json())
+
+
+def test_segments_store_numbers_typed_and_distinct_strings_as_arrays(disk_store):
+    events = [
+        {**event, "attribute": {**event["attribute"], "price": int(event["attribute"]["price"]) if index % 2 else event["attribute"]["price"] + 0.5,
+                                "note": f"listing {index}"}}
+        for index, event in enumerate(EVENTS)
+    ]
+    dataset_id = client.post("/datasets", json={"data": events, "storage": "disk"}).json()["dataset_id"]
+    directory = os.path.join(disk_store.directory, dataset_id, "000000")
+    with open(os.path.join(directory, "manifest.json")) as file:
+        entries = {entry["name"]: entry for entry in json.load(file)["attributes"]}
+    assert entries["sqft"]["dictionary"] is None
+    assert np.load(os.path.join(directory, entries["sqft"]["file"])).dtype == np.float64
+    # Mixed ints and floats keep their values as sent, to label groups like inline data
+    assert [type(value) for value in entries["price"]["dictionary"][:2]] == [float, int]
+    assert entries["note"]["dictionary"] is None
+    assert np.load(os.path.join(directory, entries["note"]["file"])).dtype.kind == "U"
+    assert entries["suburb"]["dictionary"].endswith(".npy")
+
+    segment = next(disk_store.segments(dataset_id))
+    assert segment.keys("note")[0][:2].tolist() == ["listing 0", "listing 1"]
+    for query in ({"group_by_attribute": "suburb", "value_attribute": "price"}, {"group_by_attribute": "price", "value_attribute": "sqft"}):
+        on_disk = client.post("/average-by-attribute", json={**query, "dataset_id": dataset_id})
+        assert_close(on_disk.json(), client.post("/average-by-attribute", json={**query, "data": events}).json())
+
+
+def test_unsupported_endpoints_and_delete(disk_store):
+    dataset_id = client.post("/datasets", json={"data": EVENTS, "storage": "disk"}).json()["dataset_id"]
+    response = client.post("/median-value", json={"dataset_id": dataset_id, "attribute_name": "price"})
+    assert response.status_code == 400
+    assert "stored on disk" in response.json()["detail"]
+
+    assert client.delete(f"/datasets/{dataset_id}").status_code == 200
+    assert dataset_id not in disk_store
+    assert client.post("/count-by-time", json={"dataset_id": dataset_id}).status_code == 404
+    assert client.delete(f"/datasets/{dataset_id}").status_code == 404
+
+
+def test_disk_upload_rejects_unstorable_events(disk_store):
+    nested = [{**EVENTS[0], "attribute": {"tags": ["a", "b"]}}]
+    response = client.post("/datasets", json={"data": nested, "storage": "disk"})
+    assert response.status_code == 400
+    assert not os.listdir(disk_store.directory)
+
+
+def test_disk_storage_needs_a_directory(monkeypatch):
+    monkeypatch.setattr(app.main, "disk_store", None)
+    response = client.post("/datasets", json={"data": EVENTS, "storage": "disk"})
+    assert response.status_code == 400
+    assert "ANALYTICS_DATASET_DIR" in response.json()["detail"]
+
+
+@pytest.mark.parametrize("values", [
+    rng.normal(0, 1, 5000),
+    np.repeat([1.0, 2.0, 3.0], 2000),
+    np.concatenate((np.full(3000, 7.0), rng.uniform(0, 1e-9, 10), [1e300])),
+])
+def test_order_statistics_match_sorting(values):
+    chunks = lambda: np.array_split(values, 7)  # noqa: E731
+    ranks = [0, 1, len(values) // 4, len(values) // 2, len(values) - 1]
+    assert order_statistics(chunks, ranks, max_candidates=100) == np.sort(values)[ranks].tolist()
@@ -0,0 +1,64 @@
+from fastapi.testclient import TestClient
+from app.main import app, model_store
+
+client = TestClient(app)
+
+SALES = [
+    {"time_object": {"timestamp": "2023-06-01T00:00:00"}, "event_type": "sale", "attribute": {"suburb": "Balmain", "price": 500000}},
+    {"time_object": {"timestamp": "2023-07-01T00:00:00"}, "event_type": "sale", "attribute": {"suburb": "Rhodes", "price": 300000}},
+    {"time_object": {"timestamp": "2023-07-02T00:00:00"}, "event_type": "sale", "attribute": {"suburb": "Rhodes", "price": 350000}},
+    {"time_object": {"timestamp": "2023-07-03T00:00:00"}, "event_type": "sale", "attribute": {"suburb": "Rhodes", "price": 9000000}},
+]
+
+
+def test_matching_etag_returns_304():
+    body = {"value_attribute": "price", "data": SALES}
+    first = client.post("/outliers", json=body)
+    etag = first.headers["etag"]
+    assert etag.startswith('"') and etag.endswith('"')
+    assert client.post("/outliers", json=body).headers["etag"] == etag
+
+    revalidated = client.post("/outliers", json=body, headers={"if-none-match": etag})
+    assert revalidated.status_code == 304
+    assert revalidated.content == b""
+    assert revalidated.headers["etag"] == etag
+    assert client.post("/outliers", json=body, headers={"if-none-match": f'"other", W/{etag}'}).status_code == 304
+
+
+def test_etag_changes_with_parameters_and_data():
+    body = {"group_by_attribute": "suburb", "value_attribute": "price", "data": SALES}
+    etag = client.post("/average-by-attribute", json=body).headers["etag"]
+    changed = client.post("/average-by-attribute", json={**body, "data": SALES[:3]}, headers={"if-none-match": etag})
+    assert changed.status_code == 200
+    assert changed.headers["etag"] != etag
+    assert client.post("/median-by-attribute", json=body, headers={"if-none-match": etag}).status_code == 200
+
+
+def test_dataset_and_ndjson_etags():
+    dataset_id = client.post("/datasets", json={"data": SALES}).json()["dataset_id"]
+    assert "etag" not in client.post("/datasets", json={"data": SALES}).headers
+    body = {"dataset_id": dataset_id, "time_format": "month"}
+    etag = client.post("/count-by-time", json=body).headers["etag"]
+    assert client.post("/count-by-time", json=body, headers={"if-none-match": etag}).status_code == 304
+
+    ndjson = "\n".join('{"time_object": {"timestamp": "2023-06-01"}, "event_type": "sale", "attribute": {}}' for _ in range(2))
+    headers = {"content-type": "application/x-ndjson"}
+    etag = client.post("/count-by-time", content=ndjson, headers=headers).headers["etag"]
+    assert client.post("/count-by-time", content=ndjson, headers={**headers, "if-none-match": etag}).status_code == 304
+
+
+def test_deleted_datasets_and_evicted_models_are_not_revalidated():
+    dataset_id = client.post("/datasets", json={"data": SALES}).json()["dataset_id"]
+    body = {"dataset_id": dataset_id, "attribute_name": "price"}
+    etag = client.post("/highest-value", json=body).headers["etag"]
+    assert client.post("/highest-value", json=body, headers={"if-none-match": etag}).status_code == 304
+
+    client.delete(f"/datasets/{dataset_id}")
+    assert client.post("/highest-value", json=body, headers={"if-none-match": etag}).status_code == 404
+
+    fitted = client.post("/predict", json={"x_attribute": "price", "y_attribute": "price", "x_values": [1], "data": SALES})
+    predict = {"model_id": fitted.json()["model_id"], "x_values": [2]}
+    etag = client.post("/predict", json=predict).headers["etag"]
+    assert client.post("/predict", json=predict, headers={"if-none-match": etag}).status_code == 304
+    model_store.clear()
+    assert client.post("/predict", json=predict, headers={"if-none-match": etag}).status_code == 404
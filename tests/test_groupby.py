@@ -0,0 +1,36 @@
+import statistics
+
+import numpy as np
+from app.groupby import GroupBy
+
+
+def _reference(labels, values):
+    grouped = {}
+    for label, value in zip(labels, values):
+        grouped.setdefault(label, []).append(value)
+    return grouped
+
+
+def test_reductions_match_reference():
+    rng = np.random.default_rng(7)
+    labels = rng.choice(["Balmain", "Rhodes", "Darlinghurst", "Newtown"], size=500)
+    values = rng.normal(800000, 150000, size=500)
+    grouping = GroupBy(labels)
+    reference = _reference(labels.tolist(), values.tolist())
+
+    for name, expected in reference.items():
+        index = grouping.groups.tolist().index(name)
+        assert grouping.counts[index] == len(expected)
+        assert np.isclose(grouping.sum(values)[index], sum(expected))
+        assert np.isclose(grouping.mean(values)[index], statistics.mean(expected))
+        assert np.isclose(grouping.median(values)[index], statistics.median(expected))
+        assert grouping.min(values)[index] == min(expected)
+        assert grouping.max(values)[index] == max(expected)
+        assert np.isclose(grouping.quantile(values, 0.25)[index], np.percentile(expected, 25))
+
+
+def test_single_row_groups():
+    grouping = GroupBy(np.array(["b", "a"]))
+    values = np.array([2.0, 1.0])
+    assert grouping.as_dict(grouping.median(values)) == {"a": 1.0, "b": 2.0}
+    assert grouping.as_dict(grouping.min(values)) == {"a": 1.0, "b": 2.0}
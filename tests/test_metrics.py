@@ -0,0 +1,83 @@
+import re
+import time
+
+from fastapi.testclient import TestClient
+from app import metrics
+from app.main import app
+
+client = TestClient(app)
+
+SALES = [
+    {"time_object": {"timestamp": "2023-06-01"}, "event_type": "sale", "attribute": {"suburb": "Balmain", "price": 500000}},
+    {"time_object": {"timestamp": "2023-07-01"}, "event_type": "sale", "attribute": {"suburb": "Rhodes", "price": 300000}},
+    {"time_object": {"timestamp": "2023-07-02"}, "event_type": "sale", "attribute": {"suburb": "Rhodes", "price": 350000}},
+]
+BODY = {"group_by_attribute": "suburb", "value_attribute": "price", "data": SALES}
+
+
+def _sample(text, name, **labels):
+    pattern = re.escape(name) + r"\{" + ",".join(
+        f'{key}="{re.escape(value)}"' for key, value in labels.items()
+    ) + r"\} (\S+)"
+    match = re.search(pattern, text)
+    return float(match.group(1)) if match else 0.0
+
+
+def test_server_timing_reports_stages():
+    response = client.post("/median-by-attribute", json=BODY)
+    entries = dict(entry.split(";dur=") for entry in response.headers["server-timing"].split(", "))
+    assert list(entries) == ["parse", "validate", "extract", "compute", "serialize", "total"]
+    assert all(float(duration) >= 0 for duration in entries.values())
+    assert float(entries["total"]) >= sum(float(duration) for name, duration in entries.items() if name != "total")
+
+
+def test_metrics_count_requests_stages_rows_and_bytes():
+    before = client.get("/metrics").text
+    client.post("/median-by-attribute", json=BODY)
+    client.post("/median-by-attribute", json={"data": SALES})
+    client.get("/no-such-route")
+    response = client.get("/metrics")
+    after = response.text
+
+    assert response.headers["content-type"] == metrics.PROMETHEUS_MEDIA_TYPE
+    route = "/median-by-attribute"
+
+    def delta(name, **labels):
+        return _sample(after, name, **labels) - _sample(before, name, **labels)
+
+    assert delta("analytics_requests_total", method="POST", route=route, status="200") == 1
+    assert delta("analytics_requests_total", method="POST", route=route, status="422") == 1
+    assert delta("analytics_requests_total", method="GET", route="unmatched", status="404") == 1
+    assert delta("analytics_request_duration_seconds_count", method="POST", route=route) == 2
+    assert delta("analytics_stage_duration_seconds_count", route=route, stage="compute") == 1
+    assert delta("analytics_stage_duration_seconds_count", route=route, stage="validate") == 2
+    assert delta("analytics_request_rows_sum", route=route) == len(SALES)
+    assert delta("analytics_request_body_bytes_count", route=route) == 2
+    assert delta("analytics_response_body_bytes_sum", route=route) > 0
+
+
+def test_histogram_buckets_are_cumulative():
+    histogram = metrics.Histogram("example_seconds", "Example.", ["route"], [0.1, 1.0])
+    for value in (0.05, 0.5, 0.5, 3.0):
+        histogram.observe(("/a",), value)
+    lines = histogram.collect()
+    assert 'example_seconds_bucket{route="/a",le="0.1"} 1' in lines
+    assert 'example_seconds_bucket{route="/a",le="1"} 3' in lines
+    assert 'example_seconds_bucket{route="/a",le="+Inf"} 4' in lines
+    assert 'example_seconds_count{route="/a"} 4' in lines
+
+
+def test_nested_stages_are_exclusive():
+    timings = metrics.RequestTimings()
+    timings.begin("compute")
+    time.sleep(0.01)
+    timings.begin("extract")
+    time.sleep(0.02)
+    timings.end("extract")
+    timings.end("compute")
+    assert 0.01 <= timings.stages["compute"] < 0.02
+    assert timings.stages["extract"] >= 0.02
+
+    # Outside a request, stages are not recorded anywhere
+    with metrics.stage("compute"):
+        assert metrics.current() is None
@@ -0,0 +1,74 @@
+import pytest
+from fastapi.testclient import TestClient
+from app import config
+from app.main import app, offload
+
+client = TestClient(app)
+
+SALES = [
+    {"time_object": {"timestamp": "2020-06-01T00:00:00"}, "event_type": "sale", "attribute": {"suburb": "Balmain", "price": 300000}},
+    {"time_object": {"timestamp": "2021-06-01T00:00:00"}, "event_type": "sale", "attribute": {"suburb": "Balmain", "price": 350000}},
+    {"time_object": {"timestamp": "2022-03-01T00:00:00"}, "event_type": "sale", "attribute": {"suburb": "Rhodes", "price": 400000}},
+    {"time_object": {"timestamp": "2022-06-01T00:00:00"}, "event_type": "sale", "attribute": {"suburb": "Rhodes", "price": 4500000}},
+    {"time_object": {"timestamp": "2023-06-01T00:00:00"}, "event_type": "sale", "attribute": {"suburb": "Rhodes"}},
+]
+
+REQUESTS = [
+    ("/median-by-attribute", {"group_by_attribute": "suburb", "value_attribute": "price"}),
+    ("/outliers", {"value_attribute": "price"}),
+    ("/count-by-time", {"time_format": "month"}),
+    ("/predict-future-values", {"value_attribute": "price", "time_points": [2024, 2025]}),
+    ("/summary", {"value_attribute": "price", "group_by_attributes": ["suburb"]}),
+]
+
+
+@pytest.fixture
+def offload_everything(monkeypatch):
+    monkeypatch.setattr(offload, "workers", 1)
+    monkeypatch.setattr(config, "OFFLOAD_MIN_ROWS", 2)
+    yield
+    offload.shutdown()
+
+
+@pytest.mark.parametrize("path, params", REQUESTS)
+def test_offloaded_requests_match_inline(offload_everything, monkeypatch, path, params):
+    dataset_id = client.post("/datasets", json={"data": SALES}).json()["dataset_id"]
+    offloaded = client.post(path, json={**params, "dataset_id": dataset_id}, headers={"Cache-Control": "no-cache"})
+    assert offload._pool is not None
+
+    monkeypatch.setattr(config, "OFFLOAD_MIN_ROWS", 10 ** 9)
+    inline = client.post(path, json={**params, "dataset_id": dataset_id}, headers={"Cache-Control": "no-cache"})
+    assert offloaded.status_code == inline.status_code == 200
+    assert offloaded.json() == inline.json()
+
+
+def test_offloaded_errors_and_datasets(offload_everything):
+    dataset_id = client.post("/datasets", json={"data": SALES}).json()["dataset_id"]
+    response = client.post("/median-value", json={"attribute_name": "missing", "dataset_id": dataset_id})
+    assert response.status_code == 400
+    assert response.json()["detail"].endswith("No valid values found for the specified attribute.")
+
+    response = client.post("/average-by-attribute", json={"dataset_id": dataset_id, "group_by_attribute": "suburb", "value_attribute": "price"})
+    assert response.json() == {"average_values": {"Balmain": 325000.0, "Rhodes": 2450000.0}}
+    assert client.post("/lowest-value", json={"dataset_id": "missing", "attribute_name": "price"}).status_code == 404
+
+
+def test_inline_json_events_stay_inline(offload_everything):
+    assert client.post("/highest-value", json={"attribute_name": "price", "data": SALES}).json() == {"highest_value": 4500000}
+    assert offload._pool is None
+
+
+def test_small_requests_stay_inline(monkeypatch):
+    monkeypatch.setattr(offload, "workers", 1)
+    assert client.post("/highest-value", json={"attribute_name": "price", "data": SALES}).json() == {"highest_value": 4500000}
+    assert offload._pool is None
+
+
+def test_full_queue_is_refused(offload_everything, monkeypatch):
+    monkeypatch.setattr(offload, "queue_timeout", 0.05)
+    monkeypatch.setattr(offload, "in_flight", offload.capacity)
+    dataset_id = client.post("/datasets", json={"data": SALES}).json()["dataset_id"]
+    response = client.post("/highest-value", json={"attribute_name": "price", "dataset_id": dataset_id}, headers={"Cache-Control": "no-cache"})
+    assert response.status_code == 503
+    assert response.headers["retry-after"] == "1"
+    assert client.get("/").status_code == 200
@@ -0,0 +1,58 @@
+import numpy as np
+import pytest
+from fastapi.testclient import TestClient
+from app import config, parallel
+from app.groupby import GroupBy
+from app.main import app
+
+client = TestClient(app)
+
+
+def test_bincount_partials_match_serial():
+    codes = np.array([0, 3, 3, 1, 0, 3, 2])
+    weights = np.arange(7, dtype=float)
+    assert parallel.bincount(codes, weights, 5, workers=3).tolist() == np.bincount(codes, weights, 5).tolist()
+    assert parallel.bincount(codes[:0], minlength=2, workers=3).tolist() == [0, 0]
+    assert [rows.stop - rows.start for rows in parallel.chunk_slices(10, 3)] == [3, 3, 4]
+
+
+def test_parallel_groupby_matches_serial():
+    rng = np.random.default_rng(11)
+    labels = rng.choice(["Balmain", "Rhodes", "Darlinghurst", "Newtown", "Glebe"], size=2000)
+    values = rng.normal(800000, 150000, size=2000)
+    serial = GroupBy(labels, workers=1)
+    threaded = GroupBy(labels, workers=4)
+
+    assert threaded.groups.tolist() == serial.groups.tolist()
+    assert threaded.codes.tolist() == serial.codes.tolist()
+    assert threaded.counts.tolist() == serial.counts.tolist()
+    assert threaded.mean(values) == pytest.approx(serial.mean(values))
+    assert threaded.min(values).tolist() == serial.min(values).tolist()
+    assert threaded.max(values).tolist() == serial.max(values).tolist()
+    for q in (0, 0.25, 0.5, 0.9, 1):
+        assert threaded.quantile(values, q).tolist() == serial.quantile(values, q).tolist()
+
+
+SALES = [
+    {"time_object": {"timestamp": f"202{index % 4}-0{index % 9 + 1}-01"}, "event_type": "sale",
+     "attribute": {"suburb": ["Balmain", "Rhodes", "Glebe"][index % 3], "price": 300000 + (index * 7919) % 200000}}
+    for index in range(60)
+] + [{"time_object": {"timestamp": "2024-01-01"}, "event_type": "sale", "attribute": {"suburb": "Glebe", "price": 9000000}}]
+
+
+@pytest.mark.parametrize("path, params", [
+    ("/average-by-attribute", {"group_by_attribute": "suburb", "value_attribute": "price"}),
+    ("/median-by-attribute", {"group_by_attribute": "suburb", "value_attribute": "price"}),
+    ("/median-by-attribute", {"group_by_attribute": "suburb", "value_attribute": "price", "approximate": True}),
+    ("/min-max-by-attribute", {"group_by_attribute": "suburb", "value_attribute": "price"}),
+    ("/count-by-time", {"time_format": "month"}),
+    ("/outliers", {"value_attribute": "price"}),
+    ("/summary", {"value_attribute": "price", "group_by_attributes": ["suburb"]}),
+])
+def test_parallel_endpoints_match_serial(monkeypatch, path, params):
+    serial = client.post(path, json={**params, "data": SALES})
+    monkeypatch.setattr(config, "PARALLEL_WORKERS", 3)
+    monkeypatch.setattr(config, "PARALLEL_MIN_ROWS", 0)
+    threaded = client.post(path, json={**params, "data": SALES})
+    assert serial.status_code == threaded.status_code == 200
+    assert threaded.json() == serial.json()
@@ -0,0 +1,103 @@
+import marshal
+
+import pytest
+from fastapi.testclient import TestClient
+from app import config, profiling
+from app.main import app, result_cache
+
+client = TestClient(app, headers={"Authorization": "Bearer s3cret"})
+
+SALES = [
+    {"time_object": {"timestamp": f"2023-0{index % 9 + 1}-01"}, "event_type": "sale",
+     "attribute": {"suburb": ["Balmain", "Rhodes", "Glebe"][index % 3], "price": 300000 + index}}
+    for index in range(3000)
+]
+BODY = {"group_by_attribute": "suburb", "value_attribute": "price", "data": SALES}
+
+
+@pytest.fixture(autouse=True)
+def admin_token(monkeypatch):
+    monkeypatch.setattr(config, "ADMIN_TOKEN", "s3cret")
+    monkeypatch.setattr(config, "PROFILE_ALLOW_HEADER", True)
+
+
+def test_requests_are_not_profiled_by_default():
+    before = len(profiling.store.list())
+    response = client.post("/median-by-attribute", json=BODY)
+    assert "x-profile-id" not in response.headers
+    assert len(profiling.store.list()) == before
+
+
+def test_profiling_and_admin_need_the_token(monkeypatch):
+    anonymous = TestClient(app)
+    assert "x-profile-id" not in anonymous.post("/median-by-attribute", json=BODY, headers={"x-profile": "1"}).headers
+    response = anonymous.get("/admin/profiles", headers={"Authorization": "Bearer wrong"})
+    assert response.status_code == 401
+    assert response.headers["www-authenticate"] == "Bearer"
+
+    monkeypatch.setattr(config, "ADMIN_TOKEN", "")
+    assert client.get("/admin/profiles").status_code == 403
+    # Without a token the header works only when explicitly allowed
+    assert "x-profile-id" in anonymous.post("/median-by-attribute", json=BODY, headers={"x-profile": "1"}).headers
+    monkeypatch.setattr(config, "PROFILE_ALLOW_HEADER", False)
+    assert "x-profile-id" not in anonymous.post("/median-by-attribute", json=BODY, headers={"x-profile": "1"}).headers
+
+
+def test_cprofile_profile_from_header():
+    response = client.post("/median-by-attribute", json=BODY, headers={"x-profile": "cprofile"})
+    assert response.status_code == 200
+    profile_id = response.headers["x-profile-id"]
+
+    summary = client.get("/admin/profiles").json()[0]
+    assert summary["id"] == profile_id
+    assert (summary["path"], summary["mode"], summary["trigger"], summary["status"]) == (
+        "/median-by-attribute", "cprofile", "header", 200
+    )
+
+    profile = client.get(f"/admin/profiles/{profile_id}").json()
+    assert "median_by_attribute" in profile["report"]
+    assert profile["peak_traced_bytes"] > 0
+    assert profile["allocations"] and {"location", "bytes", "count"} <= set(profile["allocations"][0])
+
+    download = client.get(f"/admin/profiles/{profile_id}/pstats")
+    assert download.headers["content-type"] == "application/octet-stream"
+    functions = {function for _, _, function in marshal.loads(download.content)}
+    assert "median_by_attribute" in functions
+
+
+def test_sampling_profile_collects_stacks(monkeypatch):
+    monkeypatch.setattr(profiling, "SAMPLE_INTERVAL", 0.0005)
+    response = client.post("/median-by-attribute", json=BODY, headers={"x-profile": "sample"})
+    profile = client.get(f"/admin/profiles/{response.headers['x-profile-id']}").json()
+    assert profile["mode"] == "sample"
+    assert profile["samples"] == sum(int(stack.rsplit(" ", 1)[1]) for stack in profile["stacks"])
+    assert all(stack.startswith("median_by_attribute") for stack in profile["stacks"])
+    assert client.get(f"/admin/profiles/{profile['id']}/pstats").status_code == 404
+
+
+def test_sample_rate_and_header_switch(monkeypatch):
+    monkeypatch.setattr(config, "PROFILE_SAMPLE_RATE", 1.0)
+    response = client.post("/median-by-attribute", json=BODY)
+    assert client.get(f"/admin/profiles/{response.headers['x-profile-id']}").json()["trigger"] == "sampled"
+
+    monkeypatch.setattr(config, "PROFILE_SAMPLE_RATE", 0.0)
+    monkeypatch.setattr(config, "PROFILE_ALLOW_HEADER", False)
+    assert "x-profile-id" not in client.post("/median-by-attribute", json=BODY, headers={"x-profile": "1"}).headers
+
+
+def test_profiled_requests_skip_the_result_cache(monkeypatch):
+    monkeypatch.setattr(result_cache, "max_bytes", 1 << 20)
+    client.post("/median-by-attribute", json=BODY)
+    response = client.post("/median-by-attribute", json=BODY, headers={"x-profile": "1"})
+    assert response.headers["x-cache"] == "MISS"
+    assert "median_by_attribute" in client.get(f"/admin/profiles/{response.headers['x-profile-id']}").json()["report"]
+
+
+def test_profile_ring_is_bounded():
+    store = profiling.ProfileStore(2)
+    for profile_id in ("a", "b", "c"):
+        store.add({"id": profile_id, "method": "GET", "path": "/", "status": 200, "mode": "cprofile",
+                   "trigger": "header", "started_at": "", "duration_ms": 0.0, "peak_traced_bytes": 0})
+    assert [profile["id"] for profile in store.list()] == ["c", "b"]
+    assert store.get("a") is None
+    assert client.get("/admin/profiles/missing").status_code == 404
@@ -0,0 +1,256 @@
+import json
+
+import numpy as np
+import pytest
+from fastapi.testclient import TestClient
+from app.main import app, model_store
+from app.regression import GroupedLinearFit, LinearFit, MultiLinearFit
+
+client = TestClient(app)
+
+
+def test_fit_matches_polyfit():
+    rng = np.random.default_rng(3)
+    x = rng.uniform(2000, 2025, size=1000)
+    y = 25000 * x - 4.9e7 + rng.normal(0, 50000, size=1000)
+
+    fit = LinearFit.from_arrays(x, y, chunk_size=128)
+    (slope, intercept), covariance = np.polyfit(x, y, 1, cov="unscaled")
+    residuals = y - (slope * x + intercept)
+    variance = residuals @ residuals / (len(x) - 2)
+
+    assert fit.n == 1000
+    assert fit.slope == pytest.approx(slope)
+    assert fit.intercept == pytest.approx(intercept)
+    assert fit.r_squared == pytest.approx(np.corrcoef(x, y)[0, 1] ** 2)
+    assert fit.standard_errors()["slope_stderr"] == pytest.approx(np.sqrt(variance * covariance[0, 0]))
+    assert fit.standard_errors()["intercept_stderr"] == pytest.approx(np.sqrt(variance * covariance[1, 1]))
+
+
+def test_merged_fits_equal_single_fit():
+    x = np.arange(10, dtype=float)
+    y = 3 * x + np.sin(x)
+    merged = LinearFit().update(x[:4], y[:4]).merge(LinearFit().update(x[4:], y[4:]))
+    single = LinearFit().update(x, y)
+    assert merged.statistics() == pytest.approx(single.statistics())
+
+
+def test_constant_feature_predicts_mean():
+    fit = LinearFit().update(np.array([5.0, 5.0]), np.array([1.0, 3.0]))
+    assert fit.predict(np.array([7.0])).tolist() == [2.0]
+    assert fit.standard_errors() == {"slope_stderr": None, "intercept_stderr": None}
+
+
+def test_predict_reports_fit_statistics():
+    response = client.post("/predict", json={
+        "data": [
+            {"time_object": {}, "event_type": "sale", "attribute": {"sqft": 1500, "price": 300000}},
+            {"time_object": {}, "event_type": "sale", "attribute": {"sqft": 2000, "price": 400000}},
+            {"time_object": {}, "event_type": "sale", "attribute": {"sqft": 3000, "price": 600000}}
+        ],
+        "x_attribute": "sqft",
+        "y_attribute": "price",
+        "x_values": [1800]
+    })
+    assert response.status_code == 200
+    assert response.json()["prediction"] == pytest.approx([360000])
+    fit = response.json()["fit"]
+    assert fit["slope"] == pytest.approx(200)
+    assert fit["r_squared"] == pytest.approx(1)
+    assert fit["n"] == 3
+
+
+def test_grouped_fit_matches_per_group_fits():
+    rng = np.random.default_rng(5)
+    codes = rng.integers(0, 50, size=5000)
+    x = rng.uniform(2000, 2025, size=5000)
+    y = 1000 * codes * x + rng.normal(0, 1e5, size=5000)
+    # The last group is constant in x, the one before it has a single point
+    x[codes == 49] = 2010.0
+    keep = (codes != 48) | (np.cumsum(codes == 48) == 1)
+    codes, x, y = codes[keep], x[keep], y[keep]
+
+    grouped = GroupedLinearFit.from_arrays(codes[:2000], x[:2000], y[:2000], 50)
+    grouped.update(codes[2000:], x[2000:], y[2000:], 50)
+    statistics = grouped.statistics()
+    predictions = grouped.predict(np.array([2030.0, 2031.0]))
+    for group in range(50):
+        fit = LinearFit.from_arrays(x[codes == group], y[codes == group])
+        assert statistics[group] == pytest.approx(fit.statistics())
+        assert predictions[group] == pytest.approx(fit.predict(np.array([2030.0, 2031.0])))
+
+
+def test_predict_future_values_per_group():
+    events = [
+        {"time_object": {"timestamp": f"{year}-06-01"}, "event_type": "sale",
+         "attribute": {"suburb": suburb, "price": base + step * (year - 2020)}}
+        for suburb, base, step in (("Balmain", 500000, 20000), ("Rhodes", 300000, -5000))
+        for year in range(2020, 2024)
+    ]
+    events.append({"time_object": {"timestamp": "2023-01-01"}, "event_type": "sale",
+                   "attribute": {"suburb": "Glebe", "price": 1}})
+    response = client.post("/predict-future-values", json={
+        "data": events, "value_attribute": "price", "group_by_attribute": "suburb", "time_points": [2025, 2026],
+    })
+    assert response.status_code == 200
+    result = response.json()
+    assert result["predicted_values"]["Balmain"] == pytest.approx({"2025": 600000, "2026": 620000})
+    assert result["predicted_values"]["Rhodes"] == pytest.approx({"2025": 275000, "2026": 270000})
+    assert result["fit"]["Rhodes"]["slope"] == pytest.approx(-5000)
+    assert result["fit"]["Rhodes"]["n"] == 4
+    assert result["skipped_groups"] == ["Glebe"]
+
+    response = client.post("/predict-future-values", json={
+        "data": events[-1:], "value_attribute": "price", "group_by_attribute": "suburb", "time_points": [2025],
+    })
+    assert response.status_code == 400
+
+
+def test_multivariate_fit_matches_lstsq():
+    rng = np.random.default_rng(7)
+    x = np.column_stack((rng.uniform(500, 4000, 2000), rng.integers(1, 6, 2000), rng.uniform(2000, 2025, 2000)))
+    y = 150 * x[:, 0] + 20000 * x[:, 1] + 3000 * x[:, 2] + rng.normal(0, 10000, 2000)
+
+    fit = MultiLinearFit.from_arrays(x, y, chunk_size=300)
+    design = np.column_stack((np.ones(len(x)), x))
+    solution, residuals, _, _ = np.linalg.lstsq(design, y, rcond=None)
+    covariance = np.linalg.inv(design.T @ design) * residuals[0] / (len(x) - 4)
+
+    assert fit.n == 2000
+    assert fit.intercept == pytest.approx(solution[0], rel=1e-6)
+    assert fit.coefficients == pytest.approx(solution[1:], rel=1e-6)
+    assert fit.r_squared == pytest.approx(1 - residuals[0] / ((y - y.mean()) @ (y - y.mean())))
+    errors = fit.standard_errors()
+    assert errors["intercept_stderr"] == pytest.approx(np.sqrt(covariance[0, 0]), rel=1e-6)
+    assert errors["coefficient_stderrs"] == pytest.approx(np.sqrt(np.diag(covariance)[1:]), rel=1e-6)
+    assert fit.predict(x[:5]) == pytest.approx(design[:5] @ solution)
+
+
+def test_multivariate_fit_with_one_feature_matches_linear_fit():
+    x = np.arange(10, dtype=float)
+    y = 3 * x + np.sin(x)
+    multi = MultiLinearFit.from_arrays(x[:, None], y)
+    single = LinearFit.from_arrays(x, y)
+    statistics = multi.statistics(["x"])
+    assert statistics["coefficients"]["x"] == pytest.approx(single.slope)
+    assert statistics["coefficient_stderrs"]["x"] == pytest.approx(single.standard_errors()["slope_stderr"])
+    assert statistics["intercept_stderr"] == pytest.approx(single.standard_errors()["intercept_stderr"])
+    assert (statistics["n"], statistics["intercept"], statistics["r_squared"]) == pytest.approx(
+        (10, single.intercept, single.r_squared)
+    )
+
+
+def test_collinear_features_have_no_standard_errors():
+    x = np.arange(6, dtype=float)
+    fit = MultiLinearFit.from_arrays(np.column_stack((x, 2 * x)), 5 * x + 1)
+    assert fit.predict(np.array([[10.0, 20.0]])) == pytest.approx([51.0])
+    assert fit.standard_errors() == {"intercept_stderr": None, "coefficient_stderrs": [None, None]}
+
+
+HOUSES = [
+    {"time_object": {}, "event_type": "sale", "attribute": {"sqft": sqft, "rooms": rooms, "price": 100 * sqft + 50000 * rooms + 10000}}
+    for sqft, rooms in ((1500, 2), (2000, 3), (3000, 3), (2500, 4), (1200, 1))
+]
+
+
+def test_multivariate_predict_and_model_id():
+    model_store.clear()
+    response = client.post("/predict", json={
+        "data": HOUSES, "x_attributes": ["sqft", "rooms"], "y_attribute": "price", "x_values": [[1800, 2], [2200, 3]],
+    })
+    assert response.status_code == 200
+    result = response.json()
+    assert result["prediction"] == pytest.approx([290000, 380000])
+    assert result["fit"]["coefficients"] == pytest.approx({"sqft": 100, "rooms": 50000})
+    assert result["fit"]["intercept"] == pytest.approx(10000)
+    assert result["fit"]["n"] == 5
+
+    reused = client.post("/predict", json={"model_id": result["model_id"], "x_values": [[1000, 1]]})
+    assert reused.status_code == 200
+    assert reused.json()["prediction"] == pytest.approx([160000])
+    assert reused.json()["fit"] == result["fit"]
+
+    # The same training data finds the cached fit
+    again = client.post("/predict", json={
+        "data": HOUSES, "x_attributes": ["sqft", "rooms"], "y_attribute": "price", "x_values": [],
+    })
+    assert again.json()["model_id"] == result["model_id"]
+    assert len(model_store) == 1
+
+    single = client.post("/predict", json={"data": HOUSES, "x_attribute": "sqft", "y_attribute": "price", "x_values": [1]})
+    assert single.json()["model_id"] != result["model_id"]
+    assert "slope" in single.json()["fit"]
+
+
+def test_predict_with_dataset_id_reuses_the_fit():
+    model_store.clear()
+    dataset_id = client.post("/datasets", json={"data": HOUSES}).json()["dataset_id"]
+    request = {"dataset_id": dataset_id, "x_attributes": ["sqft", "rooms"], "y_attribute": "price", "x_values": [[1800, 2]]}
+    first = client.post("/predict", json=request).json()
+    client.delete(f"/datasets/{dataset_id}")
+    # The dataset is gone, but its model is still cached under the dataset's id
+    second = client.post("/predict", json=request)
+    assert second.status_code == 200
+    assert second.json() == first
+
+
+@pytest.mark.parametrize("body, status", [
+    ({"model_id": "0" * 32, "x_values": [[1, 2]]}, 404),
+    ({"model_id": "0" * 32, "data": HOUSES, "x_values": [1]}, 422),
+    ({"data": HOUSES, "x_attribute": "sqft", "x_attributes": ["rooms"], "y_attribute": "price", "x_values": [1]}, 422),
+    ({"data": HOUSES, "x_attributes": ["sqft", "rooms"], "y_attribute": "price", "x_values": [1800]}, 422),
+    ({"data": HOUSES, "x_attribute": "sqft", "x_values": [1800]}, 422),
+    ({"data": HOUSES, "x_attributes": ["sqft", "missing"], "y_attribute": "price", "x_values": [[1, 2]]}, 400),
+])
+def test_predict_rejects_bad_requests(body, status):
+    assert client.post("/predict", json=body).status_code == status
+
+
+def test_model_id_checks_point_width():
+    model_id = client.post("/predict", json={
+        "data": HOUSES, "x_attributes": ["sqft", "rooms"], "y_attribute": "price", "x_values": [],
+    }).json()["model_id"]
+    response = client.post("/predict", json={"model_id": model_id, "x_values": [[1, 2, 3]]})
+    assert response.status_code == 400
+    assert "list of 2 values" in response.json()["detail"]
+
+
+def test_ndjson_and_batch_fits_share_model_ids():
+    model_store.clear()
+    ndjson = "\n".join(json.dumps(event) for event in HOUSES)
+    streamed = client.post("/predict?x_attribute=sqft&y_attribute=price&x_values=1800", content=ndjson,
+                           headers={"content-type": "application/x-ndjson"})
+    assert streamed.status_code == 200
+    inline = client.post("/predict", json={"data": HOUSES, "x_attribute": "sqft", "y_attribute": "price", "x_values": [1800]})
+    assert streamed.json()["model_id"] == inline.json()["model_id"]
+    assert len(model_store) == 1
+
+    model_id = streamed.json()["model_id"]
+    reused = client.post(f"/predict?model_id={model_id}&x_values=1800", content="", headers={"content-type": "application/x-ndjson"})
+    assert reused.status_code == 200
+    assert reused.json()["prediction"] == pytest.approx(inline.json()["prediction"])
+
+    batch = client.post("/batch", json={"data": HOUSES, "operations": [
+        {"operation": "predict", "parameters": {"model_id": model_id, "x_values": [1800]}},
+    ]})
+    assert batch.json()["results"][0]["status_code"] == 200
+    assert batch.json()["results"][0]["result"]["prediction"] == pytest.approx(inline.json()["prediction"])
+
+
+def test_unpaired_x_and_y_are_a_mismatch():
+    # One event lacks x and another lacks y: equal counts, but only two pairs
+    events = [
+        {"time_object": {}, "event_type": "sale", "attribute": {"sqft": 1500, "price": 300000}},
+        {"time_object": {}, "event_type": "sale", "attribute": {"sqft": 2000, "price": 400000}},
+        {"time_object": {}, "event_type": "sale", "attribute": {"sqft": 3000}},
+        {"time_object": {}, "event_type": "sale", "attribute": {"price": 500000}},
+    ]
+    response = client.post("/predict", json={"data": events, "x_attribute": "sqft", "y_attribute": "price", "x_values": [1800]})
+    assert response.status_code == 400
+    assert response.json()["detail"].endswith("Mismatched x and y data lengths.")
+
+    ndjson = "\n".join(json.dumps(event) for event in events)
+    response = client.post("/predict?x_attribute=sqft&y_attribute=price&x_values=1800", content=ndjson,
+                           headers={"content-type": "application/x-ndjson"})
+    assert response.status_code == 400
+    assert response.json()["detail"] == "Mismatched x and y data lengths."
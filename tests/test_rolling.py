@@ -0,0 +1,98 @@
+from datetime import date, timedelta
+
+import numpy as np
+from fastapi.testclient import TestClient
+from app import rolling
+from app.main import app
+
+client = TestClient(app)
+
+START = date(2023, 1, 1)
+SUBURBS = ["Balmain", "Rhodes", "Glebe"]
+SALES = [
+    {"time_object": {"timestamp": (START + timedelta(days=(index * 37) % 120)).isoformat()}, "event_type": "sale",
+     "attribute": {"suburb": SUBURBS[index % 3], "price": float(300000 + (index * 7919) % 1000 * 100)}}
+    for index in range(400)
+]
+
+
+def _reference(events, time_bucket, window, suburb=None):
+    """Brute-force rolling statistics, one window at a time."""
+    dates = np.array([event["time_object"]["timestamp"] for event in events], dtype="datetime64[D]")
+    buckets = rolling.time_buckets(dates, time_bucket)
+    first, last = buckets.min(), buckets.max()
+    prices = np.array([event["attribute"]["price"] for event in events])
+    mine = np.array([suburb is None or event["attribute"]["suburb"] == suburb for event in events])
+    expected = {"sum": [], "mean": [], "min": [], "max": [], "median": [], "p90": [], "count": []}
+    for end in range(first, last + 1):
+        window_values = prices[mine & (buckets > end - window) & (buckets <= end)]
+        expected["count"].append(len(window_values))
+        for name, function in (("sum", np.sum), ("mean", np.mean), ("min", np.min), ("max", np.max),
+                               ("median", np.median), ("p90", lambda v: np.percentile(v, 90))):
+            expected[name].append(float(function(window_values)) if len(window_values) else None)
+    return expected
+
+
+def _assert_matches(actual, expected):
+    for name, values in expected.items():
+        assert [value is None for value in actual[name]] == [value is None for value in values], name
+        present = [(a, e) for a, e in zip(actual[name], values) if e is not None]
+        assert np.allclose(*zip(*present)), name
+
+
+def test_rolling_matches_brute_force():
+    for time_bucket, window in (("day", 7), ("week", 3), ("month", 2), ("day", 1)):
+        response = client.post("/rolling", json={
+            "data": SALES, "value_attribute": "price", "time_bucket": time_bucket, "window": window,
+            "statistics": ["count", "sum", "mean", "min", "max", "median", "p90"], "group_by_attribute": "suburb",
+        })
+        assert response.status_code == 200
+        result = response.json()
+        _assert_matches(result["rolling"], _reference(SALES, time_bucket, window))
+        for suburb in SUBURBS:
+            _assert_matches(result["groups"][suburb], _reference(SALES, time_bucket, window, suburb))
+
+
+def test_periods_and_min_periods():
+    events = [
+        {"time_object": {"timestamp": timestamp}, "event_type": "sale", "attribute": {"price": price}}
+        for timestamp, price in (("2023-01-02", 10), ("2023-01-04", 20), ("2023-01-16", 30), ("2023-03-01", 40))
+    ]
+    weekly = client.post("/rolling", json={
+        "data": events, "value_attribute": "price", "time_bucket": "week", "window": 2,
+        "statistics": ["sum", "mean"], "min_periods": 2,
+    }).json()
+    assert weekly["periods"][:3] == ["2023-01-02", "2023-01-09", "2023-01-16"]
+    assert weekly["rolling"]["sum"][:3] == [30.0, 30.0, None]
+    assert weekly["rolling"]["mean"][:2] == [15.0, 15.0]
+    assert "groups" not in weekly
+
+    monthly = client.post("/rolling", json={"data": events, "value_attribute": "price", "time_bucket": "month"}).json()
+    assert monthly["periods"] == ["2023-01", "2023-02", "2023-03"]
+    assert monthly["rolling"] == {"mean": [20.0, 20.0, 25.0]}
+
+
+def test_rolling_quantiles_in_chunks(monkeypatch):
+    monkeypatch.setattr(rolling, "QUANTILE_CHUNK_ROWS", 50)
+    body = {"data": SALES, "value_attribute": "price", "window": 10, "statistics": ["median", "p90"]}
+    response = client.post("/rolling", json=body).json()
+    expected = _reference(SALES, "day", 10)
+    _assert_matches(response["rolling"], {name: expected[name] for name in ("median", "p90")})
+
+
+def test_rolling_errors():
+    body = {"data": SALES, "value_attribute": "price"}
+    assert client.post("/rolling", json={**body, "time_bucket": "hour"}).status_code == 400
+    assert client.post("/rolling", json={**body, "statistics": ["mode"]}).status_code == 400
+    assert client.post("/rolling", json={**body, "window": 0}).status_code == 422
+    assert client.post("/rolling", json={**body, "value_attribute": "missing"}).status_code == 400
+
+
+def test_window_longer_than_the_grid():
+    body = {"data": SALES, "value_attribute": "price", "statistics": ["count", "min", "max", "median", "p90"]}
+    whole = client.post("/rolling", json={**body, "window": 120}).json()
+    huge = client.post("/rolling", json={**body, "window": 10 ** 12})
+    assert huge.status_code == 200
+    assert huge.json()["window"] == 10 ** 12
+    assert huge.json()["rolling"] == whole["rolling"]
+    assert huge.json()["rolling"]["count"][-1] == len(SALES)
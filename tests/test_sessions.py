@@ -0,0 +1,115 @@
+import numpy as np
+from fastapi.testclient import TestClient
+from app.main import app
+from app.sessions import RunningMoments, SessionStore, AggregationSession
+
+client = TestClient(app)
+
+SUBURBS = ["Balmain", "Rhodes", "Glebe", "Newtown"]
+SALES = [
+    {"time_object": {"timestamp": f"20{20 + index % 4}-{index % 12 + 1:02d}-{index % 28 + 1:02d}"}, "event_type": "sale",
+     "attribute": {"suburb": SUBURBS[index % 4 if index < 200 else index % 3], "price": 300000 + (index * 7919) % 50000}}
+    for index in range(300)
+]
+# Events missing the grouping or value attribute still count towards count-by-time
+SALES += [
+    {"time_object": {"timestamp": "2024-02-29"}, "event_type": "sale", "attribute": {"price": 410000}},
+    {"time_object": {"timestamp": "2024-03-01"}, "event_type": "sale", "attribute": {"suburb": "Glebe"}},
+]
+
+
+def _session(**body):
+    response = client.post("/sessions", json={"group_by_attribute": "suburb", "value_attribute": "price", **body})
+    assert response.status_code == 200
+    return response.json()["session_id"]
+
+
+def _append(session_id, events, **body):
+    return client.post(f"/sessions/{session_id}/events", json={"data": events, **body})
+
+
+def test_incremental_results_match_full_history():
+    session_id = _session()
+    for start in range(0, len(SALES), 70):
+        assert _append(session_id, SALES[start:start + 70]).status_code == 200
+
+    full = {"data": SALES, "group_by_attribute": "suburb", "value_attribute": "price"}
+    averages = client.get(f"/sessions/{session_id}/average-by-attribute").json()["average_values"]
+    expected = client.post("/average-by-attribute", json=full).json()["average_values"]
+    assert averages.keys() == expected.keys()
+    assert all(np.isclose(averages[suburb], expected[suburb]) for suburb in expected)
+
+    for time_format in ("year", "month", "day"):
+        counts = client.get(f"/sessions/{session_id}/count-by-time", params={"time_format": time_format}).json()
+        assert counts == client.post("/count-by-time", json={"data": SALES, "time_format": time_format}).json()
+
+    predicted = client.get(f"/sessions/{session_id}/predict-future-values", params={"time_points": [2025, 2026]}).json()
+    expected = client.post(
+        "/predict-future-values", json={"data": SALES, "value_attribute": "price", "time_points": [2025, 2026]}
+    ).json()
+    assert predicted["predicted_values"].keys() == expected["predicted_values"].keys()
+    assert np.allclose(list(predicted["predicted_values"].values()), list(expected["predicted_values"].values()))
+
+
+def test_summary_statistics():
+    session_id = _session(relative_accuracy=0.001)
+    _append(session_id, SALES[:150])
+    _append(session_id, SALES[150:])
+    summary = client.get(f"/sessions/{session_id}").json()
+    assert (summary["events"], summary["batches"]) == (len(SALES), 2)
+
+    prices = np.array([event["attribute"]["price"] for event in SALES if "price" in event["attribute"]], dtype=float)
+    overall = summary["overall"]
+    assert overall["count"] == len(prices)
+    assert np.isclose(overall["mean"], prices.mean())
+    assert np.isclose(overall["variance"], prices.var(ddof=1))
+    assert (overall["min"], overall["max"]) == (prices.min(), prices.max())
+    assert abs(overall["median"] - np.median(prices)) <= 0.001 * np.median(prices) + 1
+
+    glebe = np.array([event["attribute"]["price"] for event in SALES
+                      if event["attribute"].get("suburb") == "Glebe" and "price" in event["attribute"]], dtype=float)
+    assert summary["groups"]["Glebe"]["count"] == len(glebe)
+    assert np.isclose(summary["groups"]["Glebe"]["std"], glebe.std(ddof=1))
+
+
+def test_batch_ids_make_appends_idempotent():
+    session_id = _session()
+    assert _append(session_id, SALES[:10], batch_id="a").json()["appended"] == 10
+    retried = _append(session_id, SALES[:10], batch_id="a").json()
+    assert (retried["appended"], retried["events"], retried["batches"]) == (0, 10, 1)
+
+
+def test_session_errors():
+    assert client.get("/sessions/missing").status_code == 404
+    session_id = _session()
+    assert client.get(f"/sessions/{session_id}/average-by-attribute").status_code == 400
+    assert client.get(f"/sessions/{session_id}/predict-future-values", params={"time_points": [2025]}).status_code == 400
+    assert client.get(f"/sessions/{session_id}/count-by-time", params={"time_format": "week"}).status_code == 400
+    assert client.get(f"/sessions/{session_id}").json()["overall"]["mean"] is None
+
+    ungrouped = client.post("/sessions", json={"value_attribute": "price"}).json()["session_id"]
+    assert client.get(f"/sessions/{ungrouped}/average-by-attribute").status_code == 400
+    assert client.delete(f"/sessions/{ungrouped}").status_code == 200
+    assert client.get(f"/sessions/{ungrouped}").status_code == 404
+
+
+def test_running_moments_merge_batches():
+    values = np.random.default_rng(0).normal(100, 15, 1000)
+    codes = np.arange(1000) % 3
+    moments = RunningMoments()
+    for rows in (slice(0, 1), slice(1, 400), slice(400, 1000)):
+        moments.update(codes[rows], values[rows], 3)
+    for group in range(3):
+        assert np.isclose(moments.means[group], values[codes == group].mean())
+        assert np.isclose(moments.variances()[group], values[codes == group].var(ddof=1))
+
+
+def test_store_evicts_least_recently_used():
+    store = SessionStore(max_sessions=2, ttl=60)
+    first, second, third = (AggregationSession("price") for _ in range(3))
+    store.add(first)
+    store.add(second)
+    store.get(first.id)
+    store.add(third)
+    assert store.get(first.id) is first
+    assert len(store) == 2
@@ -0,0 +1,89 @@
+import numpy as np
+import pytest
+from fastapi.testclient import TestClient
+from app.main import app
+from app.sketch import QuantileSketch
+
+client = TestClient(app)
+
+
+def _events(prices, suburbs=None):
+    suburbs = suburbs or ["Balmain"] * len(prices)
+    return [
+        {"time_object": {"timestamp": "2023-06-01T00:00:00"}, "event_type": "sale", "attribute": {"suburb": suburb, "price": price}}
+        for suburb, price in zip(suburbs, prices)
+    ]
+
+
+def test_sketch_quantiles_within_relative_accuracy():
+    rng = np.random.default_rng(7)
+    values = rng.lognormal(12, 1, size=20000) * rng.choice([-1, 1], size=20000)
+    codes = rng.integers(0, 5, size=20000)
+    sketch = QuantileSketch(0.01, 5).update(values, codes, 5)
+
+    for q in (0.01, 0.25, 0.5, 0.75, 0.99):
+        estimates = sketch.quantile(q)
+        for group in range(5):
+            group_values = np.sort(values[codes == group])
+            exact = group_values[int(np.floor(q * (len(group_values) - 1)))]
+            assert abs(estimates[group] - exact) <= 0.01 * abs(exact) + 1e-9
+
+
+def test_merged_sketches_equal_single_sketch():
+    values = np.linspace(-50, 1000, 5001)
+    whole = QuantileSketch(0.02).update(values)
+    merged = QuantileSketch(0.02).update(values[:1000]).merge(QuantileSketch(0.02).update(values[1000:]))
+
+    for q in (0, 0.1, 0.5, 0.9, 1):
+        assert merged.quantile(q) == pytest.approx(whole.quantile(q))
+    assert merged.quantile(0)[0] == -50
+    assert merged.quantile(1)[0] == 1000
+
+
+def test_sketch_empty_group_and_invalid_values():
+    sketch = QuantileSketch(0.01, 3).update(np.array([1.0, 2.0]), np.array([0, 2]), 3)
+    assert np.isnan(sketch.quantile(0.5)[1])
+    with pytest.raises(ValueError):
+        QuantileSketch(0.01).update(np.array([1.0, np.inf]))
+    with pytest.raises(ValueError):
+        QuantileSketch(1.5)
+
+
+def test_approximate_median_endpoints():
+    prices = list(range(100000, 200000, 1000))
+    response = client.post("/median-value", json={"attribute_name": "price", "approximate": True, "data": _events(prices)})
+    assert response.status_code == 200
+    assert response.json()["median_value"] == pytest.approx(149000, rel=0.01)
+
+    suburbs = ["Balmain", "Rhodes"] * 50
+    response = client.post("/median-by-attribute", json={
+        "group_by_attribute": "suburb",
+        "value_attribute": "price",
+        "approximate": True,
+        "relative_accuracy": 0.001,
+        "data": _events(prices, suburbs),
+    })
+    assert response.status_code == 200
+    medians = response.json()["median_values"]
+    assert medians["Balmain"] == pytest.approx(148000, rel=0.001)
+    assert medians["Rhodes"] == pytest.approx(149000, rel=0.001)
+
+
+def test_approximate_outliers_and_summary_percentiles():
+    prices = [10, 12, 11, 13, 12, 11, 100]
+    exact = client.post("/outliers", json={"value_attribute": "price", "data": _events(prices)}).json()
+    approximate = client.post("/outliers", json={"value_attribute": "price", "approximate": True, "data": _events(prices)}).json()
+    assert exact == approximate == {"outliers": [100]}
+
+    body = {"value_attribute": "price", "statistics": ["p10", "p90", "median", "max"], "data": _events(list(range(1, 1001)))}
+    exact = client.post("/summary", json=body).json()["summary"]
+    assert exact == {"p10": pytest.approx(100.9), "p90": pytest.approx(900.1), "median": 500.5, "max": 1000}
+    approximate = client.post("/summary", json={**body, "approximate": True}).json()["summary"]
+    for name in ("p10", "p90", "median"):
+        assert approximate[name] == pytest.approx(exact[name], rel=0.02)
+    assert approximate["max"] == 1000
+
+
+def test_invalid_relative_accuracy():
+    response = client.post("/median-value", json={"attribute_name": "price", "approximate": True, "relative_accuracy": 2, "data": _events([1, 2])})
+    assert response.status_code == 422
@@ -0,0 +1,36 @@
+import json
+import os
+import statistics
+import subprocess
+import sys
+
+# Modules that only specific requests need; importing them at startup slows every cold start
+HEAVY_MODULES = ["sklearn", "scipy", "pandas", "pyarrow", "joblib"]
+
+# Generous enough for slow CI runners; a heavy eager import blows well past it
+IMPORT_BUDGET_SECONDS = float(os.environ.get("ANALYTICS_IMPORT_BUDGET_SECONDS", 3.0))
+
+PROBE = """
+import json, sys, time
+start = time.perf_counter()
+import app.main
+elapsed = time.perf_counter() - start
+print(json.dumps({"seconds": elapsed, "modules": sorted(sys.modules)}))
+"""
+
+
+def import_app():
+    root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    output = subprocess.run([sys.executable, "-c", PROBE], cwd=root, capture_output=True, text=True, check=True)
+    return json.loads(output.stdout)
+
+
+def test_startup_skips_heavy_modules():
+    modules = set(import_app()["modules"])
+    loaded = [name for name in HEAVY_MODULES if name in modules]
+    assert not loaded, f"imported at startup: {loaded}"
+
+
+def test_import_time_within_budget():
+    seconds = statistics.median(import_app()["seconds"] for _ in range(3))
+    assert seconds < IMPORT_BUDGET_SECONDS, f"import app.main took {seconds:.2f}s"
@@ -0,0 +1,80 @@
+import json
+
+import pytest
+from fastapi.testclient import TestClient
+from app import config
+from app.main import app
+
+client = TestClient(app)
+
+SALES = [
+    {"time_object": {"timestamp": "2020-06-01T00:00:00"}, "event_type": "sale", "attribute": {"suburb": "Balmain", "price": 300000, "sqft": 1500}},
+    {"time_object": {"timestamp": "2021-06-01T00:00:00"}, "event_type": "sale", "attribute": {"suburb": "Balmain", "price": 350000, "sqft": 1700}},
+    {"time_object": {"timestamp": "2022-03-01T00:00:00"}, "event_type": "sale", "attribute": {"suburb": "Rhodes", "price": 400000, "sqft": 2000}},
+    {"time_object": {"timestamp": "2022-06-01T00:00:00"}, "event_type": "sale", "attribute": {"suburb": "Rhodes", "price": 4500000, "sqft": 2600}},
+    {"time_object": {}, "event_type": "sale", "attribute": {"suburb": "Rhodes"}}
+]
+
+
+def post_ndjson(path, params, events):
+    body = "\n".join(json.dumps(event) for event in events) + "\n"
+    return client.post(path, params=params, content=body, headers={"content-type": "application/x-ndjson"})
+
+
+@pytest.fixture(autouse=True)
+def small_batches(monkeypatch):
+    # Force several batches so the accumulators have to merge partial results
+    monkeypatch.setattr(config, "STREAM_BATCH_SIZE", 2)
+
+
+@pytest.mark.parametrize("path, params", [
+    ("/count-by-time", {"time_format": "month"}),
+    ("/highest-value", {"attribute_name": "price"}),
+    ("/lowest-value", {"attribute_name": "price"}),
+    ("/average-by-attribute", {"group_by_attribute": "suburb", "value_attribute": "price"}),
+    ("/median-by-attribute", {"group_by_attribute": "suburb", "value_attribute": "price"}),
+    ("/outliers", {"value_attribute": "price"}),
+    ("/predict-future-values", {"value_attribute": "price", "time_points": [2024, 2025]}),
+])
+def test_ndjson_matches_json(path, params):
+    streamed = post_ndjson(path, params, SALES)
+    expected = client.post(path, json={**params, "data": SALES}).json()
+    assert streamed.status_code == 200
+    assert streamed.json().keys() == expected.keys()
+    for key, value in expected.items():
+        assert streamed.json()[key] == pytest.approx(value)
+
+
+def test_ndjson_predict_future_values_per_group():
+    params = {"value_attribute": "price", "group_by_attribute": "suburb", "time_points": [2024, 2025]}
+    streamed = post_ndjson("/predict-future-values", params, SALES).json()
+    expected = client.post("/predict-future-values", json={**params, "data": SALES}).json()
+    assert streamed["predicted_values"].keys() == expected["predicted_values"].keys()
+    for suburb, predictions in expected["predicted_values"].items():
+        assert streamed["predicted_values"][suburb] == pytest.approx(predictions)
+        assert streamed["fit"][suburb] == pytest.approx(expected["fit"][suburb])
+
+
+def test_ndjson_predict():
+    events = [event for event in SALES if "sqft" in event["attribute"]]
+    streamed = post_ndjson("/predict", {"x_attribute": "sqft", "y_attribute": "price", "x_values": [1800, 2200]}, events)
+    expected = client.post("/predict", json={"x_attribute": "sqft", "y_attribute": "price", "x_values": [1800, 2200], "data": events})
+    assert streamed.status_code == 200
+    assert streamed.json()["prediction"] == pytest.approx(expected.json()["prediction"])
+
+
+def test_ndjson_errors():
+    response = post_ndjson("/highest-value", {"attribute_name": "sqft"}, SALES[4:])
+    assert response.status_code == 400
+    assert "No valid values found" in response.json()["detail"]
+
+    response = post_ndjson("/highest-value", {}, SALES)
+    assert response.status_code == 422
+    assert response.json()["detail"][0]["loc"] == ["query", "attribute_name"]
+
+    response = post_ndjson("/highest-value", {"attribute_name": "price"}, SALES + [{"event_type": "sale"}])
+    assert response.status_code == 422
+    assert response.json()["detail"][0]["loc"] == ["body", "data", 5, "time_object"]
+
+    response = client.post("/highest-value", params={"attribute_name": "price"}, content="{not json}\n", headers={"content-type": "application/x-ndjson"})
+    assert response.status_code == 422
@@ -0,0 +1,53 @@
+from fastapi.testclient import TestClient
+from app.main import app
+
+client = TestClient(app)
+
+SALES = [
+    {"time_object": {"timestamp": "2023-06-01T00:00:00"}, "event_type": "sale", "attribute": {"suburb": "Balmain", "price": 500000}},
+    {"time_object": {"timestamp": "2023-06-01T00:00:00"}, "event_type": "sale", "attribute": {"suburb": "Balmain", "price": 600000}},
+    {"time_object": {"timestamp": "2023-06-01T00:00:00"}, "event_type": "sale", "attribute": {"suburb": "Rhodes", "price": 300000}},
+    {"time_object": {"timestamp": "2023-06-01T00:00:00"}, "event_type": "sale", "attribute": {"suburb": "Rhodes", "price": 350000}},
+    {"time_object": {"timestamp": "2023-06-01T00:00:00"}, "event_type": "sale", "attribute": {"price": 5000000}},
+]
+
+
+def test_summary_matches_single_endpoints():
+    response = client.post("/summary", json={
+        "value_attribute": "price",
+        "statistics": ["mean", "median", "min", "max", "outliers"],
+        "group_by_attributes": ["suburb"],
+        "data": SALES
+    })
+    assert response.status_code == 200
+    result = response.json()
+
+    for statistic, endpoint, key in [("max", "/highest-value", "highest_value"), ("min", "/lowest-value", "lowest_value"), ("median", "/median-value", "median_value")]:
+        single = client.post(endpoint, json={"attribute_name": "price", "data": SALES}).json()
+        assert result["summary"][statistic] == single[key]
+
+    outliers = client.post("/outliers", json={"value_attribute": "price", "data": SALES}).json()
+    assert result["summary"]["outliers"] == outliers["outliers"]
+
+    averages = client.post("/average-by-attribute", json={"group_by_attribute": "suburb", "value_attribute": "price", "data": SALES}).json()
+    assert {group: stats["mean"] for group, stats in result["groups"]["suburb"].items()} == averages["average_values"]
+    assert result["groups"]["suburb"]["Rhodes"]["median"] == 325000
+
+
+def test_summary_defaults_to_all_statistics():
+    response = client.post("/summary", json={"value_attribute": "price", "data": SALES})
+    assert response.status_code == 200
+    assert response.json()["summary"]["count"] == 5
+    assert response.json()["groups"] == {}
+
+
+def test_summary_unknown_statistic():
+    response = client.post("/summary", json={"value_attribute": "price", "statistics": ["mode"], "data": SALES})
+    assert response.status_code == 400
+    assert "Unknown statistics: mode" in response.json()["detail"]
+
+
+def test_summary_no_valid_values():
+    response = client.post("/summary", json={"value_attribute": "sqft", "data": SALES})
+    assert response.status_code == 400
+    assert "No valid values found" in response.json()["detail"]
@@ -0,0 +1,81 @@
+import json
+
+import numpy as np
+import pytest
+from fastapi.testclient import TestClient
+from app import config
+from app.main import app
+from app.timeseries import count_time_buckets, parse_dates, timestamp_years
+
+client = TestClient(app)
+
+
+def test_parse_dates_matches_fromisoformat():
+    timestamps = np.array(["2023-06-01T10:00:00+10:00", "2024-02-29", "1999-12-31T23:59:59Z", "20230601"], dtype=object)
+    dates = parse_dates(timestamps)
+    assert dates.dtype == np.dtype("datetime64[D]")
+    assert np.datetime_as_string(dates).tolist() == ["2023-06-01", "2024-02-29", "1999-12-31", "2023-06-01"]
+    assert timestamp_years(dates).tolist() == [2023.0, 2024.0, 1999.0, 2023.0]
+
+
+@pytest.mark.parametrize("timestamp", ["invalid-date", "2023-02-29", "2023-13-01", "2023-06", "", "2023-06-00"])
+def test_parse_dates_rejects_invalid(timestamp):
+    with pytest.raises(ValueError):
+        parse_dates(np.array(["2023-01-01", timestamp], dtype=object))
+
+
+def test_parse_dates_passes_datetime64_through():
+    moments = np.array(["2023-06-01T12:30:00", "2020-01-01T00:00:00"], dtype="datetime64[s]")
+    assert parse_dates(moments).tolist() == parse_dates(np.array(["2023-06-01", "2020-01-01"], dtype=object)).tolist()
+
+
+def test_count_time_buckets():
+    dates = parse_dates(np.array(["2023-06-01", "2023-06-30", "2023-07-01", "2021-01-15"], dtype=object))
+    assert count_time_buckets(dates, "year") == {"2021": 1, "2023": 3}
+    assert count_time_buckets(dates, "month") == {"2021-01": 1, "2023-06": 2, "2023-07": 1}
+    assert count_time_buckets(dates, "day") == {"2021-01-15": 1, "2023-06-01": 1, "2023-06-30": 1, "2023-07-01": 1}
+    assert count_time_buckets(dates[:0], "month") == {}
+    with pytest.raises(ValueError, match="Invalid time_format"):
+        count_time_buckets(dates, "week")
+
+
+def test_count_by_time_skips_missing_timestamps():
+    events = [
+        {"time_object": {"timestamp": timestamp}, "event_type": "sale", "attribute": {}}
+        for timestamp in ["2023-06-01T00:00:00", None, "2023-06-15", ""]
+    ]
+    response = client.post("/count-by-time", json={"time_format": "month", "data": events})
+    assert response.status_code == 200
+    assert response.json() == {"counts_by_time": {"2023-06": 2}}
+
+
+def test_count_by_day_keys_non_iso_timestamps_by_prefix():
+    events = [
+        {"time_object": {"timestamp": timestamp}, "event_type": "sale", "attribute": {}}
+        for timestamp in ["2023-06-01T10:00:00", "June 1T10:00", "June 1", "2023-06-01"]
+    ]
+    response = client.post("/count-by-time", json={"time_format": "day", "data": events})
+    assert response.status_code == 200
+    assert response.json() == {"counts_by_time": {"2023-06-01": 2, "June 1": 2}}
+
+    ndjson = "\n".join(json.dumps(event) for event in events)
+    streamed = client.post("/count-by-time?time_format=day", content=ndjson, headers={"content-type": "application/x-ndjson"})
+    assert streamed.json() == response.json()
+
+    # Year and month buckets still need real dates
+    assert client.post("/count-by-time", json={"time_format": "month", "data": events}).status_code == 400
+
+
+def test_day_keys_do_not_depend_on_the_other_rows(monkeypatch):
+    events = [
+        {"time_object": {"timestamp": timestamp}, "event_type": "sale", "attribute": {}}
+        for timestamp in ["20230101", "2023-01-01T08:00:00", "June 1", "20230101T10:00"]
+    ]
+    expected = {"counts_by_time": {"2023-01-01": 3, "June 1": 1}}
+    assert client.post("/count-by-time", json={"time_format": "day", "data": events}).json() == expected
+
+    ndjson = "\n".join(json.dumps(event) for event in events)
+    for batch_size in (1, 2, 4):
+        monkeypatch.setattr(config, "STREAM_BATCH_SIZE", batch_size)
+        streamed = client.post("/count-by-time?time_format=day", content=ndjson, headers={"content-type": "application/x-ndjson"})
+        assert streamed.json() == expected